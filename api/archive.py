@@ -0,0 +1,361 @@
+# backend/api/archive.py
+"""
+Hot/cold partitioning of the Transaction log.
+
+Transactions older than settings.TRANSACTION_HOT_DAYS are moved out of
+api_transaction into one archive table per calendar year
+(api_transaction_<year>), a batch at a time. Each batch is copied and
+deleted in one atomic block, so an interrupted run simply resumes with the
+rows that are still hot; the horizon of an unfinished run is kept in a
+JobCheckpoint so the resumed run moves exactly the same rows.
+
+Archive tables are not Django-managed: their models are built on demand in
+an isolated app registry (makemigrations never sees them) from
+Transaction's concrete fields, with plain id columns instead of foreign
+keys, and new Transaction columns are added to existing archive tables
+before rows are copied.
+
+Readers (history, exports) go through user_transactions(), which reads
+one page (at most TRANSACTION_PAGE_SIZE rows) at a time: the hot table
+first, then archive years newest first, only while the page is not full.
+"""
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.apps.registry import Apps
+from django.conf import settings
+from django.db import connection, models, transaction as db_transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import BankAccount, JobCheckpoint, Transaction
+
+CHECKPOINT_NAME = "transaction_archive"
+CATEGORY_CHECKPOINT = "transaction_categories"  # written by api.categories
+DEFAULT_HOT_DAYS = 365
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_PAGE_SIZE = 100
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+# columns every archive table has, whatever Transaction version created it;
+# newer columns are only guaranteed after upgrade_archive_tables()
+ARCHIVE_READ_FIELDS = (
+    "id", "sender_account_id", "receiver_account_id", "receiver_name",
+    "amount", "timestamp", "status", "reference",
+)
+
+archive_apps = Apps(["api"])
+_models = {}
+_ready = set()  # years whose table is known to match the current schema
+
+
+def archive_table(year):
+    return f"{Transaction._meta.db_table}_{year}"
+
+
+def _archive_fields():
+    fields = {}
+    for field in Transaction._meta.concrete_fields:
+        if field.primary_key:
+            fields[field.attname] = models.BigIntegerField(primary_key=True)
+        elif field.is_relation:
+            fields[field.attname] = models.BigIntegerField(db_column=field.column, null=field.null)
+        else:
+            fields[field.name] = field.clone()
+    return fields
+
+
+def archive_model(year):
+    """Model class for the archive table of `year` (the table may not exist yet)."""
+    if year not in _models:
+        table = archive_table(year)
+        meta = type("Meta", (), {
+            "app_label": "api",
+            "apps": archive_apps,
+            "db_table": table,
+            "ordering": ["-timestamp", "-id"],
+            "indexes": [
+                # readers search archives by account, see user_transactions()
+                models.Index(fields=["sender_account_id", "timestamp"], name=f"txa{year}_sender_idx"),
+                models.Index(fields=["receiver_account_id", "timestamp"], name=f"txa{year}_receiver_idx"),
+                models.Index(fields=["timestamp", "id"], name=f"txa{year}_ts_idx"),
+            ],
+        })
+        attrs = {"__module__": __name__, "Meta": meta, **_archive_fields()}
+        _models[year] = type(f"TransactionArchive{year}", (models.Model,), attrs)
+    return _models[year]
+
+
+def ensure_archive_table(year):
+    """
+    Create the archive table for `year`, or add columns Transaction gained
+    since. Runs DDL, so it must not be called inside an atomic block.
+    """
+    model = archive_model(year)
+    if year in _ready:
+        return model
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        exists = table in connection.introspection.table_names(cursor)
+        columns = (
+            {col.name for col in connection.introspection.get_table_description(cursor, table)}
+            if exists else set()
+        )
+    with connection.schema_editor() as editor:
+        if not exists:
+            editor.create_model(model)
+        else:
+            for field in model._meta.local_fields:
+                if field.column not in columns:
+                    editor.add_field(model, field)
+    _ready.add(year)
+    return model
+
+
+def upgrade_archive_tables():
+    """Bring every archive table up to the current Transaction columns."""
+    for year in archive_years():
+        ensure_archive_table(year)
+
+
+def archive_years():
+    """Years that have an archive table, newest first."""
+    position = JobCheckpoint.objects.filter(name=CHECKPOINT_NAME).values_list("position", flat=True).first()
+    return sorted((position or {}).get("years", []), reverse=True)
+
+
+def categorized_years():
+    """Archive years whose rows have been through classify_transactions (they have a category column)."""
+    position = JobCheckpoint.objects.filter(name=CATEGORY_CHECKPOINT).values_list("position", flat=True).first()
+    return {int(name) for name in (position or {}).get("done", []) if name != "hot"}
+
+
+# ----- moving rows -----
+
+def archive_batch(horizon, checkpoint, batch_size):
+    """Move the oldest `batch_size` rows older than horizon. Returns rows moved."""
+    rows = list(
+        Transaction.objects.filter(timestamp__lt=horizon)
+        .order_by("timestamp", "id")
+        .values()[:batch_size]
+    )
+    if not rows:
+        return 0
+
+    by_year = defaultdict(list)
+    for row in rows:
+        by_year[row["timestamp"].year].append(row)
+    archives = {year: ensure_archive_table(year) for year in by_year}
+
+    with db_transaction.atomic():
+        for year, group in by_year.items():
+            model = archives[year]
+            # ignore_conflicts: a batch repeated by a concurrent or crashed run is harmless
+            model.objects.bulk_create([model(**row) for row in group], ignore_conflicts=True)
+        Transaction.objects.filter(id__in=[row["id"] for row in rows])._raw_delete(connection.alias)
+
+        position = checkpoint.position
+        position["years"] = sorted(set(position.get("years", [])) | set(by_year))
+        position["moved"] = position.get("moved", 0) + len(rows)
+        checkpoint.store(**position)
+    return len(rows)
+
+
+def archive_transactions(now=None, hot_days=None, batch_size=None, max_batches=None, reset=False):
+    """
+    Move every transaction older than the horizon into the yearly archives.
+    Resumes an unfinished run with its original horizon unless `reset`.
+    Returns stats.
+    """
+    now = now or timezone.now()
+    hot_days = hot_days if hot_days is not None else getattr(settings, "TRANSACTION_HOT_DAYS", DEFAULT_HOT_DAYS)
+    batch_size = batch_size or getattr(settings, "TRANSACTION_ARCHIVE_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+
+    upgrade_archive_tables()
+    checkpoint = JobCheckpoint.load(CHECKPOINT_NAME)
+    position = checkpoint.position
+    if position.get("running") and not reset:
+        horizon = datetime.datetime.fromisoformat(position["horizon"])
+    else:
+        horizon = now - datetime.timedelta(days=hot_days)
+        position.update(horizon=horizon.isoformat(), running=True, moved=0)
+        checkpoint.store(**position)
+
+    stats = {"horizon": horizon, "moved": 0, "batches": 0, "finished": False}
+    while max_batches is None or stats["batches"] < max_batches:
+        moved = archive_batch(horizon, checkpoint, batch_size)
+        if not moved:
+            checkpoint.position["running"] = False
+            checkpoint.store(**checkpoint.position)
+            stats["finished"] = True
+            break
+        stats["moved"] += moved
+        stats["batches"] += 1
+    return stats
+
+
+# ----- reading -----
+
+def encode_cursor(txn):
+    micros = (txn.timestamp - EPOCH) // datetime.timedelta(microseconds=1)
+    return f"{micros}:{txn.id}"
+
+
+def decode_cursor(value):
+    """Parse an encode_cursor() value into (timestamp, id). Raises ValueError."""
+    micros, _, txn_id = value.partition(":")
+    return EPOCH + datetime.timedelta(microseconds=int(micros)), int(txn_id)
+
+
+def _conditions(before=None, year=None, month=None, category=None):
+    conditions = []
+    if before:
+        ts, txn_id = before
+        conditions.append(Q(timestamp__lt=ts) | Q(timestamp=ts, id__lt=txn_id))
+    if year:
+        conditions.append(Q(timestamp__year=year))
+    if month:
+        conditions.append(Q(timestamp__month=month))
+    if category:
+        conditions.append(Q(category=category))
+    return conditions
+
+
+def involving(user_id, *conditions, limit=None):
+    """
+    Q for the user's hot transactions: the union of two range scans on the
+    (sender_user, timestamp) and (receiver_user, timestamp) indexes, each
+    cut at the newest `limit` rows, matched back to the table by primary key.
+    """
+    def side(column):
+        ids = Transaction.objects.filter(*conditions, **{column: user_id}).order_by("-timestamp", "-id").values("id")
+        return ids[:limit] if limit else ids
+
+    return Q(id__in=side("sender_user_id")) | Q(id__in=side("receiver_user_id"))
+
+
+def hot_transactions(user_id, before=None, limit=None, year=None, month=None, category=None):
+    """The user's hot transactions, newest first."""
+    conditions = _conditions(before, year, month, category)
+    qs = (
+        Transaction.objects.filter(involving(user_id, *conditions, limit=limit))
+        .select_related("sender_account", "receiver_account")
+        .order_by("-timestamp", "-id")
+    )
+    return qs[:limit] if limit else qs
+
+
+def archived_monthly_totals(account_ids, category=None):
+    """
+    SUCCESS debits and credits of `account_ids` in the archives, as
+    {month start: {"debited": Decimal, "credited": Decimal}}.
+    """
+    months = defaultdict(lambda: {"debited": Decimal("0"), "credited": Decimal("0")})
+    years = archive_years()
+    if category and years:
+        years = [year for year in years if year in categorized_years()]
+    for year in years:
+        rows = (
+            archive_model(year).objects
+            .filter(Q(sender_account_id__in=account_ids) | Q(receiver_account_id__in=account_ids),
+                    *_conditions(category=category), status="SUCCESS")
+            .annotate(month=TruncMonth("timestamp")).values("month")
+            .annotate(
+                debited=Sum("amount", filter=Q(sender_account_id__in=account_ids)),
+                credited=Sum("amount", filter=Q(receiver_account_id__in=account_ids)),
+            )
+            .order_by()
+        )
+        for row in rows:
+            months[row["month"]]["debited"] += row["debited"] or 0
+            months[row["month"]]["credited"] += row["credited"] or 0
+    return dict(months)
+
+
+def _as_transactions(rows):
+    """Turn archive rows into (unsaved) Transaction instances with their accounts attached."""
+    if not rows:
+        return []
+    ids = {r["sender_account_id"] for r in rows} | {r["receiver_account_id"] for r in rows if r["receiver_account_id"]}
+    accounts = BankAccount.objects.in_bulk(ids)
+    result = []
+    for row in rows:
+        txn = Transaction(**row)
+        txn.sender_account = accounts.get(row["sender_account_id"])
+        txn.receiver_account = accounts.get(row["receiver_account_id"])
+        result.append(txn)
+    return result
+
+
+def user_transactions(user_id, account_ids, before=None, limit=None, year=None, month=None, category=None):
+    """
+    One page of the user's transactions, newest first, from the hot table
+    and, once that runs out, the archives. Archives are searched by account
+    (`account_ids`): rows archived before the owner columns existed have
+    none. `before` is a (timestamp, id) cursor, the last row of the previous
+    page; `limit` defaults to TRANSACTION_PAGE_SIZE, so no request reads
+    more than a page from each table it reaches. A `category` filter only
+    reaches archive years that have been classified.
+    """
+    limit = limit or getattr(settings, "TRANSACTION_PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    rows = list(hot_transactions(user_id, before, limit, year, month, category))
+    if len(rows) >= limit:
+        return rows
+
+    archived = []
+    years = archive_years()
+    categorized = categorized_years() if years else set()
+    for archive_year in years:
+        if year and archive_year != int(year):
+            continue
+        if before and archive_year > before[0].year:
+            continue
+        if category and archive_year not in categorized:
+            continue
+        fields = ARCHIVE_READ_FIELDS + ("category",) if archive_year in categorized else ARCHIVE_READ_FIELDS
+        qs = (
+            archive_model(archive_year).objects
+            .filter(Q(sender_account_id__in=account_ids) | Q(receiver_account_id__in=account_ids),
+                    *_conditions(before, None, month, category))
+            .order_by("-timestamp", "-id")
+            .values(*fields)
+        )
+        archived.extend(qs[:limit - len(archived)])
+        if len(archived) >= limit:
+            break
+
+    if not archived:
+        return rows
+    # rows back-dated into the hot table after an archive run can be older
+    # than archived ones, so merge instead of appending
+    merged = sorted(rows + _as_transactions(archived), key=lambda t: (t.timestamp, t.id), reverse=True)
+    return merged[:limit]
+
+
+def iter_user_transactions(user_id, account_ids, batch_size=1000, year=None, month=None, category=None):
+    """Stream a user's full history (hot, then archives) a page at a time, for exports."""
+    before = None
+    while True:
+        page = user_transactions(user_id, account_ids, before=before, limit=batch_size, year=year, month=month,
+                                 category=category)
+        yield from page
+        if len(page) < batch_size:
+            return
+        before = (page[-1].timestamp, page[-1].id)
+
+
+def find_transaction(account_ids, txn_id):
+    """One transaction by id, hot or archived, if it involves `account_ids` (else None)."""
+    involves = Q(sender_account_id__in=account_ids) | Q(receiver_account_id__in=account_ids)
+    txn = Transaction.objects.select_related("sender_account", "receiver_account").filter(involves, id=txn_id).first()
+    if txn is not None:
+        return txn
+    years = archive_years()
+    categorized = categorized_years() if years else set()
+    for year in years:
+        fields = ARCHIVE_READ_FIELDS + ("category",) if year in categorized else ARCHIVE_READ_FIELDS
+        rows = list(archive_model(year).objects.filter(involves, id=txn_id).values(*fields))
+        if rows:
+            return _as_transactions(rows)[0]
+    return None
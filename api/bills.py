@@ -0,0 +1,104 @@
+# backend/api/bills.py
+"""
+Bill fetches, cached.
+
+Fetching a bill is the slowest and most rate-limited call to the biller
+aggregator, and users press "fetch" several times before paying. A fetched
+bill is kept in Django's cache for BILL_FETCH_TTL seconds, keyed by biller
+and consumer number; with the default local-memory cache that is per
+process, with a shared backend (Redis, memcached) it is per deployment.
+
+Concurrent fetches of the same bill in a process share one upstream call:
+the first caller fetches, the others wait for its result (or its error,
+which is not cached) for up to BILL_FETCH_TIMEOUT seconds. A waiter that
+gives up, or whose leader timed out, gets providers.ProviderTimeout. pay_bill reuses the cached bill for the amount and
+due date, and forgets it once paid so the next fetch sees the new bill.
+"""
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import providers
+
+_lock = threading.Lock()
+_inflight = {}  # cache key -> Future
+
+
+def cache_key(biller, consumer_number):
+    # consumer numbers are free text; memcached keys must not contain spaces or control characters
+    digest = hashlib.sha256(consumer_number.encode()).hexdigest()[:32]
+    return f"bill:{biller.id}:{digest}"
+
+
+def upstream_fetch(biller, consumer_number):
+    """
+    Fetch the bill from the biller aggregator (api.providers: a hedged
+    call, fetches are idempotent). Raises providers.ProviderError.
+    """
+    bill = providers.get("bill_fetch", biller.code).call(
+        "fetch", {"consumer_number": consumer_number}, idempotent=True,
+    )
+    return {
+        "amount": bill["amount"],
+        "due_date": bill["due_date"],
+        "period": bill["period"],
+        "fetched_at": timezone.now().isoformat(),
+    }
+
+
+def cached_bill(biller, consumer_number):
+    """The cached bill, or None. Never calls upstream."""
+    return cache.get(cache_key(biller, consumer_number))
+
+
+def fetch_bill(biller, consumer_number):
+    """
+    The bill for (biller, consumer number): from the cache, or from one
+    upstream fetch shared with any concurrent callers. Returns (bill,
+    cached): `bill` is {"amount", "due_date", "period", "fetched_at"},
+    `cached` is False only for the caller that went upstream.
+    """
+    key = cache_key(biller, consumer_number)
+    bill = cache.get(key)
+    if bill is not None:
+        return bill, True
+    with _lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = _inflight[key] = Future()
+    if not leader:
+        wait = getattr(settings, "BILL_FETCH_TIMEOUT", 30)
+        try:
+            return future.result(timeout=wait), True
+        except FutureTimeout as exc:  # also TimeoutError: gave up waiting, or the leader's call timed out
+            raise providers.ProviderTimeout(f"{biller.code}: bill fetch timed out after {wait}s") from exc
+
+    try:
+        bill = upstream_fetch(biller, consumer_number)
+        cache.set(key, bill, getattr(settings, "BILL_FETCH_TTL", 300))
+        future.set_result(bill)
+    except BaseException as exc:
+        future.set_exception(exc)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+    return bill, False
+
+
+def fetch_bills(pairs):
+    """fetch_bill() for several (biller, consumer number) pairs, the upstream calls made concurrently. Returns the bills."""
+    if len(pairs) <= 1:
+        return [fetch_bill(*pair)[0] for pair in pairs]
+    with ThreadPoolExecutor(max_workers=len(pairs), thread_name_prefix="billfetch") as pool:
+        return [bill for bill, _ in pool.map(lambda pair: fetch_bill(*pair), pairs)]
+
+
+def forget_bill(biller, consumer_number):
+    """Drop the cached bill (it has been paid)."""
+    cache.delete(cache_key(biller, consumer_number))
@@ -0,0 +1,116 @@
+# backend/api/categories.py
+"""
+Transaction categories (P2P / RECHARGE / BILL).
+
+New transactions get their category, and biller or operator, from
+api.payments when they are written. classify_transactions() fills in rows
+written before that, in the hot table and in every archive year, from the
+strings the payment code has always left behind:
+
+  * a row with a receiver account is a P2P transfer;
+  * reference "Mobile Recharge (<operator name>)" is a recharge;
+  * reference "Bill Payment (<biller name>)" is a bill payment.
+
+Each table is walked in id order a batch at a time. Every batch is
+committed together with its position in a JobCheckpoint, so the job can
+be stopped and resumed. The updates bypass signals, so each batch bumps
+the UserDataVersion of the users on both sides of the rows it changed
+(their list ETags would otherwise keep serving the null category).
+Archive years are only searched by category once they are finished
+(archive.categorized_years()). Rows archived while the job runs can be
+missed; run it again with reset to pick them up.
+"""
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+
+from . import archive
+from .models import Biller, JobCheckpoint, Operator, Transaction, UserDataVersion
+
+DEFAULT_BATCH_SIZE = 5000
+CATEGORIES = [value for value, _ in Transaction.CATEGORY_CHOICES]
+RECHARGE_REFERENCE = re.compile(r"Mobile Recharge \((?P<name>.*)\)")
+BILL_REFERENCE = re.compile(r"Bill Payment \((?P<name>.*)\)")
+
+
+def classify(receiver_account_id, reference, operators, billers):
+    """(category, operator_id, biller_id) for one row; operators/billers map names to ids."""
+    if receiver_account_id:
+        return "P2P", None, None
+    match = RECHARGE_REFERENCE.fullmatch(reference or "")
+    if match:
+        return "RECHARGE", operators.get(match["name"]), None
+    match = BILL_REFERENCE.fullmatch(reference or "")
+    if match:
+        return "BILL", None, billers.get(match["name"])
+    return None, None, None
+
+
+def classify_batch(model, after_id, batch_size, operators, billers):
+    """
+    Classify the unclassified rows among the next `batch_size` ids of
+    `model` (Transaction or an archive model). Returns (last id, rows updated).
+    """
+    rows = list(
+        model.objects.filter(id__gt=after_id).order_by("id")
+        .values_list("id", "receiver_account_id", "reference", "category", "sender_user_id", "receiver_user_id")
+        [:batch_size]
+    )
+    if not rows:
+        return None, 0
+
+    # one UPDATE per distinct (category, operator, biller) in the batch
+    groups = defaultdict(list)
+    users = set()
+    for txn_id, receiver_account_id, reference, category, sender_user_id, receiver_user_id in rows:
+        if category is None:
+            key = classify(receiver_account_id, reference, operators, billers)
+            if key[0]:
+                groups[key].append(txn_id)
+                users.update((sender_user_id, receiver_user_id))
+    updated = 0
+    for (category, operator_id, biller_id), ids in groups.items():
+        updated += model.objects.filter(id__in=ids, category__isnull=True).update(
+            category=category, operator_id=operator_id, biller_id=biller_id,
+        )
+    if updated:
+        UserDataVersion.bump(*users)
+    return rows[-1][0], updated
+
+
+def classify_transactions(batch_size=None, max_batches=None, reset=False):
+    """Backfill categories in the hot table, then every archive year. Returns stats."""
+    batch_size = batch_size or getattr(settings, "TRANSACTION_CLASSIFY_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    archive.upgrade_archive_tables()  # DDL: category/biller/operator columns on old archive tables
+    checkpoint = JobCheckpoint.load(archive.CATEGORY_CHECKPOINT)
+    if reset:
+        checkpoint.store()
+    position = checkpoint.position
+    last_ids, done = position.setdefault("last_ids", {}), position.setdefault("done", [])
+
+    operators = dict(Operator.objects.values_list("name", "id"))
+    billers = dict(Biller.objects.values_list("name", "id"))
+    tables = [("hot", Transaction)] + [(str(year), archive.archive_model(year)) for year in archive.archive_years()]
+
+    stats = {"classified": 0, "batches": 0, "finished": False}
+    for name, model in tables:
+        if name in done:
+            continue
+        while max_batches is None or stats["batches"] < max_batches:
+            with db_transaction.atomic():
+                last_id, updated = classify_batch(model, last_ids.get(name, 0), batch_size, operators, billers)
+                if last_id is None:
+                    done.append(name)
+                else:
+                    last_ids[name] = last_id
+                checkpoint.store(**position)
+            if last_id is None:
+                break
+            stats["classified"] += updated
+            stats["batches"] += 1
+        else:
+            return stats
+    stats["finished"] = True
+    return stats
@@ -0,0 +1,155 @@
+# backend/api/counterparties.py
+"""
+Who a user pays, ranked by frecency.
+
+CounterpartyStat holds one row per (payer, receiving account): payment
+count, total and last payment time, updated by payments.transfer in the
+transaction that moves the money. Suggestions are the payer's top rows by
+score, one index range scan on (owner, -rank).
+
+The score of a counterparty is the sum over its payments of
+2 ** -(age / PAYEE_FRECENCY_HALF_LIFE_DAYS): frequent and recent both
+count, and a payee paid once last week outranks one paid monthly two years
+ago. Decaying every row as time passes would mean rewriting them all, so
+the score is stored in log space relative to a fixed epoch:
+
+    rank = ln(sum of exp(rank_of(paid at)))    score(now) = exp(rank - rank_of(now))
+
+Every row decays by the same factor, so ordering by rank is ordering by
+score at any moment, and a payment only touches its own row (a log-sum-exp
+update, done in SQL so concurrent payments cannot lose one).
+
+rebuild() recomputes the table from the transaction log, hot and archived
+(rows written before the table existed, or after a change of half-life).
+Only SUCCESS transfers between two different users count.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from . import archive
+from .models import BankAccount, CounterpartyStat, Transaction, UserDataVersion
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+REBUILD_USERS = 500   # payers per rebuild chunk
+IN_BATCH = 900        # ids per IN (...), under SQLite's variable limit
+
+
+def half_life_seconds():
+    return getattr(settings, "PAYEE_FRECENCY_HALF_LIFE_DAYS", 14) * 86400
+
+
+def rank_of(when):
+    """Log-space weight of a payment made at `when` (grows by ln 2 every half-life)."""
+    return math.log(2) * (when - EPOCH).total_seconds() / half_life_seconds()
+
+
+def score(rank, now=None):
+    """The decayed score of a stored rank, as of `now`."""
+    return math.exp(rank - rank_of(now or timezone.now()))
+
+
+def combine(rank, weight):
+    """ln(exp(rank) + exp(weight)) without overflowing."""
+    high, low = max(rank, weight), min(rank, weight)
+    return high + math.log1p(math.exp(low - high))
+
+
+def record_payment(owner_id, account_id, amount, when):
+    """
+    Count a payment from user `owner_id` to `account_id`. Call inside the
+    atomic block that logs the transaction.
+    """
+    weight = Value(rank_of(when), output_field=FloatField())
+    updated = CounterpartyStat.objects.filter(owner_id=owner_id, account_id=account_id).update(
+        count=F("count") + 1,
+        total=F("total") + amount,
+        last_paid_at=when,
+        rank=Greatest(F("rank"), weight) + Ln(Value(1.0) + Exp(-Abs(F("rank") - weight))),
+    )
+    if updated:
+        return
+    try:
+        with db_transaction.atomic():
+            CounterpartyStat.objects.create(
+                owner_id=owner_id, account_id=account_id, count=1, total=amount,
+                last_paid_at=when, rank=rank_of(when),
+            )
+    except IntegrityError:  # a concurrent first payment created the row
+        record_payment(owner_id, account_id, amount, when)
+
+
+def suggestions(user, limit=8):
+    """The user's top `limit` CounterpartyStat rows, best first, with their accounts."""
+    return list(
+        CounterpartyStat.objects.filter(owner=user).select_related("account").order_by("-rank")[:limit]
+    )
+
+
+def _account_owners(account_ids):
+    owners = {}
+    ids = list(account_ids)
+    for start in range(0, len(ids), IN_BATCH):
+        owners.update(BankAccount.objects.filter(id__in=ids[start:start + IN_BATCH]).values_list("id", "user_id"))
+    return owners
+
+
+def _payments(model, sender_ids):
+    """(sender account, receiver account, amount, timestamp) of SUCCESS payments from the accounts."""
+    for start in range(0, len(sender_ids), IN_BATCH):
+        yield from (
+            model.objects.filter(sender_account_id__in=sender_ids[start:start + IN_BATCH], status="SUCCESS",
+                                 receiver_account_id__isnull=False)
+            .order_by().values_list("sender_account_id", "receiver_account_id", "amount", "timestamp")
+            .iterator(chunk_size=5000)
+        )
+
+
+def rebuild(chunk_users=REBUILD_USERS, progress=None):
+    """
+    Recompute CounterpartyStat from every transaction, hot and archived, a
+    chunk of payers at a time (each chunk replaced in one atomic block).
+    Payments made while a chunk is being read can be missed; run it when
+    the table is new or the half-life changed, not as routine upkeep.
+    Returns {"owners", "rows", "payments"}.
+    """
+    models = [Transaction] + [archive.archive_model(year) for year in archive.archive_years()]
+    stats = {"owners": 0, "rows": 0, "payments": 0}
+    user_ids = list(BankAccount.objects.order_by("user_id").values_list("user_id", flat=True).distinct())
+    for start in range(0, len(user_ids), chunk_users):
+        owners = user_ids[start:start + chunk_users]
+        account_owner = dict(BankAccount.objects.filter(user_id__in=owners).values_list("id", "user_id"))
+        sender_ids = sorted(account_owner)
+        pairs = defaultdict(lambda: [0, 0, None, None])  # (owner, account) -> count, total, last, rank
+        for model in models:
+            for sender_id, receiver_id, amount, when in _payments(model, sender_ids):
+                entry = pairs[account_owner[sender_id], receiver_id]
+                weight = rank_of(when)
+                entry[0] += 1
+                entry[1] += amount
+                entry[2] = when if entry[2] is None else max(entry[2], when)
+                entry[3] = weight if entry[3] is None else combine(entry[3], weight)
+                stats["payments"] += 1
+
+        receiver_owner = _account_owners({account for _, account in pairs})
+        rows = [
+            CounterpartyStat(owner_id=owner, account_id=account, count=count, total=total,
+                             last_paid_at=last, rank=rank)
+            for (owner, account), (count, total, last, rank) in pairs.items()
+            if account in receiver_owner and receiver_owner[account] != owner  # self transfers are not payees
+        ]
+        with db_transaction.atomic():
+            CounterpartyStat.objects.filter(owner_id__in=owners).delete()
+            CounterpartyStat.objects.bulk_create(rows, batch_size=1000)
+            UserDataVersion.bump(*owners)
+        stats["owners"] += len(owners)
+        stats["rows"] += len(rows)
+        if progress:
+            progress(stats)
+    return stats
@@ -0,0 +1,258 @@
+# backend/api/events.py
+"""
+Live payment notifications (SSE / long-poll) for the ASGI app.
+
+Every committed OutboxEvent becomes a "debit" message for the sender and,
+when it succeeded, a "credit" message for the receiver. Messages reach
+waiting connections through an in-process broker:
+
+  * events committed by this process are handed over from
+    transaction.on_commit (outbox.publish registers it), with no delay;
+  * events committed by other processes (other workers, run_mandates, ...)
+    are picked up by one tailer task per event loop that reads new outbox
+    rows every LIVE_EVENTS_POLL_INTERVAL seconds. That is one query per
+    process per tick however many clients are connected; it re-reads a
+    small overlap of ids and the broker drops what it already delivered.
+
+An idle connection is a coroutine waiting on a small asyncio.Queue, so a
+worker can hold thousands of them. A client that falls too far behind is
+disconnected and catches up with Last-Event-ID, replayed from the outbox.
+
+Django's ASGI handler keeps a thread (and its DB connection) for every
+request until the response is finished, which is what makes long-lived
+streams expensive. backend/asgi.py therefore serves the two live paths
+with api.live_asgi in front of Django; the Django views in api.views
+(same code below) remain for WSGI/runserver and tests.
+"""
+import asyncio
+import json
+import threading
+from collections import OrderedDict, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+
+from rest_framework.authtoken.models import Token
+
+from .models import OutboxEvent
+
+QUEUE_SIZE = 100
+RECENT_IDS = 10_000
+TAIL_OVERLAP = 200
+TAIL_BATCH = 500
+REPLAY_LIMIT = 200
+
+
+def messages_for(event):
+    """[(user_id, message)] for an OutboxEvent."""
+    p = event.payload
+    common = {
+        "id": event.id,
+        "topic": event.topic,
+        "transaction_id": p.get("transaction_id"),
+        "amount": p.get("amount"),
+        "status": p.get("status"),
+        "reference": p.get("reference"),
+        "receiver_name": p.get("receiver_name"),
+        "timestamp": p.get("timestamp"),
+    }
+    out = []
+    if p.get("sender_user_id"):
+        out.append((p["sender_user_id"], {**common, "type": "debit", "account_id": p.get("sender_account_id"),
+                                          "counterparty_account_id": p.get("receiver_account_id")}))
+    if p.get("receiver_user_id") and p.get("status") == "SUCCESS":
+        out.append((p["receiver_user_id"], {**common, "type": "credit", "account_id": p.get("receiver_account_id"),
+                                            "counterparty_account_id": p.get("sender_account_id")}))
+    return out
+
+
+def format_sse(message):
+    return f"id: {message['id']}\nevent: {message['type']}\ndata: {json.dumps(message)}\n\n"
+
+
+def replay(user_id, after_id, limit=REPLAY_LIMIT):
+    """Messages for the user from outbox events after `after_id`, oldest first."""
+    events = (
+        OutboxEvent.objects.filter(id__gt=after_id)
+        .filter(Q(payload__sender_user_id=user_id) | Q(payload__receiver_user_id=user_id))
+        .order_by("id")[:limit]
+    )
+    return [message for event in events for uid, message in messages_for(event) if uid == user_id]
+
+
+def latest_event_id():
+    return OutboxEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0
+
+
+def user_for_token(key):
+    token = Token.objects.select_related("user").filter(key=key).first()
+    return token.user if token and token.user.is_active else None
+
+
+class Subscriber:
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, message):
+        """Runs on the subscriber's loop. A full queue ends the stream (None)."""
+        if self.overflowed:
+            return
+        if self.queue.full():
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = None
+        self.queue.put_nowait(message)
+
+
+class Broker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)  # user_id -> {Subscriber}
+        self._recent = OrderedDict()           # outbox ids already fanned out
+        self._tailers = {}                      # loop -> tailer task
+
+    def subscribe(self, user_id):
+        """Register a waiter for user_id. Must be called from a running event loop."""
+        loop = asyncio.get_running_loop()
+        sub = Subscriber(user_id, loop)
+        with self._lock:
+            self._subscribers[user_id].add(sub)
+            if loop not in self._tailers or self._tailers[loop].done():
+                self._tailers[loop] = loop.create_task(self._tail(loop))
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subscribers.get(sub.user_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.user_id]
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+    def publish(self, event):
+        """Fan an OutboxEvent out to this process's waiters. Thread-safe, idempotent per event id."""
+        with self._lock:
+            if not self._subscribers or event.id in self._recent:
+                return
+            self._recent[event.id] = None
+            if len(self._recent) > RECENT_IDS:
+                self._recent.popitem(last=False)
+            targets = [(sub, message) for user_id, message in messages_for(event)
+                       for sub in self._subscribers.get(user_id, ())]
+        for sub, message in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, message)
+            except RuntimeError:  # the subscriber's loop is gone
+                self.unsubscribe(sub)
+
+    def _has_subscribers(self, loop):
+        with self._lock:
+            return any(sub.loop is loop for subs in self._subscribers.values() for sub in subs)
+
+    async def _tail(self, loop):
+        # runs in the shared thread pool: the task outlives the request that started it
+        interval = getattr(settings, "LIVE_EVENTS_POLL_INTERVAL", 0.5)
+        last_id = None
+        while True:
+            await asyncio.sleep(interval)
+            if not self._has_subscribers(loop):
+                return
+            if last_id is None:
+                last_id = await sync_to_async(latest_event_id, thread_sensitive=False)()
+                continue
+            for event in await sync_to_async(self._fetch, thread_sensitive=False)(last_id):
+                self.publish(event)
+                last_id = max(last_id, event.id)
+
+    @staticmethod
+    def _fetch(last_id):
+        return list(OutboxEvent.objects.filter(id__gt=last_id - TAIL_OVERLAP).order_by("id")[:TAIL_BATCH])
+
+
+broker = Broker()
+
+
+# ----- the two endpoints; `run_sync` wraps the DB calls (sync_to_async by default) -----
+
+async def sse_stream(user_id, last_id=None, lifetime=None, run_sync=sync_to_async):
+    """Async iterator of SSE text chunks for one connection."""
+    lifetime = getattr(settings, "LIVE_EVENTS_MAX_STREAM", 3600) if lifetime is None else lifetime
+    heartbeat = getattr(settings, "LIVE_EVENTS_HEARTBEAT", 15)
+    sub = broker.subscribe(user_id)  # before the replay, so nothing slips between the two
+    try:
+        yield "retry: 3000\n\n"
+        seen = 0
+        if last_id is not None:
+            seen = last_id
+            for message in await run_sync(replay)(user_id, last_id):
+                seen = max(seen, message["id"])
+                yield format_sse(message)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + lifetime
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                message = await asyncio.wait_for(sub.queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if message is None:  # fell behind; the client reconnects with Last-Event-ID
+                break
+            if message["id"] > seen:
+                yield format_sse(message)
+    finally:
+        broker.unsubscribe(sub)
+
+
+async def poll(user_id, after=None, timeout=25, run_sync=sync_to_async):
+    """Long-poll body: {"events": [...], "last_id": n}."""
+    if after is None:
+        return {"events": [], "last_id": await run_sync(latest_event_id)()}
+    sub = broker.subscribe(user_id)
+    try:
+        messages = await run_sync(replay)(user_id, after)
+        if not messages and timeout:
+            try:
+                first = await asyncio.wait_for(sub.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                first = None
+            if first is not None:
+                messages.append(first)
+                while not sub.queue.empty():
+                    message = sub.queue.get_nowait()
+                    if message is not None:
+                        messages.append(message)
+    finally:
+        broker.unsubscribe(sub)
+    messages = [m for m in messages if m["id"] > after]
+    return {"events": messages, "last_id": max([after] + [m["id"] for m in messages])}
+
+
+def parse_params(get, headers):
+    """
+    (token key, params) from query parameters and headers shared by both
+    front ends. Raises ValueError on malformed numbers.
+    """
+    auth = headers.get("authorization", "")
+    key = auth[6:].strip() if auth.startswith("Token ") else get("token")
+    last_id = headers.get("last-event-id") or get("last_event_id")
+    max_stream = getattr(settings, "LIVE_EVENTS_MAX_STREAM", 3600)
+
+    def bounded(name, default, upper):
+        value = get(name)
+        return default if value in (None, "") else max(0.0, min(float(value), upper))
+
+    return key, {
+        "last_id": int(last_id) if last_id else None,
+        "after": int(get("after")) if get("after") else None,
+        "lifetime": bounded("timeout", max_stream, max_stream),
+        "timeout": bounded("timeout", 25, 60),
+    }
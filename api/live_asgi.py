@@ -0,0 +1,94 @@
+# backend/api/live_asgi.py
+"""
+ASGI front for the live event endpoints (see api.events).
+
+Serves /api/events/stream/ and /api/events/poll/ directly and passes
+every other request to Django. Going around Django's handler means an
+open stream holds no thread and no DB connection: auth and replay run on
+the shared thread pool and the connection then just waits on its queue.
+Token auth only (Authorization header or ?token=); CORS follows
+CORS_ALLOW_ALL_ORIGINS.
+"""
+import asyncio
+import json
+from functools import partial
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.urls import reverse
+
+from . import events
+
+run_sync = partial(sync_to_async, thread_sensitive=False)
+
+
+class LiveEventsApp:
+    def __init__(self, django_app):
+        self.django_app = django_app
+        self._routes = None
+
+    def routes(self):
+        if self._routes is None:
+            self._routes = {reverse("events-stream"): self.stream, reverse("events-poll"): self.poll}
+        return self._routes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "GET":
+            handler = self.routes().get(scope["path"][len(scope.get("root_path", "")):] or scope["path"])
+            if handler:
+                return await self.handle(handler, scope, receive, send)
+        return await self.django_app(scope, receive, send)
+
+    async def handle(self, handler, scope, receive, send):
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        query = {k: v[-1] for k, v in parse_qs(scope["query_string"].decode("latin-1")).items()}
+        extra = []
+        if headers.get("origin") and getattr(settings, "CORS_ALLOW_ALL_ORIGINS", False):
+            extra.append((b"access-control-allow-origin", b"*"))
+        try:
+            key, params = events.parse_params(query.get, headers)
+        except ValueError:
+            return await self.json(send, 400, {"detail": "after, timeout and Last-Event-ID must be numbers"}, extra)
+        user = await run_sync(events.user_for_token)(key) if key else None
+        if user is None:
+            return await self.json(send, 401, {"detail": "Authentication credentials were not provided."}, extra)
+
+        # the request body is empty; the only thing left to receive is the disconnect
+        work = asyncio.ensure_future(handler(user, params, send, extra))
+        disconnect = asyncio.ensure_future(self.wait_disconnect(receive))
+        done, pending = await asyncio.wait({work, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        if work in done:
+            work.result()
+
+    @staticmethod
+    async def wait_disconnect(receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    @staticmethod
+    async def json(send, status, body, extra=()):
+        data = json.dumps(body).encode()
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(data)).encode()), *extra,
+        ]})
+        await send({"type": "http.response.body", "body": data})
+
+    async def stream(self, user, params, send, extra):
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"), *extra,
+        ]})
+        chunks = events.sse_stream(user.id, params["last_id"], params["lifetime"], run_sync=run_sync)
+        try:
+            async for chunk in chunks:
+                await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+        finally:
+            await chunks.aclose()
+        await send({"type": "http.response.body", "body": b""})
+
+    async def poll(self, user, params, send, extra):
+        body = await events.poll(user.id, params["after"], params["timeout"], run_sync=run_sync)
+        await self.json(send, 200, body, extra)
@@ -0,0 +1,32 @@
+# backend/api/management/commands/archive_transactions.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.archive import archive_transactions
+
+
+class Command(BaseCommand):
+    help = "Move transactions older than the hot horizon into per-year archive tables (resumable)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=None, help="Hot horizon in days (TRANSACTION_HOT_DAYS).")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches.")
+        parser.add_argument("--reset", action="store_true", help="Start over with a fresh horizon.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stats = archive_transactions(
+            hot_days=options["days"],
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+            reset=options["reset"],
+        )
+        elapsed = time.monotonic() - started
+        rate = stats["moved"] / elapsed if elapsed else 0
+        state = "done" if stats["finished"] else "paused, run again to resume"
+        self.stdout.write(
+            f"moved {stats['moved']} transactions older than {stats['horizon']:%Y-%m-%d} "
+            f"in {stats['batches']} batches, {elapsed:.1f}s ({rate:.0f}/s), {state}"
+        )
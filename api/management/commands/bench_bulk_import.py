@@ -0,0 +1,63 @@
+# backend/api/management/commands/bench_bulk_import.py
+import csv
+import os
+import tempfile
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.test.utils import override_settings
+
+from api.onboarding import DEFAULT_CHUNK_SIZE, import_accounts
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark the bulk account import on a generated CSV file (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument("--workers", type=int, default=None)
+        parser.add_argument(
+            "--fast-hasher", action="store_true",
+            help="Hash PINs with MD5 to measure the import pipeline without PBKDF2 cost.",
+        )
+
+    def handle(self, *args, **options):
+        rows, users = options["rows"], options["users"]
+        fd, path = tempfile.mkstemp(suffix=".csv")
+        try:
+            with os.fdopen(fd, "w", newline="") as out:
+                writer = csv.writer(out)
+                writer.writerow(["username", "holder_name", "bank_name", "account_number", "ifsc", "pin"])
+                for i in range(rows):
+                    writer.writerow([f"bench{i % users}", f"Employee {i}", "State Bank", f"{i:012d}", "SBIN0000001", "1234"])
+            self.stdout.write(f"{rows} rows for {users} users, file {os.path.getsize(path) / 1e6:.1f} MB")
+
+            hashers = ["django.contrib.auth.hashers.MD5PasswordHasher"] if options["fast_hasher"] else None
+            try:
+                with db_transaction.atomic():
+                    User.objects.bulk_create([User(username=f"bench{u}") for u in range(users)])
+                    with override_settings(**({"PASSWORD_HASHERS": hashers} if hashers else {})):
+                        started = time.monotonic()
+                        with open(path, "rb") as stream:
+                            report = import_accounts(
+                                stream, fmt="csv", chunk_size=options["chunk_size"], workers=options["workers"]
+                            )
+                        elapsed = time.monotonic() - started
+                    raise Rollback
+            except Rollback:
+                pass
+        finally:
+            os.unlink(path)
+
+        self.stdout.write(
+            f"{report['created']} created, {report['failed']} failed in {elapsed:.1f}s "
+            f"({report['total'] / elapsed:.0f} rows/s)"
+        )
@@ -0,0 +1,176 @@
+# backend/api/management/commands/bench_live_events.py
+import asyncio
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from api import events, payments
+from api.models import BankAccount, OutboxEvent
+
+PREFIX = "benchlive"
+
+
+def rss_kb():
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Connection:
+    """One SSE client driven straight through the ASGI application."""
+
+    def __init__(self, app, token):
+        self.app = app
+        self.token = token
+        self.closed = asyncio.Event()
+        self.status = None
+        self.received = {}  # transaction_id -> arrival time
+
+    async def receive(self):
+        if not getattr(self, "_sent_request", False):
+            self._sent_request = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await self.closed.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+        elif message["type"] == "http.response.body":
+            for block in message.get("body", b"").decode().split("\n\n"):
+                if "event: credit" in block:
+                    data = block.rsplit("data: ", 1)[1]
+                    txn_id = int(data.split('"transaction_id": ', 1)[1].split(",", 1)[0])
+                    self.received[txn_id] = time.perf_counter()
+
+    async def run(self):
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/api/events/stream/", "raw_path": b"/api/events/stream/",
+            "root_path": "", "query_string": f"token={self.token}".encode(),
+            "headers": [(b"host", b"testserver")], "client": ("127.0.0.1", 0), "server": ("testserver", 80),
+        }
+        await self.app(scope, self.receive, self.send)
+
+
+class Command(BaseCommand):
+    help = (
+        "Open many idle SSE connections against backend.asgi in-process, then measure memory per "
+        "connection and commit-to-client latency for same-process and cross-process payments. "
+        "Creates and removes its own users; run against a scratch database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--connections", type=int, default=2000)
+        parser.add_argument("--payments", type=int, default=100)
+
+    def handle(self, *args, **options):
+        from backend.asgi import application
+
+        n = options["connections"]
+        start_event = OutboxEvent.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        payer, receivers, tokens = self.setup(n)
+        try:
+            asyncio.run(self.run(application, payer, receivers, tokens, options["payments"]))
+        finally:
+            OutboxEvent.objects.filter(id__gt=start_event).delete()
+            User.objects.filter(username__startswith=PREFIX).delete()
+
+    def setup(self, n):
+        users = User.objects.bulk_create([User(username=f"{PREFIX}{i}") for i in range(n + 1)])
+        users = list(User.objects.filter(username__startswith=PREFIX).order_by("id"))
+        accounts = BankAccount.objects.bulk_create([
+            BankAccount(user=u, holder_name=u.username, bank_name="Bench Bank", account_number=f"7{i:011d}",
+                        ifsc="BNCH0000001", upi_id=f"{u.username}@gapy", amount=Decimal("1000000"))
+            for i, u in enumerate(users)
+        ])
+        tokens = Token.objects.bulk_create([Token(user=u, key=Token.generate_key()) for u in users[1:]])
+        return accounts[0], accounts[1:], [t.key for t in tokens]
+
+    async def run(self, app, payer, receivers, tokens, count):
+        n = len(tokens)
+        before = rss_kb()
+        conns = [Connection(app, token) for token in tokens]
+        tasks = [asyncio.create_task(c.run()) for c in conns]
+        started = time.perf_counter()
+        while events.broker.connection_count() < n:
+            await asyncio.sleep(0.05)
+            if time.perf_counter() - started > 120:
+                raise RuntimeError(f"only {events.broker.connection_count()} of {n} connected")
+        after = rss_kb()
+        self.stdout.write(
+            f"{n} idle SSE connections open in {time.perf_counter() - started:.1f}s, "
+            f"RSS +{(after - before) / 1024:.1f} MB ({(after - before) / n:.1f} KB per connection)"
+        )
+
+        step = max(1, n // count)
+        targets = [(receivers[i], conns[i]) for i in range(0, n, step)][:count]
+
+        # same process: commit in a worker thread, the broker hands over on commit
+        def pay_same_process():
+            sent = {}
+            for account, _ in targets:
+                started = time.perf_counter()
+                txn = payments.transfer(payer.id, account.id, Decimal("1"))
+                sent[txn.id] = started
+            connection.close()
+            return sent
+
+        sent = await sync_to_async(pay_same_process, thread_sensitive=False)()
+        await asyncio.sleep(0.5)
+        self.report("same process", sent, conns)
+
+        # another process: only the outbox tailer can see these
+        ids = ",".join(str(account.id) for account, _ in targets)
+        script = (
+            "from decimal import Decimal; import time; from api import payments\n"
+            f"for rid in [{ids}]:\n"
+            "    started = time.time()\n"
+            f"    t = payments.transfer({payer.id}, rid, Decimal('1'))\n"
+            "    print('sent', t.id, started)\n"
+        )
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, "manage.py", "shell", "-c", script,
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=dict(os.environ),
+        )
+        out, _ = await proc.communicate()
+        offset = time.time() - time.perf_counter()
+        sent = {
+            int(parts[1]): float(parts[2]) - offset
+            for parts in (line.split() for line in out.decode().splitlines())
+            if len(parts) == 3 and parts[0] == "sent"
+        }
+        await asyncio.sleep(2)
+        self.report("other process", sent, conns)
+
+        for c in conns:
+            c.closed.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def report(self, label, sent, conns):
+        latencies = []
+        for c in conns:
+            for txn_id, arrived in c.received.items():
+                if txn_id in sent:
+                    latencies.append(arrived - sent[txn_id])
+        if not latencies:
+            self.stdout.write(f"{label}: no messages delivered")
+            return
+        latencies.sort()
+        p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+        self.stdout.write(
+            f"{label}: {len(latencies)}/{len(sent)} delivered, commit-to-client "
+            f"p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms"
+        )
@@ -0,0 +1,87 @@
+# backend/api/management/commands/bench_renderer.py
+import datetime
+import gzip
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.middleware import brotli
+from api.models import BankAccount, Transaction
+from api.renderers import FastJSONRenderer, orjson
+from api.serializers import TransactionSerializer
+
+
+def transactions_payload(rows):
+    """What list_transactions renders: serializer output (Decimals and datetimes already strings)."""
+    now = timezone.now()
+    accounts = [
+        BankAccount(id=i, holder_name=f"Holder {i}", bank_name="State Bank", branch="Main", account_number=f"{i:012d}",
+                    ifsc="SBIN0000001", mobile="9999999999", upi_id=f"holder{i}.stat0001@gapy",
+                    amount=Decimal("12345.67"), created_at=now)
+        for i in range(1, 3)
+    ]
+    txns = [
+        Transaction(id=i, sender_account=accounts[i % 2], receiver_account=accounts[1 - i % 2],
+                    amount=Decimal(i % 50_000) / 100, timestamp=now - datetime.timedelta(minutes=i),
+                    status="SUCCESS", reference=f"ref {i}")
+        for i in range(rows)
+    ]
+    return TransactionSerializer(txns, many=True).data
+
+
+def typed_payload(rows):
+    """Rows of raw Decimal / datetime / UUID values, as views that build dicts by hand return them."""
+    now = timezone.now()
+    return [
+        {"id": i, "uuid": uuid.UUID(int=i), "amount": Decimal(i % 50_000) / 100, "at": now - datetime.timedelta(minutes=i),
+         "day": (now - datetime.timedelta(days=i % 365)).date(), "status": "SUCCESS", "note": None}
+        for i in range(rows)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's JSONRenderer with FastJSONRenderer on 10k-row payloads, and the bytes each encoding puts on the wire."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        self.stdout.write(f"orjson {'available' if orjson else 'NOT installed'}, brotli {'available' if brotli else 'NOT installed'}")
+
+        started = time.perf_counter()
+        payloads = {"transactions list": transactions_payload(rows)}
+        self.stdout.write(f"serializing {rows} transactions took {(time.perf_counter() - started) * 1000:.0f} ms (not renderer time)")
+        payloads["decimal/datetime/uuid"] = typed_payload(rows)
+
+        for label, data in payloads.items():
+            drf, fast = JSONRenderer().render(data), FastJSONRenderer().render(data)
+            if drf != fast:
+                self.stdout.write(self.style.WARNING(f"{label}: FastJSONRenderer output differs from DRF's"))
+            drf_ms = self.time(lambda: JSONRenderer().render(data), repeat)
+            fast_ms = self.time(lambda: FastJSONRenderer().render(data), repeat)
+            self.stdout.write(f"\n{label} ({rows} rows)")
+            self.stdout.write(f"  render   DRF JSONRenderer {drf_ms:8.1f} ms   FastJSONRenderer {fast_ms:8.1f} ms   ({drf_ms / fast_ms:.1f}x)")
+
+            self.stdout.write(f"  wire     identity {len(fast):>10,} B")
+            gz_ms = self.time(lambda: gzip.compress(fast, compresslevel=6, mtime=0), repeat)
+            gz = gzip.compress(fast, compresslevel=6, mtime=0)
+            self.stdout.write(f"           gzip-6   {len(gz):>10,} B  ({len(fast) / len(gz):4.1f}x smaller, {gz_ms:6.1f} ms)")
+            if brotli is not None:
+                br_ms = self.time(lambda: brotli.compress(fast, quality=5), repeat)
+                br = brotli.compress(fast, quality=5)
+                self.stdout.write(f"           br-5     {len(br):>10,} B  ({len(fast) / len(br):4.1f}x smaller, {br_ms:6.1f} ms)")
+
+    def time(self, fn, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings) * 1000
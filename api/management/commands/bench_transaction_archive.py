@@ -0,0 +1,121 @@
+# backend/api/management/commands/bench_transaction_archive.py
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from api import archive
+from api.models import BankAccount, JobCheckpoint, Transaction
+
+INSERT_BATCH = 10_000
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the transaction history hot path before and after archival. "
+        "Generates --rows transactions (default 50M); run it against a scratch database. "
+        "Its rows and any archive tables it created are removed afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50_000_000)
+        parser.add_argument("--accounts", type=int, default=5_000)
+        parser.add_argument("--years", type=int, default=5, help="Spread timestamps over this many years.")
+        parser.add_argument("--hot-days", type=int, default=365)
+        parser.add_argument("--samples", type=int, default=200)
+        parser.add_argument("--page", type=int, default=50)
+
+    def handle(self, *args, **options):
+        self.options = options
+        checkpoint = JobCheckpoint.load(archive.CHECKPOINT_NAME)
+        saved_position = dict(checkpoint.position)
+        accounts = self.create_accounts(options["accounts"])
+        try:
+            self.run({a.id: a.user_id for a in accounts})
+        finally:
+            self.cleanup(accounts, checkpoint, saved_position)
+
+    def create_accounts(self, count):
+        users = User.objects.bulk_create([User(username=f"bencharch{i}") for i in range(count)])
+        users = User.objects.filter(username__startswith="bencharch").order_by("id")
+        return BankAccount.objects.bulk_create([
+            BankAccount(user=user, holder_name=user.username, bank_name="Bench Bank", account_number=f"9{i:011d}",
+                        ifsc="BNCH0000001", upi_id=f"{user.username}.bench@gapy")
+            for i, user in enumerate(users)
+        ])
+
+    def run(self, owners):
+        account_ids = list(owners)
+        rows, span = self.options["rows"], timedelta(days=365 * self.options["years"])
+        rng = random.Random(42)
+        now = timezone.now()
+
+        started = time.monotonic()
+        for offset in range(0, rows, INSERT_BATCH):
+            Transaction.objects.bulk_create([
+                Transaction(
+                    sender_account_id=sender, sender_user_id=owners[sender],
+                    receiver_account_id=receiver, receiver_user_id=owners[receiver],
+                    amount=rng.randint(1, 500_000) / 100,
+                    timestamp=now - span * rng.random(),
+                    reference="bench",
+                )
+                for sender, receiver in (
+                    (rng.choice(account_ids), rng.choice(account_ids))
+                    for _ in range(min(INSERT_BATCH, rows - offset))
+                )
+            ])
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"inserted {rows} transactions in {elapsed:.1f}s ({rows / elapsed:.0f}/s)")
+
+        samples = [(owners[a], a) for a in (rng.choice(account_ids) for _ in range(self.options["samples"]))]
+        self.report("all hot", samples)
+
+        stats = archive.archive_transactions(hot_days=self.options["hot_days"], reset=True)
+        hot = Transaction.objects.filter(sender_account_id__in=account_ids).count()
+        self.stdout.write(
+            f"archived {stats['moved']} rows in {stats['batches']} batches; "
+            f"{hot} bench rows left hot, archive years {archive.archive_years()}"
+        )
+        self.report("after archival", samples)
+
+    def report(self, label, samples):
+        page = self.options["page"]
+        timings = {"first page": [], "page past horizon": []}
+        horizon = timezone.now() - timedelta(days=self.options["hot_days"])
+        for user_id, account_id in samples:
+            started = time.perf_counter()
+            archive.user_transactions(user_id, {account_id}, limit=page)
+            timings["first page"].append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            archive.user_transactions(user_id, {account_id}, before=(horizon, 0), limit=page)
+            timings["page past horizon"].append(time.perf_counter() - started)
+
+        for name, values in timings.items():
+            values.sort()
+            p95 = values[int(len(values) * 0.95) - 1] if len(values) > 1 else values[0]
+            self.stdout.write(
+                f"{label:>15} | {name:<18} p50 {statistics.median(values) * 1000:8.2f} ms   p95 {p95 * 1000:8.2f} ms"
+            )
+
+    def cleanup(self, accounts, checkpoint, saved_position):
+        ids = [a.id for a in accounts]
+        Transaction.objects.filter(sender_account_id__in=ids)._raw_delete(connection.alias)
+        Transaction.objects.filter(receiver_account_id__in=ids)._raw_delete(connection.alias)
+        kept_years = set(saved_position.get("years", []))
+        for year in archive.archive_years():
+            model = archive.archive_model(year)
+            model.objects.filter(sender_account_id__in=ids)._raw_delete(connection.alias)
+            model.objects.filter(receiver_account_id__in=ids)._raw_delete(connection.alias)
+            if year not in kept_years and not model.objects.exists():
+                with connection.schema_editor() as editor:
+                    editor.delete_model(model)
+                archive._ready.discard(year)
+        checkpoint.store(**saved_position)
+        User.objects.filter(username__startswith="bencharch").delete()
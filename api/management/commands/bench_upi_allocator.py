@@ -0,0 +1,60 @@
+# backend/api/management/commands/bench_upi_allocator.py
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction as db_transaction
+
+from api import upi
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = "Benchmark UPI id allocation for many accounts sharing one prefix (rolled back afterwards)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--accounts", type=int, default=100_000)
+        parser.add_argument("--report-every", type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        total = options["accounts"]
+        every = options["report_every"]
+        try:
+            self.counter = QueryCounter()
+            with db_transaction.atomic(), connection.execute_wrapper(self.counter):
+                self.run(total, every)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, total, every):
+        user = User.objects.create(username="benchupi")
+        self.stdout.write(f"prefix {upi.upi_prefix(user.username, 'State Bank')}, {total} accounts")
+        self.stdout.write(f"{'accounts':>10} {'allocs/s':>10} {'queries/alloc':>14} {'last id':>28}")
+        started = time.monotonic()
+        window = time.monotonic()
+        for i in range(1, total + 1):
+            before = self.counter.count
+            account = upi.create_bank_account(
+                user,
+                holder_name="Bench", bank_name="State Bank", account_number=f"{i:012d}", ifsc="SBIN0000001",
+            )
+            if i % every == 0:
+                queries = self.counter.count - before
+                rate = every / (time.monotonic() - window)
+                window = time.monotonic()
+                self.stdout.write(f"{i:>10} {rate:>10.0f} {queries:>14} {account.upi_id:>28}")
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"{total} accounts in {elapsed:.1f}s ({total / elapsed:.0f}/s)")
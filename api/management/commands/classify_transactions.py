@@ -0,0 +1,28 @@
+# backend/api/management/commands/classify_transactions.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.categories import classify_transactions
+
+
+class Command(BaseCommand):
+    help = "Backfill Transaction.category (and biller/operator) for older hot and archived rows (resumable)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches.")
+        parser.add_argument("--reset", action="store_true", help="Walk every table again from the start.")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        stats = classify_transactions(
+            batch_size=options["batch_size"],
+            max_batches=options["max_batches"],
+            reset=options["reset"],
+        )
+        elapsed = time.monotonic() - started
+        state = "done" if stats["finished"] else "paused, run again to resume"
+        self.stdout.write(
+            f"classified {stats['classified']} transactions in {stats['batches']} batches, {elapsed:.1f}s, {state}"
+        )
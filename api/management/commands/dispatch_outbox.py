@@ -0,0 +1,70 @@
+# backend/api/management/commands/dispatch_outbox.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver outbox events to the sinks in OUTBOX_SINKS (at-least-once, ids committed late after higher ones)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sink", action="append", help="Only these sinks (repeatable).")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--loop", action="store_true", help="Keep running as a worker.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Idle sleep in seconds with --loop.")
+        parser.add_argument("--stats", action="store_true", help="Only print pending events and lag per sink.")
+        parser.add_argument("--prune-days", type=int, default=None,
+                            help="Also delete events every sink has delivered and older than this.")
+
+    def handle(self, *args, **options):
+        sinks = outbox.configured_sinks()
+        if options["sink"]:
+            unknown = set(options["sink"]) - set(sinks)
+            if unknown:
+                raise CommandError(f"Unknown sink(s): {', '.join(sorted(unknown))}")
+            sinks = {name: sinks[name] for name in options["sink"]}
+        if not sinks:
+            raise CommandError("No sinks configured (settings.OUTBOX_SINKS).")
+
+        if options["stats"]:
+            self.report(sinks)
+            return
+
+        while True:
+            delivered = self.drain(sinks, options["batch_size"])
+            if options["prune_days"] is not None:
+                pruned = outbox.prune(outbox.configured_sinks(), keep_days=options["prune_days"])
+                if pruned:
+                    self.stdout.write(f"pruned {pruned} delivered events")
+            if not options["loop"]:
+                self.report(sinks)
+                break
+            if not delivered:
+                time.sleep(options["interval"])
+
+    def drain(self, sinks, batch_size):
+        """One pass: every sink takes batches until it is caught up or fails."""
+        total = 0
+        for name, sink in sinks.items():
+            started, count = time.monotonic(), 0
+            while True:
+                try:
+                    sent = outbox.dispatch_batch(name, sink, batch_size)
+                except outbox.SinkError as exc:
+                    self.stderr.write(f"{name}: {exc} (will retry)")
+                    break
+                if not sent:
+                    break
+                count += sent
+            if count:
+                elapsed = time.monotonic() - started
+                self.stdout.write(f"{name}: delivered {count} events in {elapsed:.2f}s ({count / elapsed:.0f}/s)")
+            total += count
+        return total
+
+    def report(self, sinks):
+        for name in sinks:
+            pending, seconds = outbox.lag(name)
+            self.stdout.write(f"{name}: {pending} pending, lag {seconds:.1f}s")
@@ -0,0 +1,49 @@
+# backend/api/management/commands/generate_statements.py
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.statements import generate_statements, statements_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Write every user's monthly statement (gzipped CSV) and an index under STATEMENTS_DIR, "
+        "using a process pool. Resumes after a crash; --reset starts the month over."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", default=None, help="YYYY-MM (default: last month).")
+        parser.add_argument("--workers", type=int, default=None, help="Processes (default: CPU count; 1 = no pool).")
+        parser.add_argument("--partition-size", type=int, default=None, help="User ids per partition.")
+        parser.add_argument("--reset", action="store_true", help="Regenerate ranges that are already done.")
+
+    def handle(self, *args, **options):
+        if options["month"]:
+            try:
+                first = datetime.datetime.strptime(options["month"], "%Y-%m")
+            except ValueError:
+                raise CommandError("--month must be YYYY-MM")
+        else:
+            first = (timezone.localdate().replace(day=1) - datetime.timedelta(days=1)).replace(day=1)
+        year, month = first.year, first.month
+
+        def progress(stats):
+            rate = stats["users"] / stats["elapsed"] if stats["elapsed"] else 0
+            self.stdout.write(f"  {stats['users']} users, {stats['transactions']} transactions ({rate:.0f} users/s)")
+
+        self.stdout.write(f"statements for {year:04d}-{month:02d} -> {statements_dir(year, month)}")
+        stats = generate_statements(
+            year, month,
+            workers=options["workers"],
+            partition_size=options["partition_size"],
+            reset=options["reset"],
+            progress=progress if options["verbosity"] > 1 else None,
+        )
+        rate = stats["users"] / stats["elapsed"] if stats["elapsed"] else 0
+        self.stdout.write(
+            f"wrote {stats['users']} statements ({stats['transactions']} transactions) in "
+            f"{stats['elapsed']:.1f}s ({rate:.0f} users/s); {stats['skipped']} of {stats['partitions']} "
+            f"partitions already done; index {stats['index']}"
+        )
@@ -0,0 +1,25 @@
+# backend/api/management/commands/rebuild_counterparty_stats.py
+from django.core.management.base import BaseCommand
+
+from api import counterparties
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the payee suggestion stats (CounterpartyStat) from every transaction, hot and archived. "
+        "Run once after installing, and after changing PAYEE_FRECENCY_HALF_LIFE_DAYS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-users", type=int, default=counterparties.REBUILD_USERS,
+                            help="Payers recomputed per atomic chunk.")
+
+    def handle(self, *args, **options):
+        def progress(stats):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {stats['owners']} payers, {stats['payments']} payments")
+
+        stats = counterparties.rebuild(chunk_users=options["chunk_users"], progress=progress)
+        self.stdout.write(
+            f"{stats['rows']} payee stats for {stats['owners']} payers from {stats['payments']} payments"
+        )
@@ -0,0 +1,41 @@
+# backend/api/management/commands/reconcile_balances.py
+from django.core.management.base import BaseCommand
+
+from api import reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that every BankAccount.amount equals its opening balance plus SUCCESS credits minus debits "
+        "(hot and archived). Drifting accounts are listed and kept in BalanceCheck."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--incremental", action="store_true",
+                            help="Only recheck accounts touched since the last run (full run if there is none).")
+        parser.add_argument("--chunk-size", type=int, default=None, help="Accounts per chunk (RECONCILE_CHUNK_SIZE).")
+        parser.add_argument("--accept", action="store_true",
+                            help="Record the drift found as opening balance (money funded outside the log).")
+        parser.add_argument("--top", type=int, default=20, help="How many of the largest drifts to print.")
+
+    def handle(self, *args, **options):
+        def progress(stats):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {stats['checked']} accounts checked, {stats['drifted']} drifting")
+
+        stats = reconcile.reconcile(
+            incremental=options["incremental"],
+            chunk_size=options["chunk_size"],
+            accept=options["accept"],
+            top=options["top"],
+            progress=progress,
+        )
+        mode = "incremental" if stats["incremental"] else "full"
+        rate = stats["checked"] / stats["elapsed"] if stats["elapsed"] else 0
+        self.stdout.write(
+            f"{mode} run: {stats['checked']} accounts checked in {stats['elapsed']:.1f}s ({rate:.0f}/s), "
+            f"{stats['drifted']} drifting"
+            + (" (accepted as opening balance)" if stats["accepted"] and stats["drifted"] else "")
+        )
+        for account_id, drift in stats["top"]:
+            self.stdout.write(f"  account {account_id}: balance off by {drift:+}")
@@ -0,0 +1,29 @@
+# backend/api/management/commands/run_mandates.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.mandates import run_due_mandates
+
+
+class Command(BaseCommand):
+    help = "Execute due autopay mandates (transfers, recharges, bill payments)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--workers", type=int, default=1, help="Threads executing mandates in parallel.")
+        parser.add_argument("--loop", action="store_true", help="Keep running as a worker.")
+        parser.add_argument("--interval", type=int, default=60, help="Seconds between runs with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            outcomes = run_due_mandates(batch_size=options["batch_size"], workers=options["workers"])
+            elapsed = time.monotonic() - started
+            total = sum(outcomes.values())
+            rate = total / elapsed * 60 if elapsed else 0
+            summary = ", ".join(f"{k}={v}" for k, v in sorted(outcomes.items())) or "nothing due"
+            self.stdout.write(f"{total} mandates in {elapsed:.1f}s ({rate:.0f}/min): {summary}")
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
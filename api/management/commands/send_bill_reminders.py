@@ -0,0 +1,40 @@
+# backend/api/management/commands/send_bill_reminders.py
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.reminders import send_due_reminders
+
+
+class Command(BaseCommand):
+    help = "Send bill payment reminders that are due and not sent yet (one email per user)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Treat this day (YYYY-MM-DD) as today.")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--reset", action="store_true", help="Send due reminders again, even those already sent.")
+        parser.add_argument("--loop", action="store_true", help="Keep running as a worker.")
+        parser.add_argument("--interval", type=int, default=300, help="Seconds between runs with --loop.")
+
+    def handle(self, *args, **options):
+        today = None
+        if options["date"]:
+            try:
+                today = datetime.date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError("--date must be YYYY-MM-DD")
+
+        reset = options["reset"]
+        while True:
+            started = time.monotonic()
+            stats = send_due_reminders(today=today, batch_size=options["batch_size"], reset=reset)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{stats['reminders']} reminders for {stats['users']} users "
+                f"({stats['emails']} emails, {stats['batches']} batches) in {elapsed:.1f}s"
+            )
+            if not options["loop"]:
+                break
+            reset = False
+            time.sleep(options["interval"])
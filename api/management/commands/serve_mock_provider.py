@@ -0,0 +1,31 @@
+# backend/api/management/commands/serve_mock_provider.py
+from django.core.management.base import BaseCommand
+
+from api.mock_providers import MockProviderServer
+
+
+class Command(BaseCommand):
+    help = "Local HTTP stand-in for the operator and biller APIs (set PROVIDER_BASE_URL to its address)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8098)
+        parser.add_argument("--latency", type=float, default=0.05, help="Seconds every call takes.")
+        parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds, at random.")
+        parser.add_argument("--tail-rate", type=float, default=0.0,
+                            help="Fraction of calls that take --tail-latency instead (slow tail, for hedging).")
+        parser.add_argument("--tail-latency", type=float, default=1.0)
+        parser.add_argument("--error-rate", type=float, default=0.0,
+                            help="Answer this fraction of calls with 503, to exercise the circuit breaker.")
+
+    def handle(self, *args, **options):
+        server = MockProviderServer(
+            ("127.0.0.1", options["port"]), latency=options["latency"], jitter=options["jitter"],
+            tail_rate=options["tail_rate"], tail_latency=options["tail_latency"], error_rate=options["error_rate"],
+        )
+        self.stdout.write(f"mock providers listening on {server.url}/<kind>/<code>/<op>")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
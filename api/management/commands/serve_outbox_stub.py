@@ -0,0 +1,46 @@
+# backend/api/management/commands/serve_outbox_stub.py
+import json
+import random
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Local HTTP stand-in for a downstream consumer of outbox events (for the 'http' sink)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=8099)
+        parser.add_argument("--fail-rate", type=float, default=0.0,
+                            help="Answer this fraction of batches with 503, to exercise retries.")
+
+    def handle(self, *args, **options):
+        command = self
+        seen = set()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if random.random() < options["fail_rate"]:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                events = json.loads(body or b"[]")
+                duplicates = sum(1 for e in events if e["id"] in seen)
+                seen.update(e["id"] for e in events)
+                command.stdout.write(
+                    f"received {len(events)} events (ids {events[0]['id']}..{events[-1]['id']}, "
+                    f"{duplicates} duplicates, {len(seen)} unique so far)" if events else "received empty batch"
+                )
+                self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", options["port"]), Handler)
+        self.stdout.write(f"outbox stub listening on http://127.0.0.1:{options['port']}/events")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,20 @@
+# backend/api/management/commands/settle_pending_payments.py
+from django.core.management.base import BaseCommand
+
+from api import payments
+
+
+class Command(BaseCommand):
+    help = (
+        "Ask operators and billers about recharges and bill payments left PENDING by an unanswered call: "
+        "complete the ones they made, refund the rest. Run it every few minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=None,
+                            help="Only settle payments at least this many seconds old (PROVIDER_SETTLE_AFTER).")
+
+    def handle(self, *args, **options):
+        outcomes = payments.settle_pending(older_than=options["older_than"])
+        summary = ", ".join(f"{k}={v}" for k, v in sorted(outcomes.items())) or "nothing due"
+        self.stdout.write(f"{sum(outcomes.values())} pending payments: {summary}")
@@ -0,0 +1,173 @@
+# backend/api/mandates.py
+"""
+Autopay scheduler.
+
+Due mandates are picked through the partial (next_run_at, id) index on ACTIVE
+rows, a batch at a time, and executed through the same debit helpers the
+views use (api.payments). Within a batch mandates are executed in payer
+account order so that workers running side by side take account locks in the
+same order.
+
+A mandate is claimed before it is executed: one conditional UPDATE moves
+next_run_at from the due time that was read to the next cycle. A worker
+whose UPDATE matches nothing lost the mandate to another one and leaves it
+alone, and a worker that dies between the debit and saving the outcome has
+already moved the mandate on, so no cycle is ever paid twice (a crash
+before the debit skips that cycle instead).
+
+Insufficient balance and failed operator/biller calls (api.providers) are
+retried with exponential backoff; once the retries are used up that cycle is
+skipped and the mandate moves on to its next date. A cycle being retried
+keeps the date it was due in cycle_due_at, and the next cycle is counted
+from that date, not from the retry, so retries never move the billing day. A call that went
+unanswered is never retried (it may have been paid): the payment is left to
+payments.settle_pending() and the mandate moves on.
+"""
+import calendar
+import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from . import payments, providers
+from .models import Mandate
+
+DEFAULT_BATCH_SIZE = 500
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    year = value.year + month // 12
+    month = month % 12 + 1
+    day = min(value.day, calendar.monthrange(year, month)[1])
+    return value.replace(year=year, month=month, day=day)
+
+
+def next_occurrence(value, frequency):
+    if frequency == "DAILY":
+        return value + datetime.timedelta(days=1)
+    if frequency == "WEEKLY":
+        return value + datetime.timedelta(weeks=1)
+    return add_months(value, 1)
+
+
+def schedule_next(mandate, now):
+    """
+    Advance next_run_at to the first cycle after the current one that is
+    past `now` (a stalled scheduler must not fire a backlog of cycles).
+    """
+    nxt = next_occurrence(mandate.cycle_due_at or mandate.next_run_at, mandate.frequency)
+    while nxt <= now:
+        nxt = next_occurrence(nxt, mandate.frequency)
+    mandate.next_run_at = nxt
+    mandate.cycle_due_at = None
+    mandate.retry_count = 0
+
+
+def claim(mandate, now):
+    """
+    Take a due mandate for this worker by moving it to its next cycle, if
+    nobody else has. Returns False when another worker got there first.
+    """
+    due_at, retries = mandate.next_run_at, mandate.retry_count
+    schedule_next(mandate, now)
+    mandate.retry_count = retries
+    return bool(
+        Mandate.objects.filter(id=mandate.id, status="ACTIVE", next_run_at=due_at)
+        .update(next_run_at=mandate.next_run_at, cycle_due_at=None, last_run_at=now)
+    )
+
+
+def execute(mandate):
+    """Run one debit for the mandate. Raises payments.PaymentError on failure."""
+    amount = mandate.amount
+    if mandate.kind == "TRANSFER":
+        return payments.transfer(
+            mandate.payer_account_id, mandate.payee_account_id, amount,
+            mandate.reference or "Autopay", record_failure=False,
+        )
+    if mandate.kind == "RECHARGE":
+        return payments.recharge(
+            mandate.user, mandate.payer_account_id, mandate.operator, mandate.consumer_number, amount
+        )
+    if mandate.kind == "BILL":
+        return payments.pay_bill(
+            mandate.user, mandate.payer_account_id, mandate.biller, mandate.consumer_number, amount
+        )
+    raise payments.PaymentError(f"Unknown mandate kind {mandate.kind}")
+
+
+def run_mandate(mandate, now):
+    """Claim a due mandate, execute it and record the outcome. Returns the outcome name."""
+    max_retries = getattr(settings, "MANDATE_MAX_RETRIES", 3)
+    backoff = getattr(settings, "MANDATE_RETRY_BACKOFF", 900)
+
+    cycle = mandate.cycle_due_at or mandate.next_run_at
+    if not claim(mandate, now):
+        return "taken"
+    mandate.last_run_at = now
+    try:
+        execute(mandate)
+    except payments.PaymentPending as exc:  # sent, maybe paid: this cycle is done either way
+        mandate.last_error = str(exc)[:255]
+        mandate.retry_count = 0
+        outcome = "pending"
+    except (payments.InsufficientFunds, providers.ProviderError) as exc:  # may succeed later: back off
+        mandate.retry_count += 1
+        mandate.last_error = str(exc)[:255]
+        if mandate.retry_count > max_retries:
+            mandate.retry_count = 0  # already claimed onto the next cycle
+            outcome = "skipped"
+        else:
+            mandate.next_run_at = now + datetime.timedelta(seconds=backoff * 2 ** (mandate.retry_count - 1))
+            mandate.cycle_due_at = cycle
+            outcome = "retry"
+    except Exception as exc:
+        # payee/biller gone, bad data, ...: stop until the user looks at it
+        mandate.status = "PAUSED"
+        mandate.last_error = str(exc)[:255]
+        outcome = "paused"
+    else:
+        mandate.last_error = ""
+        mandate.retry_count = 0
+        outcome = "success"
+
+    mandate.save(update_fields=["next_run_at", "cycle_due_at", "status", "retry_count", "last_run_at", "last_error"])
+    return outcome
+
+
+def _run_in_thread(mandate, now):
+    try:
+        return run_mandate(mandate, now)
+    finally:
+        connection.close()
+
+
+def run_due_mandates(now=None, batch_size=None, workers=1):
+    """Execute every mandate due at `now`. Returns a Counter of outcomes."""
+    now = now or timezone.now()
+    batch_size = batch_size or getattr(settings, "MANDATE_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    outcomes = Counter()
+
+    while True:
+        batch = list(
+            Mandate.objects.filter(status="ACTIVE", next_run_at__lte=now)
+            .select_related("user", "biller", "operator")
+            .order_by("next_run_at", "id")[:batch_size]
+        )
+        if not batch:
+            break
+        batch.sort(key=lambda m: (m.payer_account_id, m.id))
+
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                outcomes.update(pool.map(lambda m: _run_in_thread(m, now), batch))
+        else:
+            outcomes.update(run_mandate(m, now) for m in batch)
+
+        if len(batch) < batch_size:
+            break
+    return outcomes
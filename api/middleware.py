@@ -0,0 +1,141 @@
+# backend/api/middleware.py
+"""
+Response middleware for the API: conditional GET for the per-user list
+endpoints and negotiated compression.
+"""
+import gzip
+import hashlib
+
+from django.conf import settings
+from django.http import HttpResponseNotModified
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+
+from rest_framework.authtoken.models import Token
+
+try:
+    import brotli
+except ImportError:  # optional; pip install brotli
+    brotli = None
+
+
+class DataVersionETagMiddleware:
+    """
+    For GET/HEAD requests to the url names in settings.DATA_VERSION_ETAG_VIEWS
+    made with a DRF token, the ETag is derived from the user's UserDataVersion,
+    the view and the query string. That takes one query (token -> user ->
+    version), so a matching If-None-Match is answered 304 before the view
+    runs any of its own. Session-authenticated requests pass through untouched.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.url_names = set(getattr(settings, "DATA_VERSION_ETAG_VIEWS", ()))
+
+    def __call__(self, request):
+        etag = self.etag_for(request)
+        if etag is None:
+            return self.get_response(request)
+
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = HttpResponseNotModified()
+        else:
+            response = self.get_response(request)
+            if response.status_code != 200:
+                return response
+        # the version is read before the view runs, so a write racing the
+        # view can only make the tag older than the body, never newer
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Authorization"])
+        return response
+
+    def etag_for(self, request):
+        if request.method not in ("GET", "HEAD"):
+            return None
+        auth = request.headers.get("Authorization", "")
+        if not auth.startswith("Token "):
+            return None
+        try:
+            url_name = resolve(request.path_info).url_name
+        except Resolver404:
+            return None
+        if url_name not in self.url_names:
+            return None
+
+        row = (
+            Token.objects.filter(key=auth[6:].strip(), user__is_active=True)
+            .values_list("user_id", "user__data_version__version")
+            .first()
+        )
+        if row is None:
+            return None  # let the view reject the token
+        user_id, version = row
+        query = hashlib.blake2b(f"{url_name}?{request.META.get('QUERY_STRING', '')}".encode(), digest_size=6)
+        return f'W/"{user_id}.{version or 0}.{query.hexdigest()}"'
+
+
+class CompressionMiddleware:
+    """
+    Compress text and JSON responses of at least COMPRESS_MIN_SIZE bytes
+    with the best encoding the client accepts: brotli (when the brotli
+    package is installed), then gzip. Streaming responses (SSE, downloads)
+    are left alone.
+    """
+    COMPRESSIBLE = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, "COMPRESS_MIN_SIZE", 1024)
+        self.gzip_level = getattr(settings, "COMPRESS_GZIP_LEVEL", 6)
+        self.brotli_quality = getattr(settings, "COMPRESS_BROTLI_QUALITY", 5)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or len(response.content) < self.min_size
+            or not response.get("Content-Type", "").startswith(self.COMPRESSIBLE)
+        ):
+            return response
+
+        # a compressed body is a different representation even if the client ignores it
+        patch_vary_headers(response, ["Accept-Encoding"])
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+        if encoding == "br":
+            body = brotli.compress(response.content, quality=self.brotli_quality)
+        elif encoding == "gzip":
+            body = gzip.compress(response.content, compresslevel=self.gzip_level, mtime=0)
+        else:
+            return response
+        if len(body) >= len(response.content):
+            return response
+
+        response.content = body
+        response["Content-Length"] = str(len(body))
+        response["Content-Encoding"] = encoding
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag  # the bytes differ from the identity body
+        return response
+
+
+def negotiate_encoding(accept_encoding):
+    """'br', 'gzip' or None for an Accept-Encoding header, honouring q=0."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    star = accepted.get("*", 0.0)
+    for name in (("br", "gzip") if brotli is not None else ("gzip",)):
+        if accepted.get(name, star) > 0:
+            return name
+    return None
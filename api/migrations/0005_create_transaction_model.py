@@ -8,7 +8,7 @@ class Migration(migrations.Migration):
     initial = False
 
     dependencies = [
-        ('api', '0001_initial'),  # <-- REPLACE this with your last migration (e.g. '0003_auto_2025...'), keep quotes
+        ('api', '0002_bankaccount'),
     ]
 
     operations = [
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 16:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_missing_tables(apps, schema_editor):
+    # Databases created before this migration already have these tables
+    # (their CreateModel operations were dropped from 0010-0013).
+    existing = schema_editor.connection.introspection.table_names()
+    for name in ("Payee", "SavedPayee"):
+        model = apps.get_model("api", name)
+        if model._meta.db_table not in existing:
+            schema_editor.create_model(model)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_mandate'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+        migrations.CreateModel(
+            name='Payee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('phone', models.CharField(blank=True, max_length=20, null=True)),
+                ('upi_id', models.CharField(blank=True, max_length=64, null=True)),
+                ('email', models.EmailField(blank=True, max_length=254, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payee_user', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SavedPayee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('added_at', models.DateTimeField(auto_now_add=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_payees', to=settings.AUTH_USER_MODEL)),
+                ('payee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_by', to='api.payee')),
+            ],
+            options={
+                'unique_together': {('owner', 'payee')},
+            },
+        ),
+        ]),
+        migrations.RunPython(create_missing_tables, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+
+BACKFILL_BATCH = 10_000
+
+
+def backfill_owners(apps, schema_editor):
+    # id-range batches, each committed on its own, so a big table is never
+    # locked for the whole backfill and an interrupted run just continues
+    Transaction = apps.get_model("api", "Transaction")
+    BankAccount = apps.get_model("api", "BankAccount")
+    db = schema_editor.connection.alias
+    qs = Transaction.objects.using(db)
+    bounds = qs.aggregate(lo=models.Min("id"), hi=models.Max("id"))
+    if bounds["lo"] is None:
+        return
+
+    def owner(column):
+        return Subquery(BankAccount.objects.using(db).filter(id=OuterRef(column)).values("user_id")[:1])
+
+    for start in range(bounds["lo"], bounds["hi"] + 1, BACKFILL_BATCH):
+        batch = qs.filter(id__gte=start, id__lt=start + BACKFILL_BATCH)
+        with transaction.atomic(using=db):
+            batch.filter(sender_user__isnull=True).update(sender_user_id=owner("sender_account_id"))
+            batch.filter(receiver_user__isnull=True, receiver_account__isnull=False).update(
+                receiver_user_id=owner("receiver_account_id")
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('api', '0018_transaction_timestamp_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='receiver_user',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='received_transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='sender_user',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sent_transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(backfill_owners, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['sender_user', 'timestamp'], name='txn_sender_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['receiver_user', 'timestamp'], name='txn_receiver_user_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:48
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_userdataversion'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transaction',
+            name='biller',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.biller'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='category',
+            field=models.CharField(blank=True, choices=[('P2P', 'Transfer'), ('RECHARGE', 'Mobile Recharge'), ('BILL', 'Bill Payment')], max_length=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='operator',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.operator'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['sender_user', 'category', 'timestamp'], name='txn_sender_cat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['receiver_user', 'category', 'timestamp'], name='txn_receiver_cat_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-19 17:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_bankaccount_user_bank_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheck',
+            fields=[
+                ('account', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance_check', serialize=False, to='api.bankaccount')),
+                ('opening', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('drift', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('checked_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
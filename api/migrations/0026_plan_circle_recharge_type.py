@@ -0,0 +1,27 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0025_operator_catalog_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='circle',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='plan',
+            name='recharge_type',
+            field=models.CharField(choices=[('prepaid', 'Prepaid'), ('postpaid', 'Postpaid')], default='prepaid', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['operator', 'circle', 'recharge_type', 'category'], name='plan_catalog_idx'),
+        ),
+    ]
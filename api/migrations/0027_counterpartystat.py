@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:19
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0026_plan_circle_recharge_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CounterpartyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('last_paid_at', models.DateTimeField()),
+                ('rank', models.FloatField(default=0.0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.bankaccount')),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counterparty_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', '-rank'], name='counterparty_frecency_idx')],
+                'unique_together': {('owner', 'account')},
+            },
+        ),
+    ]
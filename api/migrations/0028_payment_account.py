@@ -0,0 +1,34 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:34
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0027_counterpartystat'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billpayment',
+            name='account',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.bankaccount'),
+        ),
+        migrations.AddField(
+            model_name='mobilerecharge',
+            name='account',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.bankaccount'),
+        ),
+        migrations.AddIndex(
+            model_name='billpayment',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['created_at'], name='billpay_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mobilerecharge',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['created_at'], name='recharge_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:54
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+from django.utils import timezone
+
+
+def mark_already_reminded(apps, schema_editor):
+    # the scanner used to keep a (reminder_date, id) watermark instead: rows up to it were mailed
+    JobCheckpoint = apps.get_model("api", "JobCheckpoint")
+    BillPayment = apps.get_model("api", "BillPayment")
+    position = JobCheckpoint.objects.filter(name="bill_reminders").values_list("position", flat=True).first() or {}
+    if position.get("reminder_date"):
+        date = position["reminder_date"]
+        BillPayment.objects.filter(
+            Q(reminder_date__lt=date) | Q(reminder_date=date, id__lte=position.get("id", 0)),
+            status__in=("PENDING", "SUCCESS"),
+        ).update(reminded_at=timezone.now())
+    JobCheckpoint.objects.filter(name="bill_reminders").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0028_payment_account'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='billpayment',
+            name='billpay_reminder_due_idx',
+        ),
+        migrations.AddField(
+            model_name='billpayment',
+            name='reminded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='billpayment',
+            index=models.Index(condition=models.Q(('reminded_at__isnull', True), ('reminder_date__isnull', False)), fields=['user', 'id'], name='billpay_unreminded_idx'),
+        ),
+        migrations.RunPython(mark_already_reminded, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 19:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0029_bill_reminded_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mandate',
+            name='cycle_due_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
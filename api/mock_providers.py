@@ -0,0 +1,136 @@
+# backend/api/mock_providers.py
+"""
+Stand-in operator and biller APIs, for development and tests.
+
+mock_response() is what every mock provider answers. api.providers calls
+it in process (sleeping MOCK_PROVIDER_LATENCY) when no PROVIDER_BASE_URL
+is set; MockProviderServer serves it over HTTP (python manage.py
+serve_mock_provider) with injectable latency, slow tails and error rates,
+so timeouts, the circuit breaker and hedging can be exercised against a
+real socket.
+
+Protocol: POST /<kind>/<provider name>/<op> with a JSON body; 200 and a
+JSON answer, or 503 for an injected failure. Payments are remembered by
+reference (per process), so "status" answers whether one went through,
+and paying the same reference twice pays once.
+"""
+import collections
+import datetime
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAID_MEMORY = 100_000  # payments remembered for status calls
+
+_paid_lock = threading.Lock()
+_paid = collections.OrderedDict()  # "kind:name:reference" -> provider txn
+
+
+def mock_bill(consumer_number):
+    """A plausible bill derived from the consumer number: due in a week, for last month."""
+    seed = sum(ord(c) for c in consumer_number[-4:]) if len(consumer_number) >= 4 else len(consumer_number) * 7
+    amount = Decimal(50 + seed % 100).quantize(Decimal("0.01"))  # 50..149.00
+    today = datetime.date.today()
+    return {
+        "amount": str(amount),
+        "due_date": (today + datetime.timedelta(days=7)).isoformat(),
+        "period": (today - datetime.timedelta(days=30)).strftime("%b %Y"),
+    }
+
+
+def mock_response(kind, name, op, payload):
+    """The answer to `op`: "fetch" (a bill), "pay" (remembered by reference) or "status" (of a payment)."""
+    if op == "fetch":
+        return mock_bill(str(payload.get("consumer_number", "")))
+    key = f"{kind}:{name}:{payload.get('reference')}"
+    if op == "status":
+        with _paid_lock:
+            provider_txn = _paid.get(key)
+        if provider_txn is None:
+            return {"status": "NOT_FOUND", "reference": payload.get("reference")}
+        return {"status": "SUCCESS", "provider_txn": provider_txn, "reference": payload.get("reference")}
+    prefix = "MOCK-BILL" if kind == "bill" else "MOCK"
+    with _paid_lock:
+        provider_txn = _paid.setdefault(key, f"{prefix}-{uuid.uuid4().hex[:10]}")  # same reference, same payment
+        while len(_paid) > PAID_MEMORY:
+            _paid.popitem(last=False)
+    return {"provider_txn": provider_txn, "reference": payload.get("reference")}
+
+
+def _pick(value, n):
+    """Fault values are numbers, or sequences applied to successive calls (cycled)."""
+    return value[n % len(value)] if isinstance(value, (list, tuple)) else value
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            kind, name, op = self.path.strip("/").split("/")
+        except ValueError:
+            self.send_error(404)
+            return
+        n, fault = self.server.next_call(kind, name)
+        delay = _pick(fault.get("latency", 0), n) + random.uniform(0, _pick(fault.get("jitter", 0), n))
+        if random.random() < _pick(fault.get("tail_rate", 0), n):
+            delay = _pick(fault.get("tail_latency", 1.0), n)
+        time.sleep(delay)
+        if random.random() < _pick(fault.get("error_rate", 0), n):
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        answer = json.dumps(mock_response(kind, name, op, json.loads(body or b"{}"))).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(answer)))
+        self.end_headers()
+        self.wfile.write(answer)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockProviderServer(ThreadingHTTPServer):
+    """
+    The mock providers over HTTP. `faults` maps "kind:name" (or "kind", or
+    "*") to {"latency", "jitter", "tail_rate", "tail_latency",
+    "error_rate"} in seconds and fractions; it can be changed while serving.
+    """
+    daemon_threads = True
+    block_on_close = False  # calls abandoned by a timed out client may still be sleeping
+
+    def __init__(self, address=("127.0.0.1", 0), **default_fault):
+        super().__init__(address, _Handler)
+        self.faults = {"*": default_fault}
+        self.calls = collections.Counter()  # "kind:name" -> requests received
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def next_call(self, kind, name):
+        key = f"{kind}:{name}"
+        with self._lock:
+            n = self.calls[key]
+            self.calls[key] += 1
+        return n, self.faults.get(key) or self.faults.get(kind) or self.faults.get("*") or {}
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):  # clients that timed out hang up mid-answer
+            super().handle_error(request, client_address)
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="mock-provider", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
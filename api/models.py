@@ -50,6 +50,8 @@ class BankAccount(models.Model):
         unique_together = ('user', 'account_number')
         indexes = [
             models.Index(fields=['user', 'account_number']),
+            # the balances view lists a user's accounts ordered by bank
+            models.Index(fields=['user', 'bank_name'], name='bankacct_user_bank_idx'),
         ]
 
     def __str__(self):
@@ -67,6 +69,18 @@ class BankAccount(models.Model):
 
 
 
+class UpiSequence(models.Model):
+    """
+    Per-prefix counter behind UPI id allocation (see api/upi.py).
+    prefix is "<username>.<bankabbr>", last_value the number of ids handed out.
+    """
+    prefix = models.CharField(max_length=32, unique=True)
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.prefix} ({self.last_value})"
+
+
 class Payee(models.Model):
     name = models.CharField(max_length=200)
     phone = models.CharField(max_length=20, blank=True, null=True)
@@ -104,6 +118,13 @@ class Transaction(models.Model):
         ("SUCCESS", "Success"),
         ("FAILED", "Failed"),
     )
+    # what the money was for; set at write time by api.payments, older rows
+    # by the classify_transactions backfill (NULL until then)
+    CATEGORY_CHOICES = (
+        ("P2P", "Transfer"),
+        ("RECHARGE", "Mobile Recharge"),
+        ("BILL", "Bill Payment"),
+    )
 
     sender_account = models.ForeignKey(
         "BankAccount",
@@ -119,12 +140,48 @@ class Transaction(models.Model):
         null=True
     )
 
+    # owners of the two accounts, copied at write time so per-user history
+    # is two index range scans instead of an OR over account ids
+    sender_user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="sent_transactions",
+        null=True, blank=True, db_index=False,
+    )
+    receiver_user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="received_transactions",
+        null=True, blank=True, db_index=False,
+    )
+
     # For cases where receiver is not a BankAccount (e.g., mobile number, merchant name)
     receiver_name = models.CharField(max_length=255, blank=True, null=True)
     amount = models.DecimalField(max_digits=12, decimal_places=3)
     timestamp = models.DateTimeField(default=timezone.now)
     status = models.CharField(max_length=10, choices=TXN_STATUS, default="SUCCESS")
     reference = models.CharField(max_length=128, blank=True, null=True)
+    category = models.CharField(max_length=16, choices=CATEGORY_CHOICES, blank=True, null=True)
+    biller = models.ForeignKey("Biller", on_delete=models.SET_NULL, null=True, blank=True, db_index=False)
+    operator = models.ForeignKey("Operator", on_delete=models.SET_NULL, null=True, blank=True, db_index=False)
+
+    class Meta:
+        indexes = [
+            # archival walks the table oldest-first (api.archive)
+            models.Index(fields=["timestamp", "id"], name="txn_timestamp_idx"),
+            models.Index(fields=["sender_user", "timestamp"], name="txn_sender_user_idx"),
+            models.Index(fields=["receiver_user", "timestamp"], name="txn_receiver_user_idx"),
+            # history and stats filtered by ?category=
+            models.Index(fields=["sender_user", "category", "timestamp"], name="txn_sender_cat_idx"),
+            models.Index(fields=["receiver_user", "category", "timestamp"], name="txn_receiver_cat_idx"),
+        ]
+
+    def fill_owners(self):
+        """Copy the account owners into sender_user/receiver_user (bulk_create callers must call this)."""
+        if self.sender_user_id is None and self.sender_account_id:
+            self.sender_user_id = self.sender_account.user_id
+        if self.receiver_user_id is None and self.receiver_account_id:
+            self.receiver_user_id = self.receiver_account.user_id
+
+    def save(self, *args, **kwargs):
+        self.fill_owners()
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.sender_account.holder_name} → {self.receiver_account.holder_name} : ₹{self.amount} ({self.status})"
@@ -138,12 +195,18 @@ class Operator(models.Model):
     code = models.CharField(max_length=50, unique=True)
     name = models.CharField(max_length=120)
     logo = models.URLField(blank=True, null=True)
+    # stamped whenever one of its plans changes; api.plan_index rebuilds on a new value
+    catalog_updated_at = models.DateTimeField(null=True, blank=True)
 
     def __str__(self):
         return self.name
 
 class Plan(models.Model):
+    TYPE_CHOICES = (("prepaid", "Prepaid"), ("postpaid", "Postpaid"))
     operator = models.ForeignKey(Operator, on_delete=models.CASCADE, related_name="plans")
+    # blank: offered in every circle; a circle code makes it that circle's own plan
+    circle = models.CharField(max_length=64, blank=True, default="")
+    recharge_type = models.CharField(max_length=10, choices=TYPE_CHOICES, default="prepaid")
     category = models.CharField(max_length=40)   # data / 5g / topup / unlimited
     plan_code = models.CharField(max_length=120, blank=True)
     amount = models.DecimalField(max_digits=8, decimal_places=2)
@@ -151,6 +214,11 @@ class Plan(models.Model):
     validity = models.CharField(max_length=80, blank=True)
     description = models.TextField(blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["operator", "circle", "recharge_type", "category"], name="plan_catalog_idx"),
+        ]
+
     def __str__(self):
         return f"{self.operator.name} {self.title or self.plan_code} ₹{self.amount}"
 
@@ -165,6 +233,14 @@ class MobileRecharge(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
     provider_txn = models.CharField(max_length=200, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # the account debited, refunded if a PENDING recharge turns out not to have happened
+    account = models.ForeignKey("BankAccount", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+
+    class Meta:
+        indexes = [
+            # partial index used by the settlement of unconfirmed recharges (settle_pending_payments)
+            models.Index(fields=["created_at"], name="recharge_pending_idx", condition=models.Q(status="PENDING")),
+        ]
 
 
 # bill payments
@@ -207,10 +283,182 @@ class BillPayment(models.Model):
     provider_txn = models.CharField(max_length=128, blank=True, null=True)
     paid_on = models.DateTimeField(blank=True, null=True)
     reminder_date = models.DateField(blank=True, null=True)
+    reminded_at = models.DateTimeField(blank=True, null=True)  # when the reminder email went out
     created_at = models.DateTimeField(auto_now_add=True)
+    # the account debited, refunded if a PENDING payment turns out not to have happened
+    account = models.ForeignKey("BankAccount", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
 
     def __str__(self):
         return f"{self.user} → {self.biller.name} : ₹{self.amount} ({self.status})"
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # partial index used by the reminder scanner (send_bill_reminders): unsent reminders only
+            models.Index(
+                fields=["user", "id"],
+                name="billpay_unreminded_idx",
+                condition=models.Q(reminder_date__isnull=False, reminded_at__isnull=True),
+            ),
+            # partial index used by the settlement of unconfirmed payments (settle_pending_payments)
+            models.Index(fields=["created_at"], name="billpay_pending_idx", condition=models.Q(status="PENDING")),
+        ]
+
+
+# background jobs
+class JobCheckpoint(models.Model):
+    """
+    Watermark for a long running job (archival, reconciliation, ...).
+    `position` is free-form JSON owned by the job that writes it.
+    """
+    name = models.CharField(max_length=64, unique=True)
+    position = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+    @classmethod
+    def load(cls, name):
+        checkpoint, _ = cls.objects.get_or_create(name=name)
+        return checkpoint
+
+    def store(self, **position):
+        self.position = position
+        self.save(update_fields=["position", "updated_at"])
+
+
+# autopay (standing instructions)
+class Mandate(models.Model):
+    """
+    A recurring payment: a transfer to another account, a mobile recharge or
+    a bill payment, debited from `payer_account` every `frequency`.
+    Executed by the run_mandates worker.
+    """
+    KIND_CHOICES = (("TRANSFER", "Transfer"), ("RECHARGE", "Mobile Recharge"), ("BILL", "Bill Payment"))
+    FREQUENCY_CHOICES = (("DAILY", "Daily"), ("WEEKLY", "Weekly"), ("MONTHLY", "Monthly"))
+    STATUS_CHOICES = (("ACTIVE", "Active"), ("PAUSED", "Paused"), ("CANCELLED", "Cancelled"))
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="mandates")
+    payer_account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="mandates")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # exactly one target, depending on kind
+    payee_account = models.ForeignKey(
+        BankAccount, on_delete=models.CASCADE, null=True, blank=True, related_name="incoming_mandates"
+    )
+    biller = models.ForeignKey(Biller, on_delete=models.CASCADE, null=True, blank=True)
+    operator = models.ForeignKey(Operator, on_delete=models.CASCADE, null=True, blank=True)
+    consumer_number = models.CharField(max_length=128, blank=True)  # bill consumer no. / mobile for recharges
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    reference = models.CharField(max_length=128, blank=True)
+
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES, default="MONTHLY")
+    next_run_at = models.DateTimeField()
+    # while a cycle is being retried next_run_at is the retry time; this keeps the date the cycle was due
+    cycle_due_at = models.DateTimeField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="ACTIVE")
+    retry_count = models.PositiveSmallIntegerField(default=0)
+    last_run_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # the scheduler only ever looks at due ACTIVE mandates
+            models.Index(
+                fields=["next_run_at", "id"],
+                name="mandate_due_idx",
+                condition=models.Q(status="ACTIVE"),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.kind} ₹{self.amount} {self.frequency} ({self.status})"
+
+
+# outbox (payment events for downstream systems)
+class OutboxEvent(models.Model):
+    """
+    A payment event, written in the same atomic block as the money movement
+    it describes and delivered to the configured sinks by dispatch_outbox.
+    Each sink keeps its own position (a JobCheckpoint) in id order.
+    """
+    topic = models.CharField(max_length=64)  # transfer / recharge / bill_payment
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"#{self.id} {self.topic}"
+
+
+# per-user change counter (ETag / 304 on the list endpoints)
+from django.db.models import F
+
+
+class UserDataVersion(models.Model):
+    """
+    Changes whenever something a user's list endpoints return is written:
+    their accounts, saved payees, bill payments or transactions (see
+    api/signals.py). api.middleware.DataVersionETagMiddleware builds ETags
+    from it. Only ever compared for equality, so it may skip numbers.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="data_version")
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} v{self.version}"
+
+    @classmethod
+    def bump(cls, *user_ids):
+        """Advance the counter of every given user (None is ignored) in the current transaction."""
+        ids = sorted({uid for uid in user_ids if uid})
+        if not ids:
+            return
+        if cls.objects.filter(user_id__in=ids).update(version=F("version") + 1) < len(ids):
+            cls.objects.bulk_create([cls(user_id=uid) for uid in ids], ignore_conflicts=True)
+            cls.objects.filter(user_id__in=ids).update(version=F("version") + 1)
+
+
+# balance reconciliation (reconcile_balances)
+class BalanceCheck(models.Model):
+    """
+    Reconciliation state of an account that does not balance: `amount`
+    should equal opening + SUCCESS credits - SUCCESS debits (hot and
+    archived). `opening` is money that entered outside the transaction log
+    (seeded or admin-funded balances), recorded with reconcile_balances
+    --accept. Accounts that balance with no opening have no row.
+    """
+    account = models.OneToOneField(BankAccount, on_delete=models.CASCADE, primary_key=True,
+                                   related_name="balance_check")
+    opening = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal("0"))
+    drift = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal("0"))
+    checked_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"account {self.account_id}: drift {self.drift}"
+
+
+# payee suggestions (api.counterparties)
+class CounterpartyStat(models.Model):
+    """
+    How often and how recently `owner` has paid `account`, kept up to date
+    by api.payments.transfer. `rank` is the frecency score in log space:
+    every payment adds exp(rank_of(paid at)) to exp(rank), so ordering by
+    rank is ordering by the decayed score, and it never needs rewriting as
+    time passes (see api.counterparties).
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="counterparty_stats")
+    account = models.ForeignKey(BankAccount, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal("0"))
+    last_paid_at = models.DateTimeField()
+    rank = models.FloatField(default=0.0)
+
+    class Meta:
+        unique_together = ("owner", "account")
+        indexes = [
+            models.Index(fields=["owner", "-rank"], name="counterparty_frecency_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.owner_id} -> {self.account_id}: {self.count} payments"
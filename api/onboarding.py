@@ -0,0 +1,188 @@
+# backend/api/onboarding.py
+"""
+Bulk bank-account onboarding (corporate imports).
+
+Rows are streamed from a CSV or JSON-lines file and handled a chunk at a
+time: validated through BankAccountSerializer, checked for duplicates with
+one query per chunk, given UPI ids with one counter round trip per chunk,
+PIN-hashed in a thread pool (PBKDF2 runs outside the GIL) and inserted with
+bulk_create. Every rejected row is reported back with its row number.
+
+Expected columns: username, holder_name, bank_name, account_number, ifsc,
+pin, and optionally branch, mobile.
+"""
+import csv
+import io
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction as db_transaction
+
+from . import upi
+from .models import BankAccount, UserDataVersion
+from .serializers import BankAccountSerializer
+
+DEFAULT_CHUNK_SIZE = 1000
+PIN_RE = re.compile(r"\d{4,6}")
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield (row_number, dict | None, error | None) from a binary or text
+    stream. Row numbers are 1-based data rows (the CSV header is not counted).
+    """
+    if isinstance(stream, io.TextIOBase):
+        text = stream
+    else:
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+
+    if fmt == "csv":
+        for number, row in enumerate(csv.DictReader(text), start=1):
+            yield number, {k.strip(): (v or "").strip() for k, v in row.items() if k}, None
+        return
+
+    for number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield number, None, f"Invalid JSON: {exc}"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "Each line must be a JSON object."
+            continue
+        yield number, {k: str(v).strip() if v is not None else "" for k, v in row.items()}, None
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class AccountImporter:
+    """Stateful across chunks so duplicates spanning chunks are caught."""
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+        self.chunk_size = chunk_size
+        self.workers = workers or os.cpu_count() or 2
+        self.seen = set()  # (user_id, account_number) accepted so far
+        self.report = {"total": 0, "created": 0, "failed": 0, "errors": []}
+
+    def fail(self, number, errors):
+        self.report["failed"] += 1
+        self.report["errors"].append({"row": number, "errors": errors})
+
+    def run(self, stream, fmt="csv"):
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for chunk in _chunks(iter_rows(stream, fmt), self.chunk_size):
+                self.import_chunk(chunk, pool)
+        self.report["errors"].sort(key=lambda e: e["row"])
+        elapsed = time.monotonic() - started
+        self.report["elapsed"] = round(elapsed, 3)
+        self.report["rows_per_sec"] = round(self.report["total"] / elapsed, 1) if elapsed else None
+        return self.report
+
+    def import_chunk(self, chunk, pool):
+        self.report["total"] += len(chunk)
+        usernames = {row.get("username", "") for _, row, _ in chunk if row}
+        users = {u.username: u for u in User.objects.filter(username__in=usernames)}
+
+        valid = []
+        for number, row, error in chunk:
+            if error:
+                self.fail(number, [error])
+                continue
+            user = users.get(row.get("username", ""))
+            if user is None:
+                self.fail(number, [f"Unknown user {row.get('username')!r}."])
+                continue
+            ser = BankAccountSerializer(data=row)
+            if not ser.is_valid():
+                self.fail(number, [f"{field}: {' '.join(map(str, msgs))}" for field, msgs in ser.errors.items()])
+                continue
+            pin = row.get("pin", "")
+            if not PIN_RE.fullmatch(pin):
+                self.fail(number, ["PIN must be 4–6 digits and cannot contain letters or symbols."])
+                continue
+            valid.append((number, user, ser.validated_data, pin))
+
+        # duplicates: already linked, or repeated earlier in the file
+        existing = set(
+            BankAccount.objects.filter(
+                user_id__in={user.id for _, user, _, _ in valid},
+                account_number__in={data["account_number"] for _, _, data, _ in valid},
+            ).values_list("user_id", "account_number")
+        )
+        accepted = []
+        for number, user, data, pin in valid:
+            key = (user.id, data["account_number"])
+            if key in existing or key in self.seen:
+                self.fail(number, ["This account number is already linked to this user."])
+                continue
+            self.seen.add(key)
+            accepted.append((number, user, data, pin))
+        if not accepted:
+            return
+
+        # UPI ids for every prefix in the chunk with one counter round trip
+        upi_ids = upi.allocate_upi_ids_bulk([(user.username, data["bank_name"]) for _, user, data, _ in accepted])
+
+        pin_hashes = list(pool.map(make_password, [pin for _, _, _, pin in accepted]))
+
+        accounts = [
+            BankAccount(
+                user=user,
+                holder_name=data["holder_name"],
+                bank_name=data["bank_name"],
+                branch=data.get("branch", ""),
+                account_number=data["account_number"],
+                ifsc=data["ifsc"],
+                mobile=data.get("mobile", ""),
+                upi_id=upi_id,
+                pin_hash=pin_hash,
+                pin_enabled=True,
+            )
+            for (_, user, data, _), upi_id, pin_hash in zip(accepted, upi_ids, pin_hashes)
+        ]
+        try:
+            with db_transaction.atomic():
+                BankAccount.objects.bulk_create(accounts, batch_size=self.chunk_size)
+                UserDataVersion.bump(*{account.user_id for account in accounts})  # bulk_create sends no signals
+            self.report["created"] += len(accounts)
+        except IntegrityError:
+            # a UPI id collided with a pre-existing one; fall back to row by row
+            for (number, *_), account in zip(accepted, accounts):
+                self.insert_one(number, account)
+
+    def insert_one(self, number, account):
+        account.pk = None
+        for _ in range(upi.MAX_INSERT_ATTEMPTS):
+            try:
+                with db_transaction.atomic():
+                    account.save(force_insert=True)
+                self.report["created"] += 1
+                return
+            except IntegrityError as exc:
+                account.pk = None
+                if not BankAccount.objects.filter(upi_id=account.upi_id).exists():
+                    self.fail(number, [str(exc)])
+                    return
+                account.upi_id = upi.allocate_upi_id(account.user.username, account.bank_name)
+        self.fail(number, ["Could not allocate a free UPI id."])
+
+
+def import_accounts(stream, fmt="csv", chunk_size=DEFAULT_CHUNK_SIZE, workers=None):
+    return AccountImporter(chunk_size=chunk_size, workers=workers).run(stream, fmt)
@@ -0,0 +1,209 @@
+# backend/api/outbox.py
+"""
+Transactional outbox for payment events.
+
+publish() only inserts an OutboxEvent row and must be called inside the
+atomic block that moves the money, so an event exists if and only if the
+payment committed and the request path never talks to the network.
+
+dispatch_outbox drains the table to the sinks in settings.OUTBOX_SINKS, in
+id order and in batches. Every sink has its own position (a JobCheckpoint
+named "outbox:<sink>") that only moves after the sink accepted the batch,
+so delivery is at-least-once: consumers dedupe on the event id.
+
+Ids are taken when a row is inserted, not when its transaction commits, so
+an event can become visible after the position has passed its id. Events
+are only read once they are OUTBOX_SETTLE_SECONDS old, which lets most
+such transactions land first. Ids the position skips over are also kept
+in the checkpoint as gaps and looked up again on every batch, so an event
+that commits later still goes out, after higher ids. A gap is forgotten
+after OUTBOX_GAP_SECONDS (a rolled back insert leaves a gap that never
+fills); keep that above the longest a payment transaction can stay open.
+"""
+import datetime
+import json
+import os
+import urllib.request
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import events
+from .models import JobCheckpoint, OutboxEvent
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_SETTLE_SECONDS = 2
+DEFAULT_GAP_SECONDS = 600
+
+
+class SinkError(Exception):
+    pass
+
+
+# ----- publishing -----
+
+def publish(topic, payload):
+    """
+    Record an event. Call inside the atomic block of the change it
+    describes; live listeners in this process (api.events) get it on commit.
+    """
+    event = OutboxEvent.objects.create(topic=topic, payload=payload)
+    db_transaction.on_commit(lambda: events.broker.publish(event))
+    return event
+
+
+def publish_many(topic, payloads):
+    """publish() for several events of one topic, in one INSERT."""
+    created = OutboxEvent.objects.bulk_create([OutboxEvent(topic=topic, payload=payload) for payload in payloads])
+    db_transaction.on_commit(lambda: [events.broker.publish(event) for event in created])
+    return created
+
+
+def transaction_payload(txn, **extra):
+    return {
+        "transaction_id": txn.id,
+        "status": txn.status,
+        "amount": str(txn.amount),
+        "sender_account_id": txn.sender_account_id,
+        "receiver_account_id": txn.receiver_account_id,
+        "sender_user_id": txn.sender_user_id,
+        "receiver_user_id": txn.receiver_user_id,
+        "receiver_name": txn.receiver_name,
+        "reference": txn.reference,
+        "category": txn.category,
+        "timestamp": txn.timestamp.isoformat(),
+        **extra,
+    }
+
+
+def event_dict(event):
+    return {
+        "id": event.id,
+        "topic": event.topic,
+        "created_at": event.created_at.isoformat(),
+        "payload": event.payload,
+    }
+
+
+# ----- sinks -----
+
+class JsonLinesSink:
+    """Append events to a local JSON-lines file (fsynced per batch)."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, events):
+        lines = "".join(json.dumps(event_dict(e), cls=DjangoJSONEncoder) + "\n" for e in events)
+        try:
+            with open(self.path, "a", encoding="utf-8") as fh:
+                fh.write(lines)
+                fh.flush()
+                os.fsync(fh.fileno())
+        except OSError as exc:
+            raise SinkError(str(exc)) from exc
+
+
+class HttpSink:
+    """POST each batch as a JSON list; any non-2xx answer fails the batch."""
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, events):
+        body = json.dumps([event_dict(e) for e in events], cls=DjangoJSONEncoder).encode()
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                if not 200 <= response.status < 300:
+                    raise SinkError(f"{self.url} answered {response.status}")
+        except OSError as exc:  # URLError, HTTPError, timeouts
+            raise SinkError(f"{self.url}: {exc}") from exc
+
+
+def configured_sinks():
+    """{name: sink} from settings.OUTBOX_SINKS ({"name": {"BACKEND": ..., **options}})."""
+    sinks = {}
+    for name, options in getattr(settings, "OUTBOX_SINKS", {}).items():
+        options = dict(options)
+        backend = import_string(options.pop("BACKEND"))
+        sinks[name] = backend(**options)
+    return sinks
+
+
+# ----- dispatching -----
+
+def checkpoint_name(sink_name):
+    return f"outbox:{sink_name}"
+
+
+def dispatch_batch(sink_name, sink, batch_size=None, now=None):
+    """Deliver the next batch to one sink. Returns the number of events delivered."""
+    batch_size = batch_size or getattr(settings, "OUTBOX_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+    settle = getattr(settings, "OUTBOX_SETTLE_SECONDS", DEFAULT_SETTLE_SECONDS)
+    gap_seconds = getattr(settings, "OUTBOX_GAP_SECONDS", DEFAULT_GAP_SECONDS)
+    now = now or timezone.now()
+
+    checkpoint = JobCheckpoint.load(checkpoint_name(sink_name))
+    last_id = checkpoint.position.get("last_id", 0)
+    # skipped ids -> when they were first skipped (unix time); JSON keys are strings
+    known_gaps = checkpoint.position.get("gaps", {})
+    gaps = {int(i): seen for i, seen in known_gaps.items() if seen > now.timestamp() - gap_seconds}
+    late = list(OutboxEvent.objects.filter(id__in=list(gaps)).order_by("id")) if gaps else []
+    fresh = list(
+        OutboxEvent.objects.filter(id__gt=last_id, created_at__lte=now - datetime.timedelta(seconds=settle))
+        .order_by("id")[:batch_size]
+    )
+    events = late + fresh
+    if not events and len(gaps) == len(known_gaps):
+        return 0
+    if events:
+        sink.send(events)  # SinkError leaves the position where it was; the batch is retried
+
+    for event in late:
+        del gaps[event.id]
+    if fresh:
+        seen = {event.id for event in fresh}
+        gaps.update((i, now.timestamp()) for i in range(last_id + 1, fresh[-1].id) if i not in seen)
+        last_id = fresh[-1].id
+    checkpoint.store(
+        last_id=last_id,
+        gaps={str(i): seen for i, seen in gaps.items()},
+        delivered=checkpoint.position.get("delivered", 0) + len(events),
+    )
+    return len(events)
+
+
+def _pending(position):
+    position = position or {}
+    gaps = [int(i) for i in position.get("gaps", {})]
+    return OutboxEvent.objects.filter(Q(id__gt=position.get("last_id", 0)) | Q(id__in=gaps))
+
+
+def lag(sink_name, now=None):
+    """(pending events, seconds since the oldest undelivered event was written) for one sink."""
+    now = now or timezone.now()
+    position = JobCheckpoint.objects.filter(name=checkpoint_name(sink_name)).values_list("position", flat=True).first()
+    pending = _pending(position)
+    oldest = pending.order_by("id").values_list("created_at", flat=True).first()
+    return pending.count(), (now - oldest).total_seconds() if oldest else 0.0
+
+
+def prune(sink_names, keep_days=7, now=None):
+    """Delete events every sink has delivered and that are older than keep_days."""
+    now = now or timezone.now()
+    names = [checkpoint_name(name) for name in sink_names]
+    positions = JobCheckpoint.objects.filter(name__in=names).values_list("position", flat=True)
+    if len(positions) < len(names):
+        return 0  # a sink that never ran still needs everything
+    upto = min(min([p.get("last_id", 0)] + [int(i) - 1 for i in p.get("gaps", {})]) for p in positions)
+    with db_transaction.atomic():
+        deleted, _ = OutboxEvent.objects.filter(
+            id__lte=upto, created_at__lt=now - datetime.timedelta(days=keep_days)
+        ).delete()
+    return deleted
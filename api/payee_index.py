@@ -0,0 +1,134 @@
+# backend/api/payee_index.py
+"""
+Per-user "pay to" autocomplete.
+
+Most of what a user types into the pay-to box is someone they have saved
+or paid before. Each user gets a small in-memory index of those accounts:
+their CounterpartyStat rows (best first, see api.counterparties) and the
+accounts behind their saved payees (matched on UPI id, or mobile for
+payees without one). Every name word, the whole name, the UPI id and the
+mobile number (also its last ten digits) is a key in one sorted array, so
+a prefix lookup is two bisects.
+
+Indexes are built on first use and kept, per process, in an LRU of
+PAYEE_INDEX_MAX_USERS users. An index is stamped with the user's
+UserDataVersion, which saved payee changes and transfers bump (api.signals),
+and is rebuilt when the stamp moves or it is older than PAYEE_INDEX_MAX_AGE
+seconds (a counterparty renaming their account does not bump the payer).
+search_payees answers from here and only goes to the global search when
+nothing matches.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import BankAccount, CounterpartyStat, SavedPayee, UserDataVersion
+from .serializers import BankAccountSerializer
+
+HIGH = "\U0010ffff"  # sorts after every character a key can continue with
+
+_lock = threading.Lock()
+_indexes = OrderedDict()  # user id -> PayeeIndex, least recently used first
+
+
+def normalize(text):
+    """Lower case; phone-like input ("+91 98400 12345") reduced to its digits."""
+    text = (text or "").strip().lower()
+    digits = text.replace("+", "").replace(" ", "").replace("-", "")
+    return digits if digits.isdigit() else text
+
+
+def keys_of(account):
+    name = (account["holder_name"] or "").lower()
+    keys = set(name.split())
+    keys.add(name)
+    if account["upi_id"]:
+        keys.add(account["upi_id"].lower())
+    mobile = normalize(account["mobile"])
+    if mobile.isdigit():
+        keys.update((mobile, mobile[-10:]))
+    keys.discard("")
+    return keys
+
+
+class PayeeIndex:
+    def __init__(self, version, accounts):
+        """`accounts`: serialized BankAccounts, best first."""
+        self.version = version
+        self.built_at = time.monotonic()
+        self.entries = accounts
+        pairs = sorted((key, position) for position, account in enumerate(accounts) for key in keys_of(account))
+        self.keys = [key for key, _ in pairs]
+        self.positions = [position for _, position in pairs]
+
+    def search(self, query, limit=50):
+        """Accounts with a key starting with `query`, best first."""
+        query = normalize(query)
+        if not query:
+            return []
+        start = bisect_left(self.keys, query)
+        stop = bisect_left(self.keys, query + HIGH, start)
+        return [self.entries[p] for p in sorted(set(self.positions[start:stop]))[:limit]]
+
+
+def build(user_id, version):
+    limit = getattr(settings, "PAYEE_INDEX_MAX_ENTRIES", 2000)
+    # past counterparties by frecency, then saved payees never paid, newest saved first
+    found = [
+        stat.account for stat in
+        CounterpartyStat.objects.filter(owner_id=user_id).select_related("account").order_by("-rank")[:limit]
+    ]
+    saved = list(
+        SavedPayee.objects.filter(owner_id=user_id).order_by("-added_at").values_list("payee__upi_id", "payee__phone")
+    )
+    upis = {upi for upi, _ in saved if upi}
+    phones = {phone for upi, phone in saved if not upi and phone}
+    if upis or phones:
+        accounts = list(BankAccount.objects.filter(Q(upi_id__in=upis) | Q(mobile__in=phones)))
+        by_upi = {account.upi_id: account for account in accounts}
+        for upi, phone in saved:
+            if upi in by_upi:
+                found.append(by_upi[upi])
+            elif not upi:
+                found.extend(account for account in accounts if account.mobile == phone)
+    unique = {}
+    for account in found:
+        unique.setdefault(account.id, account)  # paid and saved: keeps its frecency place
+
+    entries = BankAccountSerializer(list(unique.values())[:limit], many=True).data
+    for data in entries:
+        data.pop("amount")  # someone else's balance: not ours to show, and it would go stale here
+    return PayeeIndex(version, entries)
+
+
+def _fresh(index, version):
+    max_age = getattr(settings, "PAYEE_INDEX_MAX_AGE", 600)
+    return index is not None and index.version == version and time.monotonic() - index.built_at <= max_age
+
+
+def for_user(user_id):
+    """The user's index, built if missing or stale. One query when it is fresh."""
+    # read before building: a write racing the build leaves an older stamp, so the next call rebuilds
+    version = UserDataVersion.objects.filter(user_id=user_id).values_list("version", flat=True).first() or 0
+    with _lock:
+        index = _indexes.get(user_id)
+        if _fresh(index, version):
+            _indexes.move_to_end(user_id)
+            return index
+    index = build(user_id, version)
+    with _lock:
+        _indexes[user_id] = index
+        _indexes.move_to_end(user_id)
+        while len(_indexes) > getattr(settings, "PAYEE_INDEX_MAX_USERS", 10000):
+            _indexes.popitem(last=False)
+    return index
+
+
+def clear():
+    """Drop every cached index (tests)."""
+    with _lock:
+        _indexes.clear()
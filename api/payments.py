@@ -0,0 +1,405 @@
+# backend/api/payments.py
+"""
+Money movement shared by the views and the background workers.
+
+Every debit goes through here so that account locking (always in ascending
+id order, to avoid deadlocks between concurrent transfers), the
+Transaction log and the outbox events (api.outbox) stay in one place.
+"""
+import datetime
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from . import counterparties, outbox, providers
+from .models import BankAccount, BillPayment, MobileRecharge, Transaction, UserDataVersion
+
+
+class PaymentError(Exception):
+    pass
+
+
+class InsufficientFunds(PaymentError):
+    pass
+
+
+class PaymentPending(PaymentError):
+    """
+    The provider call ended without a definite answer (timeout, error
+    answer, dropped connection), so the payment may have gone through. It
+    is left PENDING with the debit standing; settle_pending() asks the
+    provider and completes or refunds it. `record` is the MobileRecharge
+    or BillPayment.
+    """
+
+    def __init__(self, record, cause):
+        super().__init__(f"No confirmation from the provider yet: {cause}")
+        self.record = record
+
+
+def lock_accounts(*account_ids):
+    """
+    SELECT ... FOR UPDATE the given accounts in ascending id order.
+    Must be called inside an atomic block. Returns {id: BankAccount}.
+    """
+    ids = sorted({i for i in account_ids if i is not None})
+    accounts = {a.id: a for a in BankAccount.objects.select_for_update().filter(id__in=ids).order_by("id")}
+    missing = [i for i in ids if i not in accounts]
+    if missing:
+        raise PaymentError(f"Bank account not found: {missing[0]}")
+    return accounts
+
+
+def call_provider(kind, name, reference):
+    """
+    Run a recharge ("recharge") or bill payment ("bill") at the provider
+    `name` (api.providers: timeout and circuit breaker, never retried).
+    `reference` identifies our record, for the provider to deduplicate on.
+    Returns the provider transaction id. Raises providers.ProviderError.
+    """
+    return providers.get(kind, name).call("pay", {"reference": reference})["provider_txn"]
+
+
+def refund(account_id, amount):
+    """Credit back a debit whose provider call failed. Call inside an atomic block. Returns the account."""
+    account = lock_accounts(account_id)[account_id]
+    account.amount += amount
+    account.save(update_fields=["amount"])
+    return account
+
+
+def transfer(sender_id, receiver_id, amount, reference="", record_failure=True):
+    """
+    Debit sender and credit receiver atomically and log the Transaction
+    (and, between two users, count it in the sender's payee suggestions).
+
+    On insufficient balance a FAILED Transaction is logged and returned
+    (what the pay-anyone screen shows), or InsufficientFunds is raised when
+    record_failure is False (used by the autopay scheduler, which retries).
+    """
+    with db_transaction.atomic():
+        accounts = lock_accounts(sender_id, receiver_id)
+        sender, receiver = accounts[sender_id], accounts[receiver_id]
+
+        if sender.amount < amount:
+            if not record_failure:
+                raise InsufficientFunds("Insufficient balance")
+            txn = Transaction.objects.create(
+                sender_account=sender,
+                receiver_account=receiver,
+                amount=amount,
+                status="FAILED",
+                reference=reference,
+                category="P2P",
+            )
+        else:
+            sender.amount -= amount
+            receiver.amount += amount
+            sender.save(update_fields=["amount"])
+            receiver.save(update_fields=["amount"])
+
+            txn = Transaction.objects.create(
+                sender_account=sender,
+                receiver_account=receiver,
+                amount=amount,
+                status="SUCCESS",
+                reference=reference,
+                category="P2P",
+            )
+            if sender.user_id != receiver.user_id:
+                counterparties.record_payment(sender.user_id, receiver.id, amount, txn.timestamp)
+        outbox.publish("transfer", outbox.transaction_payload(txn))
+        return txn
+
+
+def fail_pending(record):
+    """
+    Mark a PENDING MobileRecharge or BillPayment FAILED and refund its
+    debit. Returns False (and changes nothing) if it is no longer PENDING.
+    """
+    with db_transaction.atomic():
+        if not type(record).objects.filter(id=record.id, status="PENDING").update(status="FAILED"):
+            return False
+        if record.account_id:
+            refund(record.account_id, record.amount)
+        record.status = "FAILED"
+    return True
+
+
+def complete_recharge(rec, account, provider_txn):
+    """Mark a PENDING recharge SUCCESS and log its Transaction. Returns False if it is no longer PENDING."""
+    operator = rec.operator
+    with db_transaction.atomic():
+        if not MobileRecharge.objects.filter(id=rec.id, status="PENDING").update(status="SUCCESS",
+                                                                                provider_txn=provider_txn):
+            return False
+        rec.status, rec.provider_txn = "SUCCESS", provider_txn
+        txn = Transaction.objects.create(
+            sender_account=account,
+            receiver_name=f"{operator.name} Recharge - {rec.mobile}",
+            amount=rec.amount,
+            status="SUCCESS",
+            reference=f"Mobile Recharge ({operator.name})",
+            category="RECHARGE",
+            operator=operator,
+        )
+        outbox.publish("recharge", outbox.transaction_payload(
+            txn, recharge_id=rec.id, operator=operator.code, mobile=rec.mobile, provider_txn=provider_txn,
+        ))
+    return True
+
+
+def complete_bill(bp, account, provider_txn, now=None):
+    """Mark a PENDING bill payment SUCCESS and log its Transaction. Returns False if it is no longer PENDING."""
+    biller = bp.biller
+    now = now or timezone.now()
+    with db_transaction.atomic():
+        if not BillPayment.objects.filter(id=bp.id, status="PENDING").update(status="SUCCESS", paid_on=now,
+                                                                             provider_txn=provider_txn):
+            return False
+        bp.status, bp.paid_on, bp.provider_txn = "SUCCESS", now, provider_txn
+        txn = Transaction.objects.create(
+            sender_account=account,
+            receiver_account=None,
+            receiver_name=f"{biller.name} - {bp.consumer_number}",
+            amount=bp.amount,
+            status="SUCCESS",
+            reference=f"Bill Payment ({biller.name})",
+            category="BILL",
+            biller=biller,
+        )
+        outbox.publish("bill_payment", outbox.transaction_payload(
+            txn, bill_payment_id=bp.id, biller=biller.code, consumer_number=bp.consumer_number,
+            provider_txn=provider_txn,
+        ))
+    return True
+
+
+def recharge(user, account_id, operator, mobile, amount, plan=None, circle=""):
+    """
+    Debit the account, run the operator recharge and log the Transaction.
+    The account lock is released before the provider call. A failing
+    operator is refused before anything is debited. If the call definitely
+    failed (providers.DEFINITE_FAILURES) the recharge is marked FAILED, the
+    debit refunded and the error re-raised; if its outcome is unknown
+    (timeout, error answer) it stays PENDING, debited, and PaymentPending
+    is raised for settle_pending() to finish. Any other exception from the
+    call also fails and refunds it, re-raised as a ProviderError. Returns
+    (MobileRecharge, BankAccount).
+    """
+    providers.get("recharge", operator.code).check()
+    with db_transaction.atomic():
+        account = lock_accounts(account_id)[account_id]
+        if account.amount < amount:
+            raise InsufficientFunds("Insufficient balance")
+        rec = MobileRecharge.objects.create(
+            user=user,
+            account=account,
+            mobile=mobile,
+            operator=operator,
+            circle=circle,
+            plan=plan,
+            amount=amount,
+            status="PENDING",
+        )
+        account.amount -= amount
+        account.save(update_fields=["amount"])
+
+    try:
+        provider_txn = call_provider("recharge", operator.code, f"recharge-{rec.id}")
+    except providers.DEFINITE_FAILURES:
+        fail_pending(rec)
+        raise
+    except providers.ProviderError as exc:
+        raise PaymentPending(rec, exc) from exc
+    except Exception as exc:  # a malformed answer, a bug: nothing says it was paid
+        fail_pending(rec)
+        raise providers.ProviderError(f"{operator.code}: {exc!r}") from exc
+    complete_recharge(rec, account, provider_txn)
+    return rec, account
+
+
+def pay_bill(user, account_id, biller, consumer_number, amount, reminder_date=None, due_date=None, period=None):
+    """
+    Debit the account, run the biller payment and log the Transaction
+    (receiver_account is NULL for billers). Failed and unanswered biller
+    calls are handled as in recharge(). Returns (BillPayment, BankAccount).
+    """
+    providers.get("bill", biller.code).check()
+    with db_transaction.atomic():
+        account = lock_accounts(account_id)[account_id]
+        if account.amount < amount:
+            raise InsufficientFunds("Insufficient balance")
+        bp = BillPayment.objects.create(
+            user=user,
+            account=account,
+            biller=biller,
+            consumer_number=consumer_number,
+            amount=amount,
+            status="PENDING",
+            due_date=due_date or datetime.date.today() + datetime.timedelta(days=7),
+            period=period,
+            reminder_date=reminder_date,
+        )
+        account.amount -= amount
+        account.save(update_fields=["amount"])
+
+    try:
+        provider_txn = call_provider("bill", biller.code, f"bill-{bp.id}")
+    except providers.DEFINITE_FAILURES:
+        fail_pending(bp)
+        raise
+    except providers.ProviderError as exc:
+        raise PaymentPending(bp, exc) from exc
+    except Exception as exc:  # a malformed answer, a bug: nothing says it was paid
+        fail_pending(bp)
+        raise providers.ProviderError(f"{biller.code}: {exc!r}") from exc
+    complete_bill(bp, account, provider_txn)
+    return bp, account
+
+
+def pay_bills(user, account_id, items, reminder_date=None):
+    """
+    Pay several bills from one account: one lock and one debit for the
+    total, the biller calls made concurrently, then every BillPayment and
+    Transaction written in bulk. An item whose biller call definitely
+    failed, or raised anything but a ProviderError, is marked FAILED and
+    its amount refunded; one whose outcome is unknown stays PENDING,
+    debited, for settle_pending(). `items` are dicts with biller,
+    consumer_number, amount and optionally due_date and period. Raises
+    providers.ProviderUnavailable, debiting nothing, if any biller's circuit
+    is open. Returns ([BillPayment] in item order, BankAccount).
+    """
+    for code in sorted({item["biller"].code for item in items}):
+        providers.get("bill", code).check()  # a failing biller refuses the whole payment before any debit
+    total = sum(item["amount"] for item in items)
+    default_due = datetime.date.today() + datetime.timedelta(days=7)
+    with db_transaction.atomic():
+        account = lock_accounts(account_id)[account_id]
+        if account.amount < total:
+            raise InsufficientFunds("Insufficient balance")
+        bps = BillPayment.objects.bulk_create([
+            BillPayment(
+                user=user,
+                account=account,
+                biller=item["biller"],
+                consumer_number=item["consumer_number"],
+                amount=item["amount"],
+                status="PENDING",
+                due_date=item.get("due_date") or default_due,
+                period=item.get("period"),
+                reminder_date=reminder_date,
+            )
+            for item in items
+        ])
+        account.amount -= total
+        account.save(update_fields=["amount"])
+
+    # the biller calls do not touch the database, so they can share a thread pool
+    workers = min(len(bps), getattr(settings, "BILL_PAY_CONCURRENCY", 8))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="billpay") as pool:
+        futures = [pool.submit(call_provider, "bill", bp.biller.code, f"bill-{bp.id}") for bp in bps]
+    outcomes = []
+    for future in futures:
+        try:
+            outcomes.append(("SUCCESS", future.result()))
+        except providers.DEFINITE_FAILURES:
+            outcomes.append(("FAILED", None))
+        except providers.ProviderError:
+            outcomes.append(("PENDING", None))  # may have been paid: left debited for settle_pending()
+        except Exception:  # a malformed answer, a broken pool: failed, so refunded rather than stuck
+            outcomes.append(("FAILED", None))
+
+    now = timezone.now()
+    with db_transaction.atomic():
+        paid, refunded = [], 0
+        for bp, (state, provider_txn) in zip(bps, outcomes):
+            bp.status = state
+            if state == "FAILED":
+                refunded += bp.amount
+            elif state == "SUCCESS":
+                bp.provider_txn = provider_txn
+                bp.paid_on = now
+                paid.append(bp)
+        BillPayment.objects.bulk_update(bps, ["provider_txn", "status", "paid_on"])
+        if refunded:
+            account = refund(account_id, refunded)
+
+        txns = [
+            Transaction(
+                sender_account=account,
+                receiver_account=None,
+                receiver_name=f"{bp.biller.name} - {bp.consumer_number}",
+                amount=bp.amount,
+                status="SUCCESS",
+                reference=f"Bill Payment ({bp.biller.name})",
+                category="BILL",
+                biller=bp.biller,
+                timestamp=now,
+            )
+            for bp in paid
+        ]
+        for txn in txns:
+            txn.fill_owners()
+        Transaction.objects.bulk_create(txns)
+        outbox.publish_many("bill_payment", [
+            outbox.transaction_payload(
+                txn, bill_payment_id=bp.id, biller=bp.biller.code, consumer_number=bp.consumer_number,
+                provider_txn=bp.provider_txn,
+            )
+            for txn, bp in zip(txns, paid)
+        ])
+        UserDataVersion.bump(user.id)  # bulk writes send no signals
+    return bps, account
+
+
+def settle_pending(older_than=None, batch_size=500):
+    """
+    Settle recharges and bill payments left PENDING by an unanswered
+    provider call, once they are `older_than` seconds old
+    (PROVIDER_SETTLE_AFTER; longer than any provider timeout, so calls still
+    in flight are left alone). The provider is asked for each one's status
+    by reference: paid ones are completed as if it had answered, ones it
+    does not know are refunded and FAILED, and ones it does not answer for
+    wait for the next run. Records whose account or provider has been
+    deleted are left for an operator. Returns a Counter of outcomes.
+    """
+    older_than = getattr(settings, "PROVIDER_SETTLE_AFTER", 120) if older_than is None else older_than
+    cutoff = timezone.now() - datetime.timedelta(seconds=older_than)
+    outcomes = Counter()
+    sources = (
+        (MobileRecharge, "recharge", "operator", complete_recharge),
+        (BillPayment, "bill", "biller", complete_bill),
+    )
+    for model, kind, provider_field, complete in sources:
+        pending = (
+            model.objects.filter(status="PENDING", created_at__lte=cutoff, account__isnull=False,
+                                 **{f"{provider_field}__isnull": False})
+            .select_related("account", provider_field).order_by("id")
+        )
+        last_id = 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id)[:batch_size])
+            for record in batch:
+                code = getattr(record, provider_field).code
+                try:
+                    answer = providers.get(kind, code).call(
+                        "status", {"reference": f"{kind}-{record.id}"}, idempotent=True,
+                    )
+                except providers.ProviderError:
+                    outcomes["unanswered"] += 1
+                    continue
+                if answer.get("status") == "SUCCESS":
+                    settled = complete(record, record.account, answer["provider_txn"])
+                    outcomes["completed" if settled else "already settled"] += 1
+                elif answer.get("status") in ("NOT_FOUND", "FAILED"):
+                    outcomes["refunded" if fail_pending(record) else "already settled"] += 1
+                else:
+                    outcomes["unanswered"] += 1
+            if len(batch) < batch_size:
+                break
+            last_id = batch[-1].id
+    return outcomes
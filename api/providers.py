@@ -0,0 +1,302 @@
+# backend/api/providers.py
+"""
+Client side of the operator and biller APIs.
+
+Every call goes to one provider, named "<kind>:<operator or biller code>"
+(recharge:airtel, bill:tneb, bill_fetch:tneb), and each provider has:
+
+- a timeout (PROVIDER_TIMEOUTS, by kind or by provider name);
+- a circuit breaker: after PROVIDER_BREAKER_FAILURES consecutive failures
+  (errors and timeouts, not rejections) calls fail at once with
+  ProviderUnavailable for PROVIDER_BREAKER_RESET seconds; then one trial
+  call is let through, and closes it again on success;
+- a latency histogram (status() reports it, with p50/p95/p99).
+
+Idempotent calls (bill fetches) are hedged: when the first attempt has
+not answered within the provider's PROVIDER_HEDGE_QUANTILE latency
+(PROVIDER_HEDGE_AFTER until there are enough samples), or has failed, a
+second attempt is sent and the first answer wins. At most 1 - quantile of
+calls are sent twice for being slow; the quantile is a histogram bucket
+bound, so it has to sit clear of the slow tail it is meant to cut.
+
+Payments are never retried: they move money. The provider gets our
+reference to deduplicate on, and answers a "status" call for it, which is
+how payments that ended in anything but one of DEFINITE_FAILURES are
+settled later (api.payments.settle_pending).
+
+Calls go over HTTP to PROVIDER_BASE_URL (POST /<kind>/<name>/<op>, JSON)
+or, when it is not set, to the in-process mock (api.mock_providers).
+State is per process.
+"""
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+
+from . import mock_providers
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)  # seconds, upper bounds
+HEDGE_MIN_SAMPLES = 20
+DEFAULT_TIMEOUT = 10
+
+_lock = threading.Lock()
+_providers = {}  # name -> Provider
+_pool = None
+
+
+class ProviderError(Exception):
+    """The provider call failed (error answer, connection failure, timeout)."""
+
+
+class ProviderTimeout(ProviderError):
+    pass
+
+
+class ProviderRejected(ProviderError):
+    """The provider answered, with a refusal (4xx). Does not count against the breaker."""
+
+
+class ProviderUnavailable(ProviderError):
+    """The circuit is open: the provider has been failing, so it is not called."""
+
+
+class ProviderUnreachable(ProviderError):
+    """The request could not be delivered (connection refused, unknown host)."""
+
+
+# failures after which the provider certainly did not act on the request; after any
+# other ProviderError (timeouts, 5xx answers, dropped connections) it may have
+DEFINITE_FAILURES = (ProviderRejected, ProviderUnavailable, ProviderUnreachable)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def send(kind, name, op, payload, timeout):
+    """One request to the provider. Returns its JSON answer."""
+    base = _setting("PROVIDER_BASE_URL", None)
+    if not base:
+        latency = _setting("MOCK_PROVIDER_LATENCY", {}).get(kind, 0)
+        answer = mock_providers.mock_response(kind, name, op, payload)  # a slow provider still acts on it
+        if latency > timeout:
+            time.sleep(timeout)
+            raise ProviderTimeout(f"{kind}:{name} did not answer in {timeout}s")
+        time.sleep(latency)
+        return answer
+
+    request = urllib.request.Request(
+        f"{base.rstrip('/')}/{kind}/{name}/{op}", data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as exc:
+        error = ProviderRejected if 400 <= exc.code < 500 else ProviderError
+        raise error(f"{kind}:{name} answered {exc.code}") from exc
+    except TimeoutError as exc:
+        raise ProviderTimeout(f"{kind}:{name} did not answer in {timeout}s") from exc
+    except urllib.error.URLError as exc:  # raised while connecting or sending
+        if isinstance(exc.reason, TimeoutError):
+            raise ProviderTimeout(f"{kind}:{name} did not answer in {timeout}s") from exc
+        raise ProviderUnreachable(f"{kind}:{name}: {exc.reason}") from exc
+    except (OSError, ValueError) as exc:  # connections dropped after sending, bad JSON
+        raise ProviderError(f"{kind}:{name}: {exc}") from exc
+
+
+def _hedge_pool():
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=_setting("PROVIDER_HEDGE_THREADS", 16), thread_name_prefix="hedge")
+        return _pool
+
+
+class Provider:
+    def __init__(self, kind, name):
+        self.kind, self.name = kind, name
+        self.key = f"{kind}:{name}"
+        self._lock = threading.Lock()
+        self.failures = 0           # consecutive
+        self.opened_at = None       # monotonic time the circuit opened, None when closed
+        self.trial = False          # a half-open trial call is in flight
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.calls = self.errors = self.hedges = 0
+        self.total_seconds = 0.0
+
+    @property
+    def timeout(self):
+        timeouts = _setting("PROVIDER_TIMEOUTS", {})
+        return timeouts.get(self.key, timeouts.get(self.kind, DEFAULT_TIMEOUT))
+
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < _setting("PROVIDER_BREAKER_RESET", 30):
+            return "open"
+        return "half-open"
+
+    def _refuse_if_failing(self, state):
+        if state == "open" or (state == "half-open" and self.trial):
+            raise ProviderUnavailable(f"{self.key} is failing; retry later")
+
+    def check(self):
+        """Raise ProviderUnavailable if a call would be refused now (does not take the half-open trial)."""
+        with self._lock:
+            self._refuse_if_failing(self.state())
+
+    def _admit(self):
+        with self._lock:
+            state = self.state()
+            self._refuse_if_failing(state)
+            if state == "half-open":
+                self.trial = True
+
+    def _settle(self, ok):
+        with self._lock:
+            self.trial = False
+            if ok:
+                self.failures, self.opened_at = 0, None
+            else:
+                self.failures += 1
+                if self.opened_at is not None or self.failures >= _setting("PROVIDER_BREAKER_FAILURES", 5):
+                    self.opened_at = time.monotonic()  # (re)open: a failed trial starts a new wait
+
+    def _observe(self, seconds, ok):
+        with self._lock:
+            self.calls += 1
+            self.errors += not ok
+            self.total_seconds += seconds
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    self.counts[i] += 1
+                    break
+            else:
+                self.counts[-1] += 1
+
+    def percentile(self, q):
+        """Upper bound (seconds) of the bucket holding the q-th quantile of observed latencies, or None."""
+        with self._lock:
+            counts = list(self.counts)
+        total = sum(counts)
+        if not total:
+            return None
+        seen = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), counts):
+            seen += count
+            if seen >= q * total:
+                return bound
+        return None
+
+    def _attempt(self, op, payload):
+        started = time.monotonic()
+        try:
+            answer = send(self.kind, self.name, op, payload, self.timeout)
+        except ProviderError as exc:
+            self._observe(time.monotonic() - started, isinstance(exc, ProviderRejected))
+            raise
+        self._observe(time.monotonic() - started, True)
+        return answer
+
+    def hedge_delay(self):
+        with self._lock:
+            samples = self.calls
+        if samples < HEDGE_MIN_SAMPLES:
+            return _setting("PROVIDER_HEDGE_AFTER", 0.3)
+        quantile = self.percentile(_setting("PROVIDER_HEDGE_QUANTILE", 0.9))
+        return min(self.timeout, max(_setting("PROVIDER_HEDGE_MIN", 0.01), quantile))
+
+    def _hedged(self, op, payload):
+        """Up to two attempts: the second when the first is slower than hedge_delay() or fails."""
+        pool = _hedge_pool()
+        deadline = time.monotonic() + self.timeout
+        pending = {pool.submit(self._attempt, op, payload)}
+        done, pending = wait(pending, timeout=self.hedge_delay())
+        for future in done:
+            try:
+                return future.result()
+            except ProviderRejected:
+                raise
+            except ProviderError:
+                pass
+        with self._lock:
+            self.hedges += 1
+        pending.add(pool.submit(self._attempt, op, payload))
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                raise ProviderTimeout(f"{self.key} did not answer in {self.timeout}s")
+            for future in done:
+                try:
+                    return future.result()
+                except ProviderError as exc:
+                    error = exc
+        raise error
+
+    def call(self, op, payload, idempotent=False):
+        """
+        Call the provider; hedged when `idempotent`. Returns its answer.
+        Raises ProviderUnavailable (circuit open), ProviderTimeout,
+        ProviderRejected or ProviderError.
+        """
+        self._admit()
+        try:
+            answer = self._hedged(op, payload) if idempotent else self._attempt(op, payload)
+        except ProviderRejected:
+            self._settle(True)  # it answered: the provider is up
+            raise
+        except ProviderError:
+            self._settle(False)
+            raise
+        except BaseException:
+            self._settle(True)  # not the provider's fault; release a half-open trial
+            raise
+        self._settle(True)
+        return answer
+
+    def status(self):
+        with self._lock:
+            counts, calls = list(self.counts), self.calls
+            summary = {
+                "provider": self.key,
+                "state": self.state(),
+                "consecutive_failures": self.failures,
+                "calls": calls,
+                "errors": self.errors,
+                "hedged": self.hedges,
+                "mean_ms": round(self.total_seconds / calls * 1000, 1) if calls else None,
+            }
+        for q in (0.5, 0.95, 0.99):
+            bound = self.percentile(q)
+            summary[f"p{int(q * 100)}_ms"] = None if bound is None else bound * 1000
+        summary["histogram"] = {
+            (f"le_{int(bound * 1000)}ms" if bound != float("inf") else "le_inf"): count
+            for bound, count in zip(BUCKETS + (float("inf"),), counts)
+        }
+        return summary
+
+
+def get(kind, name):
+    key = f"{kind}:{name}"
+    provider = _providers.get(key)
+    if provider is None:
+        with _lock:
+            provider = _providers.setdefault(key, Provider(kind, name))
+    return provider
+
+
+def status():
+    """Breaker state and latency summary of every provider this process has called."""
+    return [provider.status() for _, provider in sorted(_providers.items())]
+
+
+def reset():
+    """Forget all breaker state and latency samples (tests, or after fixing an upstream)."""
+    with _lock:
+        _providers.clear()
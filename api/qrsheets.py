@@ -0,0 +1,199 @@
+# backend/api/qrsheets.py
+"""
+Printable sheets of account QR codes (merchant standees).
+
+Codes carry the same gapy://bank payload as the account QR image, with an
+optional fixed amount. They are tiled GRID to an A4 page (one PDF per
+sheet, 1-bit at SHEET_DPI) and streamed as a ZIP of sheets plus a
+manifest.csv saying which account is where.
+
+Encoding is the expensive part, and most of it is qrcode trying all eight
+mask patterns to pick the one that scores best; any mask scans equally
+well, so codes here use a fixed one, and the module matrix is turned into
+an image directly instead of going through qrcode's image factory. Sheets
+are rendered in a process pool, a bounded number at a time, and come back
+in order.
+
+Render workers may be spawned: apart from sheet_cards(), this module works
+on plain dicts and does not need Django set up.
+"""
+import csv
+import io
+import multiprocessing
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal, InvalidOperation
+from urllib.parse import urlencode
+
+import qrcode
+from PIL import Image, ImageDraw
+
+from .receipts import load_font, mask
+
+SHEET_DPI = 200
+SHEET_SIZE = (1654, 2339)  # A4 at SHEET_DPI
+GRID = (3, 4)              # columns, rows
+MARGIN = 60
+MASK_PATTERN = 2
+IN_FLIGHT_PER_WORKER = 2
+PDF_DATE = time.gmtime(946684800)  # 2000-01-01, fixed so a sheet's bytes depend only on its cards
+MAX_AMOUNT = Decimal("100000")
+
+
+def clean_amount(value):
+    """A fixed QR amount as a 2-place Decimal string. Raises ValueError."""
+    try:
+        amount = Decimal(str(value)).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError("amount must be a number")
+    if not Decimal("0") < amount <= MAX_AMOUNT:
+        raise ValueError(f"amount must be between 0.01 and {MAX_AMOUNT}")
+    return str(amount)
+
+
+def qr_payload(bank_id, name, amount=None):
+    """The gapy://bank URL for an account; every value is query-encoded (holder names are user input)."""
+    params = {"bank_id": bank_id, "name": name}
+    if amount is not None:
+        params["amount"] = amount
+    return f"gapy://bank?{urlencode(params)}"
+
+
+def qr_matrix(payload, border=4):
+    """Module matrix (rows of booleans, dark = True) for `payload`, quiet zone included."""
+    qr = qrcode.QRCode(border=border, mask_pattern=MASK_PATTERN)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def matrix_image(matrix, box_size):
+    """A black on white greyscale image of a module matrix, `box_size` pixels per module."""
+    size = len(matrix)
+    pixels = bytes(0 if dark else 255 for row in matrix for dark in row)
+    return Image.frombytes("L", (size, size), pixels).resize((size * box_size,) * 2, Image.NEAREST)
+
+
+def qr_image(payload, box_size=8, border=1):
+    return matrix_image(qr_matrix(payload, border), box_size)
+
+
+def render_sheet(cards):
+    """One A4 page of up to GRID cards ({"payload", "title", "subtitle", "amount"}) as PDF bytes."""
+    page = Image.new("L", SHEET_SIZE, 255)
+    pen = ImageDraw.Draw(page)
+    columns, rows = GRID
+    cell_w = (SHEET_SIZE[0] - 2 * MARGIN) // columns
+    cell_h = (SHEET_SIZE[1] - 2 * MARGIN) // rows
+    title, small = load_font(30), load_font(22)
+
+    for i, card in enumerate(cards):
+        x = MARGIN + (i % columns) * cell_w
+        y = MARGIN + (i // columns) * cell_h
+        pen.rectangle([x, y, x + cell_w, y + cell_h], outline=0, width=1)  # cut lines
+        matrix = qr_matrix(card["payload"])
+        code = matrix_image(matrix, max(1, min(cell_w - 60, cell_h - 170) // len(matrix)))
+        page.paste(code, (x + (cell_w - code.width) // 2, y + 30))
+        text_y = y + 40 + code.height
+        for text, font in ((card["title"], title), (card["subtitle"], small), (card.get("amount"), small)):
+            if text:
+                text = text[:28]
+                width = pen.textlength(text, font=font)
+                pen.text((x + (cell_w - width) / 2, text_y), text, font=font, fill=0)
+                text_y += font.size + 10
+
+    buffer = io.BytesIO()
+    page.convert("1", dither=Image.Dither.NONE).save(
+        buffer, format="PDF", resolution=SHEET_DPI, creationDate=PDF_DATE, modDate=PDF_DATE,
+    )
+    return buffer.getvalue()
+
+
+def sheet_cards(account_ids, amount=None):
+    """
+    Cards for the accounts, in the order asked for. Returns (cards,
+    missing ids). Each card also carries its account id for the manifest.
+    """
+    from .models import BankAccount  # here, not at the top: render workers import this module without Django
+
+    found = {}
+    ids = list(dict.fromkeys(account_ids))
+    for start in range(0, len(ids), 1000):
+        for row in BankAccount.objects.filter(id__in=ids[start:start + 1000]).values(
+            "id", "holder_name", "bank_name", "account_number", "upi_id",
+        ):
+            found[row["id"]] = row
+    cards = [
+        {
+            "account_id": account["id"],
+            "payload": qr_payload(account["id"], account["holder_name"], amount),
+            "title": account["holder_name"],
+            "subtitle": account["upi_id"] or f"{account['bank_name']} {mask(account['account_number'])}",
+            "amount": f"Pay INR {amount}" if amount is not None else "",
+        }
+        for account in (found[i] for i in ids if i in found)
+    ]
+    return cards, [i for i in ids if i not in found]
+
+
+def iter_sheets(cards, workers=None):
+    """Yield (sheet number, card slice, PDF bytes) in order, rendering in a process pool unless workers == 1."""
+    per_sheet = GRID[0] * GRID[1]
+    batches = [cards[i:i + per_sheet] for i in range(0, len(cards), per_sheet)]
+    workers = min(workers or os.cpu_count() or 1, max(1, len(batches)))
+    if workers == 1:
+        for number, batch in enumerate(batches, 1):
+            yield number, batch, render_sheet(batch)
+        return
+
+    # spawn: the caller may be a threaded web worker, which must not be forked
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        pending = []
+        for number, batch in enumerate(batches, 1):
+            while len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                done_number, done_batch, future = pending.pop(0)
+                yield done_number, done_batch, future.result()
+            pending.append((number, batch, pool.submit(render_sheet, batch)))
+        for done_number, done_batch, future in pending:
+            yield done_number, done_batch, future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class _Chunks:
+    """Write-only file that hands what was written to the ZIP stream."""
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+
+def zip_stream(sheets):
+    """ZIP bytes, a chunk per sheet, from iter_sheets(); manifest.csv comes last."""
+    out = _Chunks()
+    manifest = io.StringIO()
+    writer = csv.writer(manifest)
+    writer.writerow(["sheet", "position", "account_id", "title", "payload"])
+    with zipfile.ZipFile(out, "w") as archive:
+        for number, batch, pdf in sheets:
+            name = f"sheet-{number:04d}.pdf"
+            archive.writestr(name, pdf, compress_type=zipfile.ZIP_STORED)  # PDF streams are compressed already
+            for position, card in enumerate(batch, 1):
+                writer.writerow([name, position, card["account_id"], card["title"], card["payload"]])
+            yield out.take()
+        archive.writestr("manifest.csv", manifest.getvalue(), compress_type=zipfile.ZIP_DEFLATED)
+    yield out.take()
@@ -0,0 +1,153 @@
+# backend/api/receipts.py
+"""
+Transaction receipts as PNG or PDF, drawn with Pillow (and qrcode for the
+verification code), the same stack as the account QR image.
+
+A Transaction is written once with its final status (SUCCESS or FAILED),
+so a receipt never changes. Rendered files are kept under RECEIPTS_DIR,
+named by a hash of (layout version, transaction id, status, direction,
+format): a receipt is rendered once per side ("Paid" for the sender,
+"Received" for the receiver) and afterwards served straight from disk, and
+bumping LAYOUT_VERSION retires every old file.
+
+Rendering happens in a small thread pool (RECEIPT_RENDER_WORKERS) rather
+than on the request thread; the pool works from plain dicts and never
+touches the database. Concurrent requests for the same receipt share one
+render, and when RECEIPT_RENDER_QUEUE renders are already waiting new ones
+are refused (Busy) instead of piling up.
+"""
+import hashlib
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import qrcode
+from django.conf import settings
+from django.utils import timezone
+from PIL import Image, ImageDraw, ImageFont
+
+LAYOUT_VERSION = 1
+FORMATS = {"png": "image/png", "pdf": "application/pdf"}
+WIDTH, HEIGHT = 600, 860
+COLORS = {"SUCCESS": (22, 128, 61), "FAILED": (185, 28, 28)}
+
+_lock = threading.Lock()
+_inflight = {}  # path -> Future
+_pool = None
+
+
+class Busy(Exception):
+    """Too many receipts are waiting to be rendered."""
+
+
+def receipt_path(txn_id, status, direction, fmt):
+    digest = hashlib.sha256(f"{LAYOUT_VERSION}:{txn_id}:{status}:{direction}:{fmt}".encode()).hexdigest()
+    root = Path(getattr(settings, "RECEIPTS_DIR", settings.BASE_DIR / "receipts"))
+    return root / digest[:2] / f"{digest}.{fmt}"
+
+
+def mask(account_number):
+    return f"XXXX{account_number[-4:]}" if account_number else ""
+
+
+def direction(txn, account_ids):
+    """How the owner of `account_ids` sees the transaction: "Paid" (they sent it) or "Received"."""
+    return "Paid" if txn.sender_account_id in account_ids else "Received"
+
+
+def receipt_fields(txn, account_ids):
+    """What a receipt shows, from a Transaction with its accounts attached, as seen by the owner of `account_ids`."""
+    sender, receiver = txn.sender_account, txn.receiver_account
+    return {
+        "id": txn.id,
+        "status": txn.status,
+        "amount": f"{txn.amount:,.2f}",
+        "direction": direction(txn, account_ids),
+        "timestamp": timezone.localtime(txn.timestamp).strftime("%d %b %Y, %H:%M"),
+        "from": f"{sender.holder_name} ({sender.bank_name} {mask(sender.account_number)})" if sender else "",
+        "to": txn.receiver_name or (
+            f"{receiver.holder_name} ({receiver.bank_name} {mask(receiver.account_number)})" if receiver else ""
+        ),
+        "category": txn.get_category_display() if txn.category else "",
+        "reference": txn.reference or "",
+    }
+
+
+def load_font(size):
+    try:
+        return ImageFont.load_default(size=size)
+    except (TypeError, ImportError):  # Pillow < 10.1 or no FreeType: fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def draw(fields):
+    """The receipt as a PIL image."""
+    image = Image.new("RGB", (WIDTH, HEIGHT), "white")
+    pen = ImageDraw.Draw(image)
+    color = COLORS.get(fields["status"], (55, 65, 81))
+    pen.rectangle([0, 0, WIDTH, 150], fill=color)
+    pen.text((40, 30), "GaPy payment receipt", font=load_font(24), fill="white")
+    pen.text((40, 70), f"INR {fields['amount']}", font=load_font(40), fill="white")
+    pen.text((40, 120), f"{fields['direction']} · {fields['status']}", font=load_font(18), fill="white")
+
+    y = 180
+    label, value = load_font(14), load_font(20)
+    for name, key in (("Date", "timestamp"), ("Transaction ID", "id"), ("From", "from"), ("To", "to"),
+                      ("Category", "category"), ("Reference", "reference")):
+        if fields[key] in ("", None):
+            continue
+        pen.text((40, y), name.upper(), font=label, fill=(107, 114, 128))
+        pen.text((40, y + 20), str(fields[key])[:48], font=value, fill=(17, 24, 39))
+        y += 64
+
+    qr = qrcode.QRCode(box_size=5, border=1)
+    qr.add_data(f"gapy://txn?id={fields['id']}&status={fields['status']}")
+    qr.make(fit=True)
+    code = qr.make_image(fill_color="black", back_color="white").get_image().convert("RGB")
+    image.paste(code, ((WIDTH - code.width) // 2, HEIGHT - code.height - 40))
+    return image
+
+
+def render(fields, fmt, path):
+    """Draw and store one receipt; runs in the pool. Returns `path`."""
+    image = draw(fields)
+    buffer = io.BytesIO()
+    if fmt == "pdf":
+        image.save(buffer, format="PDF", resolution=150)
+    else:
+        image.save(buffer, format="PNG", optimize=True)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+    tmp.write_bytes(buffer.getvalue())
+    os.replace(tmp, path)
+    return path
+
+
+def _done(path, future):
+    with _lock:
+        _inflight.pop(path, None)
+
+
+def receipt_file(fields, fmt):
+    """
+    Path of the rendered receipt, rendering it in the pool first if needed.
+    Raises Busy when the queue is full, TimeoutError when the render takes
+    longer than RECEIPT_RENDER_TIMEOUT (it still completes and is kept).
+    """
+    global _pool
+    path = receipt_path(fields["id"], fields["status"], fields["direction"], fmt)
+    if path.exists():
+        return path
+    with _lock:
+        future = _inflight.get(path)
+        if future is None:
+            if len(_inflight) >= getattr(settings, "RECEIPT_RENDER_QUEUE", 32):
+                raise Busy()
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=getattr(settings, "RECEIPT_RENDER_WORKERS", 2),
+                                           thread_name_prefix="receipt")
+            future = _inflight[path] = _pool.submit(render, fields, fmt, path)
+            future.add_done_callback(lambda f: _done(path, f))
+    return future.result(timeout=getattr(settings, "RECEIPT_RENDER_TIMEOUT", 10))
@@ -0,0 +1,220 @@
+# backend/api/reconcile.py
+"""
+Balance reconciliation.
+
+An account balances when
+
+    amount == opening + SUCCESS credits - SUCCESS debits
+
+over the hot table and every archive year. reconcile() walks the accounts
+in id chunks. Per chunk it reads the balances (a primary key range), the
+debit and credit totals (one UNION ALL of grouped queries, one branch per
+side per table) and the few BalanceCheck rows, all in one snapshot so a
+transfer committing meanwhile is neither reported as drift nor accepted
+as opening balance. It compares them as arrays of integer thousandths:
+with NumPy when it is installed, in plain Python otherwise. Memory is
+bounded by the chunk size.
+
+Only accounts that do not balance, or have an accepted opening, keep a
+BalanceCheck row, so that table is the current drift report.
+
+Incremental runs only recheck accounts touched since the last completed
+run: those in transactions above its watermark, accounts created since,
+and accounts that were drifting. Balance edits that bypass the transaction
+log are only found by a full run.
+
+Recharges and bill payments debit the account before the provider answers
+and write their Transaction afterwards, so one in flight shows up as
+negative drift until it completes or, if the provider call fails, is
+refunded; one the provider did not answer for stays so until
+settle_pending_payments has asked about it.
+"""
+import heapq
+import time
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F, Max, Q, Sum, Value
+from django.utils import timezone
+
+from . import archive
+from .models import BalanceCheck, BankAccount, JobCheckpoint, Transaction
+
+try:
+    import numpy as np
+except ImportError:  # optional; pip install numpy
+    np = None
+
+CHECKPOINT_NAME = "balance_reconcile"
+DEFAULT_CHUNK_SIZE = 50_000
+ID_LIST_CHUNK = 1_000    # incremental chunks filter by id list; keeps the UNION under parameter limits
+WATERMARK_OVERLAP = 1_000  # transaction ids below the watermark that may have committed after it
+SCALE = 1000             # Transaction.amount has 3 decimal places
+
+
+def _by_range(lo, hi):
+    return lambda column: Q(**{f"{column}__gte": lo, f"{column}__lt": hi})
+
+
+def _by_ids(ids):
+    return lambda column: Q(**{f"{column}__in": ids})
+
+
+def net_rows(account_filter, tables):
+    """(account ids, signed totals) of SUCCESS credits (+) and debits (-), from one query."""
+    branches = [
+        model.objects.filter(account_filter(column), status="SUCCESS")
+        .values(account=F(column))
+        .annotate(sign=Value(sign), total=Sum("amount"))
+        .values_list("account", "sign", "total")
+        .order_by()
+        for model in tables
+        for column, sign in (("receiver_account_id", 1), ("sender_account_id", -1))
+    ]
+    rows = branches[0].union(*branches[1:], all=True)
+    ids, values = [], []
+    for account_id, sign, total in rows:
+        ids.append(account_id)
+        values.append(sign * round(total * SCALE))
+    return ids, values
+
+
+def find_drift(account_ids, amounts, net_ids, net_values, openings):
+    """
+    [(account id, drift)] in thousandths for the accounts where
+    amount != opening + net. account_ids must be sorted. Net rows of other
+    accounts are ignored: archive tables have no foreign keys, so they keep
+    rows of deleted accounts, which an id range or list can still match.
+    """
+    if np is not None:
+        ids = np.asarray(account_ids, dtype=np.int64)
+        drift = np.asarray(amounts, dtype=np.int64)
+        for keys, values in ((net_ids, net_values), (list(openings), list(openings.values()))):
+            if not keys:
+                continue
+            keys, values = np.asarray(keys, dtype=np.int64), np.asarray(values, dtype=np.int64)
+            known = np.isin(keys, ids)
+            np.subtract.at(drift, np.searchsorted(ids, keys[known]), values[known])
+        mask = drift != 0
+        return list(zip(ids[mask].tolist(), drift[mask].tolist()))
+
+    expected = dict.fromkeys(account_ids, 0)
+    for account_id, value in [*zip(net_ids, net_values), *openings.items()]:
+        if account_id in expected:
+            expected[account_id] += value
+    return [(i, d) for i, a in zip(account_ids, amounts) if (d := a - expected[i])]
+
+
+@contextmanager
+def snapshot():
+    """
+    An atomic block whose reads all see the database as of one moment, so a
+    transfer committing halfway through a chunk cannot look like drift.
+    PostgreSQL needs REPEATABLE READ for that (it must be the transaction's
+    first statement, so it is only set on an outermost block); MySQL's
+    default is already REPEATABLE READ, and SQLite transactions are
+    serializable.
+    """
+    connection = db_transaction.get_connection()
+    outermost = not connection.in_atomic_block
+    with db_transaction.atomic():
+        if outermost and connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        yield
+
+
+def check_chunk(account_filter, tables, accept=False, now=None):
+    """Reconcile the accounts matching `account_filter`. Returns (accounts checked, [(id, drift)])."""
+    now = now or timezone.now()
+    with snapshot():
+        accounts = list(BankAccount.objects.filter(account_filter("id")).order_by("id").values_list("id", "amount"))
+        if not accounts:
+            return 0, []
+        account_ids = [a[0] for a in accounts]
+        amounts = [round(a[1] * SCALE) for a in accounts]
+        net_ids, net_values = net_rows(account_filter, tables)
+        checks = {
+            account_id: (round(opening * SCALE), drift)
+            for account_id, opening, drift in BalanceCheck.objects.filter(account_filter("account_id"))
+            .values_list("account_id", "opening", "drift")
+        }
+        drifted = find_drift(account_ids, amounts, net_ids, net_values, {k: v[0] for k, v in checks.items()})
+
+        # balanced again: forget the row unless it carries an accepted opening
+        balanced = set(checks) - {account_id for account_id, _ in drifted}
+        BalanceCheck.objects.filter(account_id__in=[i for i in balanced if not checks[i][0]]).delete()
+        BalanceCheck.objects.filter(account_id__in=[i for i in balanced if checks[i][0] and checks[i][1]]).update(
+            drift=Decimal("0"), checked_at=now,
+        )
+        if drifted:
+            BalanceCheck.objects.bulk_create(
+                [
+                    BalanceCheck(
+                        account_id=account_id,
+                        opening=Decimal(checks.get(account_id, (0,))[0] + (drift if accept else 0)) / SCALE,
+                        drift=Decimal(0 if accept else drift) / SCALE,
+                        checked_at=now,
+                    )
+                    for account_id, drift in drifted
+                ],
+                update_conflicts=True, unique_fields=["account"], update_fields=["opening", "drift", "checked_at"],
+            )
+    return len(accounts), drifted
+
+
+def touched_accounts(position):
+    """Account ids to recheck after the run recorded in `position`."""
+    since = max(0, position["last_txn_id"] - WATERMARK_OVERLAP)
+    recent = Transaction.objects.filter(id__gt=since)
+    ids = set(recent.values_list("sender_account_id", flat=True))
+    ids |= set(recent.exclude(receiver_account_id=None).values_list("receiver_account_id", flat=True))
+    ids |= set(BankAccount.objects.filter(id__gt=position["last_account_id"]).values_list("id", flat=True))
+    ids |= set(BalanceCheck.objects.exclude(drift=0).values_list("account_id", flat=True))
+    return sorted(ids)
+
+
+def reconcile(incremental=False, chunk_size=None, accept=False, top=20, progress=None):
+    """
+    Check every account (or, incrementally, the touched ones). Returns stats
+    with the `top` largest drifts as (account id, Decimal drift).
+    """
+    chunk_size = chunk_size or getattr(settings, "RECONCILE_CHUNK_SIZE", DEFAULT_CHUNK_SIZE)
+    started = time.monotonic()
+    checkpoint = JobCheckpoint.load(CHECKPOINT_NAME)
+    # watermarks are taken before reading anything, so the next run rechecks whatever lands meanwhile
+    marks = {
+        "last_txn_id": Transaction.objects.aggregate(m=Max("id"))["m"] or 0,
+        "last_account_id": BankAccount.objects.aggregate(m=Max("id"))["m"] or 0,
+    }
+    tables = [Transaction] + [archive.archive_model(year) for year in archive.archive_years()]
+    now = timezone.now()
+
+    if incremental and "last_txn_id" in checkpoint.position:
+        ids = touched_accounts(checkpoint.position)
+        chunks = (_by_ids(ids[i:i + ID_LIST_CHUNK]) for i in range(0, len(ids), ID_LIST_CHUNK))
+    else:
+        incremental = False
+        chunks = (_by_range(lo, lo + chunk_size) for lo in range(1, marks["last_account_id"] + 1, chunk_size))
+
+    stats = {"incremental": incremental, "checked": 0, "drifted": 0, "accepted": accept, "top": []}
+    largest = []
+    for account_filter in chunks:
+        checked, drifted = check_chunk(account_filter, tables, accept=accept, now=now)
+        stats["checked"] += checked
+        stats["drifted"] += len(drifted)
+        for account_id, drift in drifted:
+            item = (abs(drift), account_id, drift)
+            if len(largest) < top:
+                heapq.heappush(largest, item)
+            elif item > largest[0]:
+                heapq.heapreplace(largest, item)
+        if progress:
+            progress(stats)
+
+    checkpoint.store(**marks, checked_at=now.isoformat(), drifted=0 if accept else stats["drifted"])
+    stats["top"] = [(account_id, Decimal(drift) / SCALE) for _, account_id, drift in sorted(largest, reverse=True)]
+    stats["elapsed"] = time.monotonic() - started
+    return stats
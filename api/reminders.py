@@ -0,0 +1,104 @@
+# backend/api/reminders.py
+"""
+Bill reminder engine.
+
+A reminder is due when its reminder_date has come and it has not been sent
+(reminded_at is null). Due rows are read through the partial (user, id)
+index on unsent rows, a page of users at a time with every due row of
+those users, so each user gets one email per run however many bills are
+due and a run over a million due rows only holds one page in memory.
+Rows are stamped reminded_at right after their emails are sent: a rerun
+(or a crashed run) does not mail them again, and a row written later with
+an earlier reminder_date is still picked up by the next run.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils import timezone
+
+from .models import BillPayment
+
+REMIND_STATUSES = ("PENDING", "SUCCESS")
+DEFAULT_BATCH_SIZE = 500  # users per batch
+IN_BATCH = 900            # ids per IN (...), under SQLite's variable limit
+
+
+def due_reminders(upto, resend=False):
+    """BillPayments whose reminder is due on or before `upto` (and not sent yet, unless `resend`)."""
+    qs = BillPayment.objects.filter(reminder_date__isnull=False, reminder_date__lte=upto, status__in=REMIND_STATUSES)
+    return qs if resend else qs.filter(reminded_at__isnull=True)
+
+
+def iter_due_batches(upto, batch_size=DEFAULT_BATCH_SIZE, resend=False):
+    """
+    Yield lists of due reminder rows (dicts): every due row of the next
+    `batch_size` users, in (user, reminder_date, id) order.
+    """
+    due = due_reminders(upto, resend)
+    after_user = 0
+    while True:
+        users = list(
+            due.filter(user_id__gt=after_user).order_by("user_id").values_list("user_id", flat=True)
+            .distinct()[:batch_size]
+        )
+        if not users:
+            return
+        yield list(
+            due.filter(user_id__in=users).order_by("user_id", "reminder_date", "id").values(
+                "id", "user_id", "user__username", "user__email",
+                "biller__name", "consumer_number", "amount", "due_date", "reminder_date",
+            )
+        )
+        if len(users) < batch_size:
+            return
+        after_user = users[-1]
+
+
+def build_messages(rows):
+    """Group a batch of reminder rows per user and build one email each."""
+    per_user = defaultdict(list)
+    for row in rows:
+        per_user[row["user_id"]].append(row)
+
+    messages = []
+    for user_rows in per_user.values():
+        email = user_rows[0]["user__email"]
+        if not email:
+            continue
+        lines = [f"Hi {user_rows[0]['user__username']},", "", "These bills are due for payment:"]
+        for row in user_rows:
+            due = row["due_date"].isoformat() if row["due_date"] else "soon"
+            lines.append(f"  - {row['biller__name']} ({row['consumer_number']}): ₹{row['amount']} due {due}")
+        messages.append(EmailMessage(
+            subject=f"Bill reminder: {len(user_rows)} bill(s) due",
+            body="\n".join(lines),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[email],
+        ))
+    return messages, len(per_user)
+
+
+def send_due_reminders(today=None, batch_size=None, reset=False):
+    """
+    Send every unsent reminder due on or before `today` (with `reset`, the
+    ones already sent too), one email per user. Returns a dict of counters
+    for the caller to report.
+    """
+    today = today or timezone.localdate()
+    batch_size = batch_size or getattr(settings, "BILL_REMINDER_BATCH_SIZE", DEFAULT_BATCH_SIZE)
+
+    stats = {"batches": 0, "reminders": 0, "users": 0, "emails": 0}
+    connection = get_connection()
+    for rows in iter_due_batches(today, batch_size, resend=reset):
+        messages, users = build_messages(rows)
+        if messages:
+            connection.send_messages(messages)
+        ids, sent_at = [row["id"] for row in rows], timezone.now()
+        for start in range(0, len(ids), IN_BATCH):
+            BillPayment.objects.filter(id__in=ids[start:start + IN_BATCH]).update(reminded_at=sent_at)
+        stats["batches"] += 1
+        stats["reminders"] += len(rows)
+        stats["users"] += users
+        stats["emails"] += len(messages)
+    return stats
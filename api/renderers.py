@@ -0,0 +1,38 @@
+# backend/api/renderers.py
+"""
+JSON rendering for the API.
+
+FastJSONRenderer produces the same bytes as DRF's JSONRenderer for the
+compact (non-indented) case, using orjson when it is installed: datetimes,
+dates and UUIDs are encoded natively, Decimal and the rarer types go through
+DRF's own encoder. Without orjson, or when a client asks for indented
+output, DRF's renderer is used unchanged.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # optional; pip install orjson
+    orjson = None
+
+_drf_default = encoders.JSONEncoder().default
+
+if orjson is not None:
+    ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=_drf_default, option=ORJSON_OPTIONS)
+        except TypeError:  # orjson.JSONEncodeError: let DRF render it or raise its own error
+            return super().render(data, accepted_media_type, renderer_context)
+        # like DRF, keep the output a strict JavaScript subset
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
@@ -91,15 +91,19 @@ class TransactionSerializer(serializers.ModelSerializer):
         model = Transaction
         fields = [
             "id", "sender_account", "receiver_account",
-            "amount", "timestamp", "status", "reference","type"
+            "amount", "timestamp", "status", "reference","type", "category"
         ]
     def get_type(self, obj):
         request = self.context.get("request")
         if not request or not request.user.is_authenticated:
             return None
 
-        user = request.user
-        user_accounts = BankAccount.objects.filter(user=user).values_list("id", flat=True)
+        # the ids are looked up once per serializer tree (not once per row);
+        # callers that already have them can pass "account_ids" in the context
+        user_accounts = self.context.get("account_ids")
+        if user_accounts is None:
+            user_accounts = set(BankAccount.objects.filter(user=request.user).values_list("id", flat=True))
+            self.context["account_ids"] = user_accounts
 
         # if the user's account sent the transaction → Debited
         if obj.sender_account_id in user_accounts:
@@ -121,7 +125,7 @@ class OperatorSerializer(serializers.ModelSerializer):
 class PlanSerializer(serializers.ModelSerializer):
     class Meta:
         model = Plan
-        fields = ["id","category","plan_code","amount","title","validity","description"]
+        fields = ["id","circle","recharge_type","category","plan_code","amount","title","validity","description"]
 
 class MobileRechargeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -177,3 +181,47 @@ class SetPinSerializer(serializers.Serializer):
 
 class VerifyPinSerializer(serializers.Serializer):
     pin = serializers.CharField(min_length=4, max_length=8)
+
+
+# autopay
+from .models import Mandate
+
+class MandateSerializer(serializers.ModelSerializer):
+    REQUIRED_TARGET = {
+        "TRANSFER": ["payee_account"],
+        "RECHARGE": ["operator", "consumer_number"],
+        "BILL": ["biller", "consumer_number"],
+    }
+
+    class Meta:
+        model = Mandate
+        fields = [
+            "id", "payer_account", "kind", "payee_account", "biller", "operator",
+            "consumer_number", "amount", "reference", "frequency", "next_run_at",
+            "status", "retry_count", "last_run_at", "last_error", "created_at"
+        ]
+        read_only_fields = ["status", "retry_count", "last_run_at", "last_error", "created_at"]
+        extra_kwargs = {"next_run_at": {"required": False}}
+
+    def validate(self, data):
+        instance = getattr(self, "instance", None)
+
+        def current(field):
+            return data[field] if field in data else getattr(instance, field, None)
+
+        kind = current("kind")
+        for field in self.REQUIRED_TARGET.get(kind, []):
+            if not current(field):
+                raise serializers.ValidationError(f"{field} is required for {kind} mandates.")
+
+        amount = current("amount")
+        if amount is not None and amount <= 0:
+            raise serializers.ValidationError("Amount must be positive.")
+
+        payer = current("payer_account")
+        request = self.context.get("request")
+        if request and payer and payer.user_id != request.user.id:
+            raise serializers.ValidationError("payer_account must be one of your bank accounts.")
+        if kind == "TRANSFER" and payer and payer == current("payee_account"):
+            raise serializers.ValidationError("Cannot send money to the same account.")
+        return data
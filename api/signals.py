@@ -10,3 +10,62 @@ def create_or_update_profile(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
     else:
         instance.profile.save()
+
+
+# per-user data version: anything that changes what a user's list
+# endpoints return bumps their counter in the same transaction
+from django.db.models.signals import post_delete
+from .models import BankAccount, BillPayment, Payee, SavedPayee, Transaction, UserDataVersion
+
+
+def _deleting_user(origin):
+    # a user's own rows go away with them; their counter row is deleted too
+    return isinstance(origin, User) or getattr(origin, "model", None) is User
+
+
+@receiver(post_save, sender=BankAccount)
+@receiver(post_save, sender=BillPayment)
+def bump_owner_on_save(sender, instance, **kwargs):
+    UserDataVersion.bump(instance.user_id)
+
+
+@receiver(post_delete, sender=BankAccount)
+@receiver(post_delete, sender=BillPayment)
+def bump_owner_on_delete(sender, instance, origin=None, **kwargs):
+    if not _deleting_user(origin):
+        UserDataVersion.bump(instance.user_id)
+
+
+@receiver(post_save, sender=SavedPayee)
+def bump_payee_list_on_save(sender, instance, **kwargs):
+    UserDataVersion.bump(instance.owner_id)
+
+
+@receiver(post_delete, sender=SavedPayee)
+def bump_payee_list_on_delete(sender, instance, origin=None, **kwargs):
+    if not _deleting_user(origin):
+        UserDataVersion.bump(instance.owner_id)
+
+
+@receiver(post_save, sender=Payee)
+def bump_payee_savers(sender, instance, created, **kwargs):
+    if not created:
+        UserDataVersion.bump(*SavedPayee.objects.filter(payee=instance).values_list("owner_id", flat=True))
+
+
+@receiver(post_save, sender=Transaction)
+def bump_transaction_owners(sender, instance, **kwargs):
+    UserDataVersion.bump(instance.sender_user_id, instance.receiver_user_id)
+
+
+# plan search index (api.plan_index): a changed plan stamps its operator
+from . import plan_index
+from .models import Operator, Plan
+
+
+@receiver(post_save, sender=Plan)
+@receiver(post_delete, sender=Plan)
+def stamp_operator_catalog(sender, instance, origin=None, **kwargs):
+    # plans deleted along with their operator have nothing left to stamp
+    if not isinstance(origin, Operator) and getattr(origin, "model", None) is not Operator:
+        plan_index.catalog_changed(instance.operator_id)
@@ -0,0 +1,254 @@
+# backend/api/statements.py
+"""
+Monthly account statements, written to disk for every user.
+
+generate_statements() splits the user id space into fixed ranges
+(partitions) and hands them to a process pool. A worker reads its range's
+month of hot transactions with two streamed queries (QuerySet.iterator(),
+a server-side cursor on PostgreSQL) and writes, for each user in the range
+who has an account, one gzipped CSV of the month, oldest first, plus a
+JSON lines index for the range. Layout under STATEMENTS_DIR:
+
+    <YYYY-MM>/users/<user id // 1000>/<user id>.csv.gz
+    <YYYY-MM>/parts/<range start>.jsonl     one index line per user
+    <YYYY-MM>/index.jsonl                   all parts, once every range is done
+
+Every file is written to a temporary name and renamed into place, and a
+range's part file is written last, so a part file means the range is
+complete. The part files are the checkpoint: a rerun after a crash skips
+the ranges that have one and redoes the rest. Statements are byte-for-byte
+reproducible (gzip mtime 0), so redoing a range only rewrites identical
+files.
+"""
+import csv
+import datetime
+import gzip
+import heapq
+import io
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, Max, Q, Value
+from django.utils import timezone
+
+from . import archive
+from .models import BankAccount, Transaction
+
+DEFAULT_PARTITION_SIZE = 1000
+CURSOR_CHUNK = 2000
+USERS_PER_DIR = 1000
+COLUMNS = ["date", "transaction_id", "type", "account", "counterparty", "amount", "status", "category", "reference"]
+ROW_FIELDS = (
+    "id", "timestamp", "sender_account_id", "receiver_account_id", "receiver_name",
+    "amount", "status", "reference",
+)
+
+
+def month_bounds(year, month):
+    """[start, end) of the calendar month in the current time zone."""
+    start = timezone.make_aware(datetime.datetime(year, month, 1))
+    end = timezone.make_aware(datetime.datetime(year + month // 12, month % 12 + 1, 1))
+    return start, end
+
+
+def statements_dir(year, month):
+    root = Path(getattr(settings, "STATEMENTS_DIR", settings.BASE_DIR / "statements"))
+    return root / f"{year:04d}-{month:02d}"
+
+
+def hot_rows_by_user(lo, hi, start, end):
+    """
+    (user id, rows oldest first) for the users lo <= id < hi with hot
+    transactions in [start, end), in user id order: two streamed range
+    scans on the (sender_user, timestamp) and (receiver_user, timestamp)
+    indexes, merged by user, so memory is one user's month.
+    """
+    period = Q(timestamp__gte=start, timestamp__lt=end)
+
+    def side(column, direction):
+        return (
+            Transaction.objects.filter(period, **{f"{column}__gte": lo, f"{column}__lt": hi})
+            .annotate(owner=F(column), direction=Value(direction),
+                      sender_holder=F("sender_account__holder_name"), receiver_holder=F("receiver_account__holder_name"))
+            .order_by(column, "timestamp")
+            .values("owner", "direction", "sender_holder", "receiver_holder", *ROW_FIELDS, "category")
+            .iterator(chunk_size=CURSOR_CHUNK)
+        )
+
+    merged = heapq.merge(side("sender_user_id", "DEBIT"), side("receiver_user_id", "CREDIT"), key=itemgetter("owner"))
+    for user_id, rows in groupby(merged, key=itemgetter("owner")):
+        unique = {}
+        for row in rows:
+            unique.setdefault(row["id"], row)  # a transfer between the user's own accounts stays a debit
+        yield user_id, sorted(unique.values(), key=itemgetter("timestamp", "id"))
+
+
+def archived_rows(account_ids, start, end, year, categorized, names):
+    """
+    Rows of the `year` archive in [start, end) involving `account_ids`,
+    oldest first, shaped like hot_rows_by_user()'s. Archive tables have no
+    owner columns or foreign keys, so they are searched by account and the
+    holder names come from `names` (account id -> holder name, filled as needed).
+    """
+    rows = list(
+        archive.archive_model(year).objects
+        .filter(Q(sender_account_id__in=account_ids) | Q(receiver_account_id__in=account_ids),
+                timestamp__gte=start, timestamp__lt=end)
+        .order_by("timestamp", "id")
+        .values(*ROW_FIELDS + (("category",) if categorized else ()))
+    )
+    missing = {
+        account_id for row in rows
+        for account_id in (row["sender_account_id"], row["receiver_account_id"])
+        if account_id and account_id not in names
+    }
+    if missing:
+        names.update(BankAccount.objects.filter(id__in=missing).values_list("id", "holder_name"))
+    for row in rows:
+        row["direction"] = "DEBIT" if row["sender_account_id"] in account_ids else "CREDIT"
+        row["sender_holder"] = names.get(row["sender_account_id"], "")
+        row["receiver_holder"] = names.get(row["receiver_account_id"], "")
+    return rows
+
+
+def write_statement(path, user_id, accounts, rows):
+    """
+    Write one statement (gzipped CSV) of `rows`; `accounts` maps the user's
+    account ids to account numbers. Returns its index entry.
+    """
+    entry = {"user_id": user_id, "transactions": 0, "debited": Decimal("0"), "credited": Decimal("0")}
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6, mtime=0) as gz:
+        out = io.TextIOWrapper(gz, encoding="utf-8", newline="")
+        writer = csv.writer(out)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            if row["direction"] == "DEBIT":
+                own, counterparty = row["sender_account_id"], row["receiver_name"] or row["receiver_holder"]
+            else:
+                own, counterparty = row["receiver_account_id"], row["sender_holder"]
+            writer.writerow([
+                timezone.localtime(row["timestamp"]).isoformat(), row["id"], row["direction"],
+                accounts.get(own, ""), counterparty or "", row["amount"], row["status"],
+                row.get("category") or "", row["reference"] or "",
+            ])
+            entry["transactions"] += 1
+            if row["status"] == "SUCCESS":
+                entry["debited" if row["direction"] == "DEBIT" else "credited"] += row["amount"]
+        out.flush()
+        out.detach()
+    os.replace(tmp, path)
+    entry["file"] = str(path.relative_to(path.parents[2]))
+    entry["bytes"] = path.stat().st_size
+    entry["debited"], entry["credited"] = str(entry["debited"]), str(entry["credited"])
+    return entry
+
+
+def write_partition(year, month, lo, hi):
+    """Write the statements of users with lo <= id < hi, then the range's part file. Returns (users, transactions)."""
+    base = statements_dir(year, month)
+    start, end = month_bounds(year, month)
+    archive_year = year if year in archive.archive_years() else None
+    categorized = archive_year is not None and archive_year in archive.categorized_years()
+
+    accounts = {}
+    for user_id, account_id, number in (
+        BankAccount.objects.filter(user_id__gte=lo, user_id__lt=hi)
+        .order_by("user_id", "id").values_list("user_id", "id", "account_number")
+    ):
+        accounts.setdefault(user_id, {})[account_id] = number
+
+    # both walk the range in user id order
+    hot = hot_rows_by_user(lo, hi, start, end)
+    pending = next(hot, None)
+    names = {}
+    entries = []
+    for user_id, own in accounts.items():
+        while pending and pending[0] < user_id:  # users who no longer have an account
+            pending = next(hot, None)
+        rows = []
+        if archive_year is not None:
+            rows = archived_rows(set(own), start, end, archive_year, categorized, names)
+        if pending and pending[0] == user_id:
+            rows += pending[1]  # archived rows are older than the hot horizon
+            pending = next(hot, None)
+        directory = base / "users" / str(user_id // USERS_PER_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        entries.append(write_statement(directory / f"{user_id}.csv.gz", user_id, own, rows))
+    for _ in hot:  # finish the cursors
+        pass
+
+    part = base / "parts" / f"{lo}.jsonl"
+    part.parent.mkdir(parents=True, exist_ok=True)
+    tmp = part.with_name(part.name + ".tmp")
+    tmp.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+    os.replace(tmp, part)
+    return len(entries), sum(entry["transactions"] for entry in entries)
+
+
+def _run_partition(year, month, lo, hi):
+    try:
+        return write_partition(year, month, lo, hi)
+    finally:
+        connections.close_all()
+
+
+def generate_statements(year, month, workers=None, partition_size=None, reset=False, progress=None):
+    """
+    Write every user's statement for the month. Ranges that already have a
+    part file are skipped unless `reset`. workers=1 runs in this process.
+    Returns stats.
+    """
+    partition_size = partition_size or getattr(settings, "STATEMENT_PARTITION_SIZE", DEFAULT_PARTITION_SIZE)
+    workers = workers or os.cpu_count() or 1
+    base = statements_dir(year, month)
+    parts = base / "parts"
+    if reset and parts.exists():
+        for part in parts.iterdir():
+            part.unlink()
+
+    started = time.monotonic()
+    last_user = BankAccount.objects.aggregate(m=Max("user_id"))["m"] or 0
+    ranges = [(lo, lo + partition_size) for lo in range(0, last_user + 1, partition_size)]
+    pending = [(lo, hi) for lo, hi in ranges if not (parts / f"{lo}.jsonl").exists()]
+    stats = {"partitions": len(ranges), "skipped": len(ranges) - len(pending), "users": 0, "transactions": 0}
+
+    def finished(users, transactions):
+        stats["users"] += users
+        stats["transactions"] += transactions
+        stats["elapsed"] = time.monotonic() - started
+        if progress:
+            progress(stats)
+
+    if workers == 1 or len(pending) <= 1:
+        for lo, hi in pending:
+            finished(*write_partition(year, month, lo, hi))
+    else:
+        # fork, so workers inherit the configured Django; they must not share the parent's connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [pool.submit(_run_partition, year, month, lo, hi) for lo, hi in pending]
+            for future in as_completed(futures):
+                finished(*future.result())
+
+    index = base / "index.jsonl"
+    tmp = index.with_name(index.name + ".tmp")
+    with open(tmp, "w") as out:
+        for lo, _ in ranges:
+            part = parts / f"{lo}.jsonl"
+            if part.exists():
+                out.write(part.read_text())
+    os.replace(tmp, index)
+    stats["index"] = str(index)
+    stats["elapsed"] = time.monotonic() - started
+    return stats
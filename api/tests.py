@@ -1,3 +1,1531 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import io
+import json
+import re
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from decimal import Decimal
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api import (
+    archive, bills, categories, counterparties, events, mandates, onboarding, outbox, payee_index, payments, plan_index,
+    providers, qrsheets, receipts, reconcile, reminders, statements, upi,
+    urls as api_urls,
+)
+from api.models import (
+    BalanceCheck, BankAccount, Biller, BillPayment, CounterpartyStat, JobCheckpoint, Mandate, MobileRecharge, Operator,
+    OutboxEvent, Payee, Plan, SavedPayee, Transaction, UpiSequence, UserDataVersion,
+)
+from api.middleware import CompressionMiddleware, negotiate_encoding
+from api.mock_providers import MockProviderServer
+from api.renderers import FastJSONRenderer
+
+
+FAST_SETTINGS = dict(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    MOCK_PROVIDER_LATENCY={},
+)
+
+
+def seed(owner, other, n):
+    """Add `n` rows to every per-user list the endpoints read."""
+    a1, b1 = owner.bank_accounts.order_by("id")[0], other.bank_accounts.get()
+    airtel = Operator.objects.get(code="airtel")
+    biller = Biller.objects.get(code="tneb")
+    now = timezone.now()
+    start = Transaction.objects.count()
+
+    Transaction.objects.bulk_create([
+        Transaction(
+            sender_account=a1 if i % 2 else b1, sender_user=owner if i % 2 else other,
+            receiver_account=b1 if i % 2 else a1, receiver_user=other if i % 2 else owner,
+            amount=Decimal("1.00"),
+            timestamp=now - datetime.timedelta(days=(start + i) % 150),
+        )
+        for i in range(n)
+    ])
+    BillPayment.objects.bulk_create([
+        BillPayment(user=owner, biller=biller, consumer_number=f"C{start + i}", amount=Decimal("10.00"), status="SUCCESS")
+        for i in range(n)
+    ])
+    payees = Payee.objects.bulk_create([
+        Payee(name=f"Payee {start + i}", upi_id=f"payee{start + i}@gapy") for i in range(n)
+    ])
+    SavedPayee.objects.bulk_create([SavedPayee(owner=owner, payee=p) for p in payees])
+    Plan.objects.bulk_create([
+        Plan(operator=airtel, category="data" if i % 2 else "topup", amount=100 + i, title=f"Plan {i}")
+        for i in range(n)
+    ])
+    # accounts sharing alice's "alice.stat" UPI prefix
+    BankAccount.objects.bulk_create([
+        BankAccount(user=owner, holder_name=owner.username, bank_name="State Bank", account_number=f"5{start + i:08d}",
+                    ifsc="SBIN0000001", upi_id=upi_id)
+        for i, upi_id in enumerate(upi.allocate_upi_ids(owner.username, "State Bank", n))
+    ])
+    Mandate.objects.bulk_create([
+        Mandate(user=owner, payer_account=a1, kind="TRANSFER", payee_account=b1,
+                amount=Decimal("1.00"), next_run_at=now + datetime.timedelta(days=1))
+        for i in range(n)
+    ])
+    UserDataVersion.bump(owner.id, other.id)  # bulk writes send no signals
+
+
+def endpoint_cases(ctx):
+    """
+    (url name, method, url args, payload, max queries[, "staff"]) for every
+    URL in api/urls.py, requested as alice or, when marked, as a staff user
+    with one account and no PIN. The budget counts the token lookup and any
+    savepoints. A callable payload builds a multipart upload per request.
+    """
+    a1, a2, b1 = ctx["a1"], ctx["a2"], ctx["b1"]
+    return [
+        ("register", "post", (), {"username": "carol", "email": "c@x.com", "password": "pw123456", "confirm_password": "pw123456", "pin": "1234", "confirm_pin": "1234"}, 6),
+        ("login", "post", (), {"username": "alice", "password": "secret"}, 5),
+        ("pin_login", "post", (), {"username": "alice", "pin": "1234"}, 4),
+        ("account", "get", (), None, 2),
+        ("banks", "get", (), None, 3),
+        ("banks", "post", (), {"holder_name": "alice", "bank_name": "State Bank", "account_number": "99999999", "ifsc": "SBIN0000001", "pin": "1234"}, 13),
+        ("add_balance", "post", (), {"amount": "50"}, 3),
+        ("balance", "get", (), {"id": a1.id}, 2),
+        ("balances", "get", (), None, 3),
+        ("api_search_payees", "get", (), {"q": "bob"}, 6),
+        ("api_add_saved_payee", "post", (), {"payee_id": ctx["payee"].id}, 7),
+        ("api_list_saved_payees", "get", (), None, 3),
+        ("api_payee_suggestions", "get", (), {"limit": "5"}, 3),
+        ("api_make_transaction", "post", (), {"id": a1.id, "payee_id": b1.id, "amount": "5", "pin": "1234"}, 17),
+        ("api_list_transactions", "get", (), None, 5),
+        ("transactions-list-alias", "get", (), None, 5),
+        ("transaction-receipt-png", "get", (10**9,), None, 4),  # nobody's
+        ("transaction-receipt-pdf", "get", (10**9,), None, 4),
+        ("transaction-receipt-png", "get", (ctx["txn"].id,), None, 3),
+        ("transaction-receipt-pdf", "get", (ctx["txn"].id,), None, 3),
+        ("api_bank_search", "post", (), {"account_number": "2222", "ifsc": "SBIN0000001"}, 2),
+        ("api_bank_add_saved", "post", (), {"bank_account_id": b1.id}, 8),
+        ("api_my_qr", "get", (), None, 2),
+        ("qr-sheets", "post", (), {"account_ids": [a1.id]}, 1),  # staff only
+        ("qr-sheets", "post", (), {"account_ids": [a1.id, b1.id], "amount": "250"}, 2, "staff"),
+        ("api_bank_detail", "get", (b1.id,), None, 2),
+        ("operators", "get", (), None, 2),
+        ("plans", "get", (), {"operator": "airtel", "circle": "mumbai"}, 2),
+        ("plans-search", "get", (), {"operator": "airtel", "near": "120", "limit": "10"}, 2),
+        ("recharge", "post", (), {"bank_id": a1.id, "mobile": "9999999999", "operator": "airtel", "amount": "10", "pin": "1234"}, 15),
+        ("billers-list", "get", (), None, 2),
+        ("bill-fetch", "post", (), {"biller_code": "tneb", "consumer_number": "123456"}, 2),
+        ("bill-pay", "post", (), {"bank_id": a1.id, "biller_code": "tneb", "consumer_number": "123456", "amount": "10", "pin": "1234"}, 17),
+        ("bill-pay-multiple", "post", (), {"bank_id": a1.id, "pin": "1234", "items": [
+            {"biller_code": "tneb", "consumer_number": "1", "amount": "10"},
+            {"biller_code": "tneb", "consumer_number": "2", "amount": "10"},
+            {"biller_code": "tneb", "consumer_number": "3", "amount": "10"},
+        ]}, 15),
+        ("providers-status", "get", (), None, 1),  # staff only
+        ("providers-status", "get", (), None, 1, "staff"),
+        ("bill-history", "get", (), None, 3),
+        ("transactions-stats", "get", (), None, 5),
+        ("api-profile-detail", "get", (), None, 2),
+        ("api-profile-info", "get", (), None, 3),
+        ("api-change-password", "post", (), {"old_password": "secret", "new_password": "secret2"}, 4),
+        ("api-change-pin", "post", (), {"old_pin": "1234", "new_pin": "4321"}, 4),
+        ("api-bank-detail", "delete", (a2.id,), None, 10),
+        ("pin-status", "get", (), None, 2),
+        ("set-pin", "post", (), {"pin": "1234", "confirm_pin": "1234"}, 2),  # already set
+        ("set-pin", "post", (), {"pin": "1234", "confirm_pin": "1234"}, 4, "staff"),
+        ("verify-pin", "post", (), {"payload": {"id": a1.id, "pin": "1234"}}, 2),
+        ("dashboard", "get", (), None, 5),
+        ("mandates", "get", (), None, 2),
+        ("mandate-detail", "get", (ctx["mandate"].id,), None, 2),
+        ("api-bank-import", "post", (), None, 2),
+        ("api-bank-import", "post", (), lambda: {"file": SimpleUploadedFile("accounts.csv", (
+            b"username,holder_name,bank_name,account_number,ifsc,pin\n"
+            b"alice,alice,State Bank,77777777,SBIN0000001,1234\n"
+            b"bob,bob,HDFC,77777778,HDFC0000001,1234\n"
+        ))}, 12, "staff"),
+        ("events-stream", "get", (), {"timeout": "0"}, 1),
+        ("events-poll", "get", (), {"after": "0", "timeout": "0"}, 2),
+    ]
+
+
+@override_settings(**FAST_SETTINGS)
+class QueryBudgetTests(TestCase):
+    """
+    Every endpoint must stay under its query budget, and the number of
+    queries must not grow with the amount of data the user has.
+    """
+    SIZES = (5, 50)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user("alice", "alice@x.com", "secret")
+        cls.alice.profile.set_pin("1234")
+        cls.alice.profile.pin_enabled = True
+        cls.alice.profile.save()
+        bob = User.objects.create_user("bob", "bob@x.com", "secret")
+        cls.bob = bob
+
+        def account(user, number, bank="State Bank", amount="1000.00"):
+            acc = BankAccount.objects.create(
+                user=user, holder_name=user.username, bank_name=bank, account_number=number,
+                ifsc="SBIN0000001", upi_id=f"{user.username}.{number}@gapy", amount=Decimal(amount),
+            )
+            acc.set_pin("1234")
+            return acc
+
+        cls.ctx = {
+            "a1": account(cls.alice, "111111"),
+            "a2": account(cls.alice, "333333", bank="HDFC"),
+            "b1": account(bob, "222222"),
+        }
+        airtel = Operator.objects.create(code="airtel", name="Airtel")
+        plan_index.for_operator(airtel)  # built once per catalog change, not per request
+        Biller.objects.create(code="tneb", name="TNEB", category="electricity")
+        cls.ctx["payee"] = Payee.objects.create(name="Bob", upi_id="bob.222222@gapy")
+        cls.ctx["mandate"] = Mandate.objects.create(
+            user=cls.alice, payer_account=cls.ctx["a1"], kind="TRANSFER", payee_account=cls.ctx["b1"],
+            amount=Decimal("1.00"), next_run_at=timezone.now(),
+        )
+        cls.ctx["txn"] = Transaction.objects.create(
+            sender_account=cls.ctx["a1"], sender_user=cls.alice, receiver_account=cls.ctx["b1"], receiver_user=bob,
+            amount=Decimal("1.00"), status="SUCCESS",
+        )
+        cls.token = Token.objects.create(user=cls.alice)
+        cls.staff = User.objects.create_user("admin", "admin@x.com", "secret", is_staff=True)
+        BankAccount.objects.create(user=cls.staff, holder_name="admin", bank_name="State Bank",
+                                   account_number="444444", ifsc="SBIN0000001", upi_id="admin.444444@gapy")
+        cls.staff_token = Token.objects.create(user=cls.staff)
+
+    def setUp(self):
+        receipts_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(receipts_dir.cleanup)
+        self.enterContext(override_settings(RECEIPTS_DIR=receipts_dir.name))
+
+    def measure(self, client, name, method, args, payload):
+        """Run one request inside a savepoint that is rolled back afterwards."""
+        url = reverse(name, args=args)
+        sid = transaction.savepoint()
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                if method == "get":
+                    response = getattr(client, method)(url, payload)
+                elif callable(payload):
+                    response = getattr(client, method)(url, payload(), format="multipart")
+                else:
+                    response = getattr(client, method)(url, payload, format="json")
+        finally:
+            transaction.savepoint_rollback(sid)
+        self.assertLess(response.status_code, 500, f"{name} -> {response.status_code}")
+        return len(queries)
+
+    def test_every_url_has_a_budget(self):
+        covered = {case[0] for case in endpoint_cases(self.ctx)}
+        names = {p.name for p in api_urls.urlpatterns}
+        self.assertEqual(names - covered, set())
+
+    def test_query_budgets(self):
+        clients = {"alice": APIClient(), "staff": APIClient()}
+        clients["alice"].credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        clients["staff"].credentials(HTTP_AUTHORIZATION=f"Token {self.staff_token.key}")
+        cases = endpoint_cases(self.ctx)
+        counts = [[] for _ in cases]
+
+        seeded = 0
+        for size in self.SIZES:
+            seed(self.alice, self.bob, size - seeded)
+            seeded = size
+            for found, (name, method, args, payload, _budget, *user) in zip(counts, cases):
+                found.append(self.measure(clients[user[0] if user else "alice"], name, method, args, payload))
+
+        header = f"{'endpoint':<44}" + "".join(f"{'N=' + str(s):>8}" for s in self.SIZES) + f"{'budget':>8}"
+        lines = [header, "-" * len(header)]
+        labels = [f"{method.upper()} {name}" + "".join(f" ({u})" for u in user)
+                  for name, method, _args, _payload, _budget, *user in cases]
+        for label, found, case in zip(labels, counts, cases):
+            lines.append(f"{label:<44}" + "".join(f"{c:>8}" for c in found) + f"{case[4]:>8}")
+        print("\n" + "\n".join(lines))
+
+        for label, found, case in zip(labels, counts, cases):
+            name, budget = case[0], case[4]
+            with self.subTest(endpoint=label):
+                self.assertLessEqual(max(found), budget)
+                self.assertEqual(len(set(found)), 1, f"{name} grows with N: {found}")
+
+
+@override_settings(**FAST_SETTINGS)
+class TransactionArchiveTests(TransactionTestCase):
+    """History reads the same before and after old rows move to the archives."""
+
+    def setUp(self):
+        alice = User.objects.create_user("alice", "alice@x.com", "secret")
+        bob = User.objects.create_user("bob", "bob@x.com", "secret")
+        a1 = BankAccount.objects.create(user=alice, holder_name="alice", bank_name="State Bank",
+                                        account_number="111111", ifsc="SBIN0000001", upi_id="alice.1@gapy")
+        b1 = BankAccount.objects.create(user=bob, holder_name="bob", bank_name="State Bank",
+                                        account_number="222222", ifsc="SBIN0000001", upi_id="bob.1@gapy")
+        now = timezone.now()
+        Transaction.objects.bulk_create([
+            Transaction(sender_account=a1 if i % 2 else b1, sender_user=alice if i % 2 else bob,
+                        receiver_account=b1 if i % 2 else a1, receiver_user=bob if i % 2 else alice,
+                        amount=Decimal(i + 1), timestamp=now - datetime.timedelta(days=i * 17))
+            for i in range(120)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(alice)
+
+    def tearDown(self):
+        for year in archive.archive_years():
+            with connection.schema_editor() as editor:
+                editor.delete_model(archive.archive_model(year))
+            archive._ready.discard(year)
+
+    def history(self, **params):
+        response = self.client.get(reverse("api_list_transactions"), params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def ids(self, **params):
+        """Every id of the history, following X-Next-Before from page to page."""
+        paged, cursor = [], None
+        while True:
+            response = self.history(**params, **({"before": cursor} if cursor else {}))
+            paged += [row["id"] for row in response.data]
+            cursor = response.get("X-Next-Before")
+            if not cursor:
+                return paged
+
+    def test_reads_span_hot_and_archive(self):
+        before = self.ids()
+        self.assertEqual(len(before), 120)
+        year = (timezone.now() - datetime.timedelta(days=1000)).year
+        in_year = self.ids(year=year)
+
+        stats = archive.archive_transactions(hot_days=365, batch_size=25)
+        self.assertTrue(stats["finished"])
+        self.assertEqual(Transaction.objects.count(), 22)
+        self.assertEqual(self.ids(), before)
+        self.assertEqual(self.ids(limit=30), before)
+
+        with override_settings(TRANSACTION_PAGE_SIZE=20), CaptureQueriesContext(connection) as queries:
+            first = self.history()
+        self.assertEqual([row["id"] for row in first.data], before[:20])
+        self.assertFalse([q for q in queries if re.search(r"api_transaction_\d{4}", q["sql"])])  # hot rows fill it
+
+        self.assertEqual(self.ids(year=year), in_year)
+        self.assertEqual(archive.archive_transactions(hot_days=365)["moved"], 0)
+
+    def test_category_backfill_and_filters(self):
+        a1 = BankAccount.objects.get(upi_id="alice.1@gapy")
+        airtel = Operator.objects.create(code="airtel", name="Airtel")
+        tneb = Biller.objects.create(code="tneb", name="TNEB", category="electricity")
+        now = timezone.now()
+
+        def legacy(reference, days, amount):  # rows as they were written before the category column
+            return Transaction.objects.create(sender_account=a1, amount=Decimal(amount), reference=reference,
+                                              timestamp=now - datetime.timedelta(days=days))
+        recharges = [legacy("Mobile Recharge (Airtel)", 3, "10"), legacy("Mobile Recharge (Airtel)", 900, "20")]
+        bill = legacy("Bill Payment (TNEB)", 5, "30")
+        archive.archive_transactions(hot_days=365)
+
+        self.assertEqual(self.history(category="recharge").data, [])
+        versions = dict(UserDataVersion.objects.values_list("user_id", "version"))
+        stats = categories.classify_transactions(batch_size=40)
+        bumped = UserDataVersion.objects.values_list("user_id", "version")
+        self.assertEqual(len(bumped), 2)
+        for user_id, version in bumped:
+            self.assertGreater(version, versions.get(user_id, 0))  # else list ETags keep answering 304
+        self.assertTrue(stats["finished"])
+        self.assertEqual(stats["classified"], 123)
+
+        self.assertEqual(self.ids(category="RECHARGE"), [t.id for t in recharges])
+        self.assertEqual(len(self.ids(category="P2P")), 120)
+        self.assertEqual(Transaction.objects.get(id=recharges[0].id).operator_id, airtel.id)
+        self.assertEqual(Transaction.objects.get(id=bill.id).biller_id, tneb.id)
+
+        response = self.client.get(reverse("transactions-stats"), {"category": "BILL"})
+        self.assertEqual(Decimal(response.data["total_debited"]), Decimal("30"))
+        self.assertEqual(self.client.get(reverse("transactions-stats"), {"category": "food"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("api_list_transactions"), {"category": "food"}).status_code, 400)
+
+        BankAccount.objects.filter(id=a1.id).update(amount=Decimal("5"))
+        payments.recharge(a1.user, a1.id, airtel, "9999999999", Decimal("1"))
+        self.assertEqual(Transaction.objects.latest("id").category, "RECHARGE")
+
+
+class FailingSink:
+    def send(self, events):
+        raise outbox.SinkError("down")
+
+
+@override_settings(**FAST_SETTINGS, OUTBOX_SETTLE_SECONDS=0)
+class OutboxTests(TestCase):
+    """Payments write their events atomically; sinks get every event at least once, in order."""
+
+    def setUp(self):
+        def account(username, number, amount):
+            user = User.objects.create_user(username, f"{username}@x.com", "secret")
+            return BankAccount.objects.create(user=user, holder_name=username, bank_name="State Bank",
+                                              account_number=number, ifsc="SBIN0000001",
+                                              upi_id=f"{username}.{number}@gapy", amount=Decimal(amount))
+        self.a1, self.b1 = account("alice", "111111", "100.00"), account("bob", "222222", "0.00")
+
+    def test_events_follow_the_money(self):
+        payments.transfer(self.a1.id, self.b1.id, Decimal("30"))
+        with self.assertRaises(payments.InsufficientFunds):
+            payments.transfer(self.a1.id, self.b1.id, Decimal("500"), record_failure=False)
+        payments.transfer(self.a1.id, self.b1.id, Decimal("500"))
+
+        events = list(OutboxEvent.objects.order_by("id"))
+        self.assertEqual([(e.topic, e.payload["status"]) for e in events],
+                         [("transfer", "SUCCESS"), ("transfer", "FAILED")])
+        self.assertEqual(events[0].payload["receiver_user_id"], self.b1.user_id)
+
+        with tempfile.NamedTemporaryFile("r", suffix=".jsonl") as fh:
+            sink = outbox.JsonLinesSink(fh.name)
+            with self.assertRaises(outbox.SinkError):
+                outbox.dispatch_batch("file", FailingSink())
+            self.assertEqual(outbox.lag("file")[0], 2)
+
+            self.assertEqual(outbox.dispatch_batch("file", sink, batch_size=1), 1)
+            self.assertEqual(outbox.dispatch_batch("file", sink, batch_size=1), 1)
+            self.assertEqual(outbox.dispatch_batch("file", sink), 0)
+            self.assertEqual([json.loads(line)["id"] for line in fh], [e.id for e in events])
+        self.assertEqual(outbox.lag("file"), (0, 0.0))
+
+    def test_events_committed_after_higher_ids_are_still_delivered(self):
+        late_id = [outbox.publish("transfer", {"n": n}) for n in range(3)][1].id
+        OutboxEvent.objects.filter(id=late_id).delete()  # its transaction has taken the id but not committed yet
+        sink = mock.Mock()
+        self.assertEqual(outbox.dispatch_batch("mem", sink), 2)
+        self.assertEqual(outbox.lag("mem")[0], 0)
+
+        OutboxEvent.objects.create(id=late_id, topic="transfer", payload={"n": 1})  # ... and now it has
+        self.assertEqual(outbox.lag("mem")[0], 1)
+        self.assertEqual(outbox.prune(["mem"], keep_days=0, now=timezone.now() + datetime.timedelta(days=1)), 1)
+        self.assertEqual(outbox.dispatch_batch("mem", sink), 1)
+        self.assertEqual([e.id for e in sink.send.call_args.args[0]], [late_id])
+        self.assertEqual(outbox.dispatch_batch("mem", sink), 0)
+
+        gone = outbox.publish("transfer", {"n": 3})
+        gone.delete()  # rolled back: the gap never fills and is given up after OUTBOX_GAP_SECONDS
+        outbox.publish("transfer", {"n": 4})
+        self.assertEqual(outbox.dispatch_batch("mem", sink), 1)
+        later = timezone.now() + datetime.timedelta(seconds=601)
+        self.assertEqual(outbox.dispatch_batch("mem", sink, now=later), 0)
+        self.assertEqual(JobCheckpoint.objects.get(name="outbox:mem").position["gaps"], {})
+
+
+class LiveEventsTests(TestCase):
+    """Credits reach a waiting receiver on commit and can be replayed from the outbox."""
+
+    def setUp(self):
+        OutboxTests.setUp(self)
+
+    def test_credit_is_pushed_then_replayed(self):
+        bob = self.b1.user_id
+        loop = asyncio.new_event_loop()
+        try:
+            async def subscribe():
+                return events.broker.subscribe(bob)
+            sub = loop.run_until_complete(subscribe())
+            with self.captureOnCommitCallbacks(execute=True):
+                txn = payments.transfer(self.a1.id, self.b1.id, Decimal("30"))
+            pushed = loop.run_until_complete(asyncio.wait_for(sub.queue.get(), 1))
+            events.broker.unsubscribe(sub)
+            loop.run_until_complete(asyncio.sleep(0))
+        finally:
+            events.broker._tailers.pop(loop).cancel()
+            loop.close()
+        self.assertEqual((pushed["type"], pushed["transaction_id"], pushed["amount"]), ("credit", txn.id, "30"))
+
+        self.assertEqual(events.replay(bob, 0), [pushed])
+        self.assertEqual(events.replay(self.a1.user_id, 0)[0]["type"], "debit")
+        self.assertEqual(events.replay(bob, pushed["id"]), [])
+
+        token = Token.objects.create(user=self.b1.user)
+        response = self.client.get(reverse("events-poll"), {"after": "0", "timeout": "0"},
+                                   HTTP_AUTHORIZATION=f"Token {token.key}")
+        self.assertEqual(response.json(), {"events": [pushed], "last_id": pushed["id"]})
+
+
+class DataVersionETagTests(TestCase):
+    """List endpoints answer If-None-Match with 304 from the data version until the user's data changes."""
+
+    def setUp(self):
+        OutboxTests.setUp(self)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.b1.user).key}")
+
+    def test_not_modified_until_a_write(self):
+        url = reverse("api_list_transactions")
+        first = self.client.get(url)
+        etag = first["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            again = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((again.status_code, len(queries)), (304, 1))
+        self.assertNotEqual(self.client.get(url, {"limit": "10"})["ETag"], etag)
+
+        version = UserDataVersion.objects.filter(user=self.b1.user).values_list("version", flat=True).first() or 0
+        payments.transfer(self.a1.id, self.b1.id, Decimal("30"))  # bob is credited
+        self.assertGreater(UserDataVersion.objects.get(user=self.b1.user).version, version)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()), len(first.json()) + 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=changed["ETag"]).status_code, 304)
+
+        # another user's writes leave bob's lists alone
+        bills = reverse("bill-history")
+        etag = self.client.get(bills)["ETag"]
+        self.a1.save()
+        self.assertEqual(self.client.get(bills, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class RenderingTests(SimpleTestCase):
+    """FastJSONRenderer is byte-for-byte DRF's JSONRenderer; big responses are compressed when accepted."""
+
+    def test_same_bytes_as_drf(self):
+        data = {
+            "amount": Decimal("12.50"), "at": timezone.now(), "day": datetime.date(2026, 1, 31),
+            "uuid": uuid.uuid4(), "text": "caf\u00e9 \u2028", "rows": [{"n": 1, "none": None}], 7: "int key",
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render(data, "application/json; indent=2"),
+                         JSONRenderer().render(data, "application/json; indent=2"))
+
+    def test_negotiation(self):
+        self.assertEqual(negotiate_encoding("gzip, deflate"), "gzip")
+        self.assertEqual(negotiate_encoding("gzip;q=0, identity"), None)
+        self.assertEqual(negotiate_encoding("*"), negotiate_encoding("br, gzip"))
+        self.assertEqual(negotiate_encoding(""), None)
+
+    def test_large_json_is_compressed(self):
+        body = JSONRenderer().render([{"id": i, "status": "SUCCESS"} for i in range(500)])
+        middleware = CompressionMiddleware(lambda request: HttpResponse(body, content_type="application/json"))
+
+        response = middleware(RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip"))
+        self.assertEqual((response["Content-Encoding"], response["Vary"]), ("gzip", "Accept-Encoding"))
+        self.assertEqual(gzip.decompress(response.content), body)
+        self.assertEqual(middleware(RequestFactory().get("/")).content, body)
+
+        small = CompressionMiddleware(lambda request: HttpResponse(b"{}", content_type="application/json"))
+        self.assertFalse(small(RequestFactory().get("/", HTTP_ACCEPT_ENCODING="gzip")).has_header("Content-Encoding"))
+
+
+class BalanceTests(TestCase):
+    """All balances and their total in one query; single balances by id, UPI id or the old name form."""
+
+    def setUp(self):
+        OutboxTests.setUp(self)
+        self.a2 = BankAccount.objects.create(user=self.a1.user, holder_name="alice", bank_name="HDFC",
+                                             account_number="333333", ifsc="HDFC0000001", upi_id="alice.hdfc@gapy",
+                                             amount=Decimal("25.50"))
+        self.client = APIClient()
+        self.client.force_authenticate(self.a1.user)
+
+    def test_balances(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(reverse("balances")).json()
+        self.assertEqual(len(queries), 1)
+        self.assertEqual((data["total"], data["count"]), ("125.50", 2))
+        self.assertEqual([a["bank_name"] for a in data["accounts"]], ["HDFC", "State Bank"])
+
+        url = reverse("balance")
+        self.assertEqual(self.client.get(url, {"id": self.a2.id}).data["upi_id"], "alice.hdfc@gapy")
+        self.assertEqual(self.client.get(url, {"upi_id": self.a1.upi_id}).data["account_number"], "111111")
+        self.assertEqual(self.client.get(url, {"bank_name": "state bank", "account_number": "111111"}).status_code, 200)
+        self.assertEqual(self.client.get(url, {"bank_name": "HDFC", "account_number": "111111"}).status_code, 404)
+        self.assertEqual(self.client.get(url, {"id": self.b1.id}).status_code, 404)  # not hers
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+
+class MandateTests(TestCase):
+    """Due mandates are claimed, executed once per cycle and backed off when the payer is short."""
+
+    def setUp(self):
+        OutboxTests.setUp(self)
+        self.now = timezone.now()
+
+    def mandate(self, due, **fields):
+        return Mandate.objects.create(user=self.a1.user, payer_account=self.a1, kind="TRANSFER",
+                                      payee_account=self.b1, amount=Decimal("10.00"), next_run_at=due, **fields)
+
+    def test_only_due_active_mandates_run(self):
+        due = self.mandate(self.now - datetime.timedelta(hours=1))
+        self.mandate(self.now + datetime.timedelta(hours=1))
+        self.mandate(self.now - datetime.timedelta(hours=1), status="PAUSED")
+
+        self.assertEqual(mandates.run_due_mandates(self.now), {"success": 1})
+        self.assertEqual(BankAccount.objects.get(id=self.b1.id).amount, Decimal("10.00"))
+        due.refresh_from_db()
+        self.assertEqual(due.next_run_at, mandates.add_months(self.now - datetime.timedelta(hours=1), 1))
+        self.assertEqual(mandates.run_due_mandates(self.now), {})
+
+    def test_insufficient_funds_backs_off_then_skips_the_cycle(self):
+        BankAccount.objects.filter(id=self.a1.id).update(amount=Decimal("5.00"))
+        due = self.now - datetime.timedelta(minutes=1)
+        m = self.mandate(due)
+        with override_settings(MANDATE_MAX_RETRIES=2, MANDATE_RETRY_BACKOFF=60):
+            now = self.now
+            for retry, wait in ((1, 60), (2, 120)):
+                self.assertEqual(mandates.run_due_mandates(now), {"retry": 1})
+                m.refresh_from_db()
+                self.assertEqual((m.retry_count, m.next_run_at), (retry, now + datetime.timedelta(seconds=wait)))
+                now = m.next_run_at
+            self.assertEqual(mandates.run_due_mandates(now), {"skipped": 1})
+        m.refresh_from_db()
+        self.assertEqual(m.retry_count, 0)
+        self.assertGreater(m.next_run_at, now)
+        self.assertEqual(BankAccount.objects.get(id=self.a1.id).amount, Decimal("5.00"))
+        self.assertIn("Insufficient", m.last_error)
+
+    @override_settings(MANDATE_RETRY_BACKOFF=3600)
+    def test_a_retried_cycle_keeps_the_billing_day(self):
+        due = datetime.datetime(2025, 1, 15, 9, tzinfo=datetime.timezone.utc)
+        m = self.mandate(due)
+        BankAccount.objects.filter(id=self.a1.id).update(amount=Decimal("5.00"))
+        self.assertEqual(mandates.run_due_mandates(due), {"retry": 1})
+        m.refresh_from_db()
+        self.assertEqual((m.next_run_at, m.cycle_due_at), (due + datetime.timedelta(hours=1), due))
+
+        BankAccount.objects.filter(id=self.a1.id).update(amount=Decimal("100.00"))
+        self.assertEqual(mandates.run_due_mandates(m.next_run_at), {"success": 1})
+        m.refresh_from_db()
+        same_day = datetime.datetime(2025, 2, 15, 9, tzinfo=datetime.timezone.utc)
+        self.assertEqual((m.next_run_at, m.cycle_due_at), (same_day, None))
+
+    def test_schedule_next_clamps_month_ends_and_skips_missed_cycles(self):
+        m = Mandate(next_run_at=datetime.datetime(2025, 1, 31, 9, tzinfo=datetime.timezone.utc), frequency="MONTHLY",
+                    retry_count=2)
+        mandates.schedule_next(m, m.next_run_at)
+        self.assertEqual((m.next_run_at.date(), m.retry_count), (datetime.date(2025, 2, 28), 0))
+
+        m.frequency = "WEEKLY"
+        mandates.schedule_next(m, m.next_run_at + datetime.timedelta(days=20))  # scheduler was down: no backlog
+        self.assertEqual(m.next_run_at.date(), datetime.date(2025, 3, 21))
+
+    def test_changing_amount_or_payee_needs_the_pin(self):
+        self.a1.set_pin("1234")
+        mallory = BankAccount.objects.create(user=User.objects.create_user("mallory"), holder_name="mallory",
+                                             bank_name="State Bank", account_number="666666", ifsc="SBIN0000001",
+                                             upi_id="mallory.666666@gapy")
+        m = self.mandate(self.now + datetime.timedelta(days=1))
+        client = APIClient()
+        client.force_authenticate(self.a1.user)
+        url = reverse("mandate-detail", args=[m.id])
+        self.assertEqual(client.patch(url, {"amount": "5000"}, format="json").status_code, 403)
+        self.assertEqual(client.patch(url, {"payee_account": mallory.id}, format="json").status_code, 403)
+        self.assertEqual(client.patch(url, {"amount": "20", "pin": "9999"}, format="json").status_code, 403)
+        m.refresh_from_db()
+        self.assertEqual((m.amount, m.payee_account_id), (Decimal("10.00"), self.b1.id))
+
+        self.assertEqual(client.patch(url, {"frequency": "WEEKLY"}, format="json").status_code, 200)
+        self.assertEqual(client.patch(url, {"amount": "20", "pin": "1234"}, format="json").status_code, 200)
+        m.refresh_from_db()
+        self.assertEqual((m.amount, m.frequency), (Decimal("20.00"), "WEEKLY"))
+
+    def test_a_cycle_is_paid_once(self):
+        m = self.mandate(self.now - datetime.timedelta(minutes=1))
+        stale = Mandate.objects.get(id=m.id)  # what a second worker read from the same batch
+        self.assertEqual(mandates.run_mandate(m, self.now), "success")
+        self.assertEqual(mandates.run_mandate(stale, self.now), "taken")
+
+        # a worker dying after the debit, before the outcome is saved, has already moved the mandate on
+        Mandate.objects.filter(id=m.id).update(next_run_at=self.now)
+        with mock.patch.object(Mandate, "save", side_effect=RuntimeError("worker died")):
+            with self.assertRaises(RuntimeError):
+                mandates.run_due_mandates(self.now)
+        self.assertEqual(mandates.run_due_mandates(self.now), {})
+        self.assertEqual(Transaction.objects.filter(sender_account=self.a1).count(), 2)
+        self.assertEqual(BankAccount.objects.get(id=self.a1.id).amount, Decimal("80.00"))
+
+
+class BillReminderTests(TestCase):
+    """Due reminders go out once, in one email per user, however they fall into batches."""
+
+    def setUp(self):
+        self.today = datetime.date(2025, 3, 10)
+        self.biller = Biller.objects.create(code="tneb", name="TNEB", category="electricity")
+        self.users = [User.objects.create_user(name, f"{name}@x.com" if name != "nomail" else "")
+                      for name in ("alice", "bob", "nomail")]
+
+    def bill(self, user, days, status="PENDING"):
+        return BillPayment.objects.create(user=user, biller=self.biller, consumer_number="C1", amount=Decimal("10"),
+                                          status=status, reminder_date=self.today + datetime.timedelta(days=days))
+
+    def send(self, days=0, **options):
+        return reminders.send_due_reminders(today=self.today + datetime.timedelta(days=days), **options)
+
+    def test_due_reminders_are_sent_once(self):
+        alice, bob, nomail = self.users
+        self.bill(alice, -2), self.bill(alice, -1), self.bill(bob, 0), self.bill(nomail, 0)
+        self.bill(bob, -1, status="FAILED")
+        self.bill(bob, 1)  # not due yet
+
+        self.assertEqual(self.send(batch_size=2), {"batches": 2, "reminders": 4, "users": 3, "emails": 2})
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ["alice@x.com", "bob@x.com"])
+        self.assertIn("2 bill(s) due", next(m.subject for m in mail.outbox if m.to == ["alice@x.com"]))
+
+        self.assertEqual(self.send()["reminders"], 0)
+        tomorrow = self.send(days=1)
+        self.assertEqual((tomorrow["reminders"], mail.outbox[-1].to), (1, ["bob@x.com"]))
+        self.assertEqual(self.send(reset=True)["reminders"], 4)
+
+    def test_one_email_per_user_across_batches(self):
+        alice, bob, _ = self.users
+        for days in range(-5, 0):
+            self.bill(alice, days)
+        self.bill(bob, 0)
+        self.assertEqual(self.send(batch_size=1), {"batches": 2, "reminders": 6, "users": 2, "emails": 2})
+        self.assertIn("5 bill(s) due", mail.outbox[0].subject)
+
+    def test_reminders_written_after_a_run_are_not_skipped(self):
+        alice, bob, _ = self.users
+        self.bill(alice, 0), self.bill(bob, 0)
+        self.send()
+        self.bill(alice, -3)  # back-dated: before everything the last run sent
+        self.assertEqual((self.send()["reminders"], mail.outbox[-1].to), (1, ["alice@x.com"]))
+
+
+class UpiAllocatorTests(TestCase):
+    """UPI ids come from a per-prefix counter: unique, short, and past ids that are already taken."""
+
+    def setUp(self):
+        self.alice = User.objects.create_user("alice")
+
+    def test_ids_are_unique_per_prefix(self):
+        ids = upi.allocate_upi_ids("Alice!", "State Bank", 3) + [upi.allocate_upi_id("alice", "State Bank")]
+        ids += upi.allocate_upi_ids_bulk([("alice", "State Bank"), ("bob", "HDFC"), ("alice", "State Bank")])
+        self.assertEqual(len(set(ids)), 7)
+        self.assertEqual(sum(i.startswith("alice.stat") for i in ids), 6)
+        self.assertEqual(UpiSequence.objects.get(prefix="alice.stat").last_value, 6)
+
+        block = {upi.format_upi_id("p", value) for value in range(upi.BLOCK)}
+        self.assertEqual(len(block), upi.BLOCK)  # a bijection: 4-digit ids for the first 10k of a prefix
+        self.assertEqual({len(i) for i in block}, {len("p0000@gapy")})
+        self.assertNotIn(upi.format_upi_id("p", upi.BLOCK), block)
+
+    def test_taken_id_moves_to_the_next_value(self):
+        fields = dict(holder_name="alice", bank_name="State Bank", ifsc="SBIN0000001")
+        BankAccount.objects.create(user=self.alice, account_number="000001",
+                                   upi_id=upi.format_upi_id("alice.stat", 0), **fields)  # an old random id
+        account = upi.create_bank_account(self.alice, account_number="000002", **fields)
+        self.assertEqual(account.upi_id, upi.format_upi_id("alice.stat", 1))
+
+        with self.assertRaises(IntegrityError):  # not a UPI clash: no retry
+            upi.create_bank_account(self.alice, account_number="000002", **fields)
+        self.assertEqual(UpiSequence.objects.get(prefix="alice.stat").last_value, 3)
+
+
+@override_settings(**FAST_SETTINGS)
+class OnboardingImportTests(TestCase):
+    """Bulk imports validate every row, catch duplicates across chunks and survive UPI id clashes."""
+
+    HEADER = "username,holder_name,bank_name,account_number,ifsc,pin\n"
+
+    def setUp(self):
+        self.alice = User.objects.create_user("alice")
+        self.bob = User.objects.create_user("bob")
+        BankAccount.objects.create(user=self.bob, holder_name="bob", bank_name="HDFC", account_number="900000",
+                                   ifsc="HDFC0000001", upi_id="bob.old@gapy")
+
+    def run_import(self, text, fmt="csv"):
+        return onboarding.import_accounts(io.BytesIO(text.encode()), fmt, chunk_size=2, workers=1)
+
+    def test_rows_are_validated_and_reported(self):
+        report = self.run_import(self.HEADER + (
+            "alice,Alice,State Bank,100001,SBIN0000001,1234\n"
+            "carol,Carol,State Bank,100002,SBIN0000001,1234\n"   # no such user
+            "alice,Alice,State Bank,100003,SBIN001,1234\n"       # short IFSC
+            "alice,Alice,State Bank,100004,SBIN0000001,12ab\n"
+            "bob,Bob,HDFC,900000,HDFC0000001,1234\n"             # already linked
+            "alice,Alice,State Bank,100001,SBIN0000001,1234\n"   # repeated from an earlier chunk
+            "bob,Bob,HDFC,900001,HDFC0000001,4321\n"
+        ))
+        self.assertEqual((report["total"], report["created"], report["failed"]), (7, 2, 5))
+        self.assertEqual([e["row"] for e in report["errors"]], [2, 3, 4, 5, 6])
+        self.assertIn("Unknown user", report["errors"][0]["errors"][0])
+        self.assertIn("IFSC", report["errors"][1]["errors"][0])
+
+        account = BankAccount.objects.get(account_number="900001")
+        self.assertEqual(account.upi_id, upi.format_upi_id("bob.hdfc", 0))
+        self.assertTrue(account.pin_enabled and check_password("4321", account.pin_hash))
+
+        report = self.run_import('{"username": "alice"\nnot json\n[1]\n', fmt="jsonl")
+        self.assertEqual([e["row"] for e in report["errors"]], [1, 2, 3])
+
+    def test_upi_clash_falls_back_to_row_by_row(self):
+        BankAccount.objects.create(user=self.bob, holder_name="bob", bank_name="HDFC", account_number="900009",
+                                   ifsc="HDFC0000001", upi_id=upi.format_upi_id("alice.stat", 1))
+        report = self.run_import(self.HEADER + (
+            "alice,Alice,State Bank,100001,SBIN0000001,1234\n"
+            "alice,Alice,State Bank,100002,SBIN0000001,1234\n"
+        ))
+        self.assertEqual((report["created"], report["failed"]), (2, 0))
+        self.assertEqual(
+            sorted(BankAccount.objects.filter(user=self.alice).values_list("upi_id", flat=True)),
+            sorted([upi.format_upi_id("alice.stat", 0), upi.format_upi_id("alice.stat", 2)]),
+        )
+
+
+class ReconcileTests(TestCase):
+    """Balances must equal opening + credits - debits; drift is reported until fixed or accepted."""
+
+    def setUp(self):
+        OutboxTests.setUp(self)  # alice 100.00 (funded outside the log), bob 0.00
+
+    def drift(self):
+        return dict(BalanceCheck.objects.values_list("account_id", "drift"))
+
+    @mock.patch.object(reconcile, "WATERMARK_OVERLAP", 0)
+    def test_drift_accept_and_incremental(self):
+        stats = reconcile.reconcile(chunk_size=1)
+        self.assertEqual((stats["checked"], stats["drifted"]), (2, 1))
+        self.assertEqual(stats["top"], [(self.a1.id, Decimal("100"))])
+
+        reconcile.reconcile(accept=True)
+        self.assertEqual(self.drift(), {self.a1.id: Decimal("0")})
+
+        payments.transfer(self.a1.id, self.b1.id, Decimal("30.5"))
+        stats = reconcile.reconcile(incremental=True)
+        self.assertEqual((stats["incremental"], stats["checked"], stats["drifted"]), (True, 2, 0))
+
+        # a balance edited behind the log's back: only a full run looks at untouched accounts
+        BankAccount.objects.filter(id=self.b1.id).update(amount=Decimal("40.50"))
+        self.assertEqual(reconcile.reconcile(incremental=True)["checked"], 0)
+        self.assertEqual(reconcile.reconcile()["top"], [(self.b1.id, Decimal("10"))])
+        self.assertEqual(reconcile.reconcile(incremental=True)["checked"], 1)  # drifting accounts stay on the list
+
+        BankAccount.objects.filter(id=self.b1.id).update(amount=Decimal("30.50"))
+        reconcile.reconcile(incremental=True)
+        self.assertEqual(self.drift(), {self.a1.id: Decimal("0")})
+
+    def test_rows_of_unknown_accounts_are_ignored(self):
+        # archive tables keep rows of deleted accounts; ids past the chunk's last or between its accounts
+        ids, amounts = [self.a1.id, self.b1.id], [100_000, 0]
+        net_ids, net_values = [self.a1.id - 1, self.a1.id, self.b1.id + 1, self.b1.id + 50], [7, 1_000, 9, 5]
+        for numpy in (reconcile.np, None):
+            with self.subTest(numpy=numpy is not None), mock.patch.object(reconcile, "np", numpy):
+                self.assertEqual(reconcile.find_drift(ids, amounts, net_ids, net_values, {self.b1.id + 2: 3}),
+                                 [(self.a1.id, 99_000)])
+
+
+class StatementTests(TestCase):
+    """One gzipped CSV per user per month plus an index; a rerun only redoes unfinished ranges."""
+
+    def setUp(self):
+        OutboxTests.setUp(self)  # alice 100.00, bob 0.00
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.enterContext(override_settings(STATEMENTS_DIR=self.dir.name))
+
+    def read(self, user):
+        path = statements.statements_dir(2026, 3) / "users" / "0" / f"{user.id}.csv.gz"
+        return [line.split(",") for line in gzip.decompress(path.read_bytes()).decode().splitlines()]
+
+    def test_statements_index_and_resume(self):
+        payments.transfer(self.a1.id, self.b1.id, Decimal("30"))
+        payments.transfer(self.a1.id, self.b1.id, Decimal("500"))  # FAILED, listed but not totalled
+        payments.transfer(self.a1.id, self.b1.id, Decimal("5"))
+        ids = list(Transaction.objects.order_by("id").values_list("id", flat=True))
+        march = timezone.make_aware(datetime.datetime(2026, 3, 10))
+        for i, txn_id in enumerate(ids[:2]):
+            Transaction.objects.filter(id=txn_id).update(timestamp=march + datetime.timedelta(hours=i))
+        Transaction.objects.filter(id=ids[2]).update(timestamp=march + datetime.timedelta(days=30))  # April
+
+        stats = statements.generate_statements(2026, 3, workers=1, partition_size=1)
+        self.assertEqual((stats["users"], stats["transactions"], stats["skipped"]), (2, 4, 0))
+
+        alice = self.read(self.a1.user)
+        self.assertEqual(alice[0], statements.COLUMNS)
+        self.assertEqual([(r[1], r[2], r[3], r[4], r[5], r[6]) for r in alice[1:]], [
+            (str(ids[0]), "DEBIT", "111111", "bob", "30.000", "SUCCESS"),
+            (str(ids[1]), "DEBIT", "111111", "bob", "500.000", "FAILED"),
+        ])
+        self.assertEqual([(r[2], r[4]) for r in self.read(self.b1.user)[1:]], [("CREDIT", "alice")] * 2)
+
+        index = [json.loads(line) for line in open(stats["index"])]
+        self.assertEqual(
+            sorted((e["user_id"], e["transactions"], e["debited"], e["credited"]) for e in index),
+            [(self.a1.user_id, 2, "30.000", "0"), (self.b1.user_id, 2, "0", "30.000")],
+        )
+
+        # a crash after bob's range: only that range is redone, with identical output
+        before = (statements.statements_dir(2026, 3) / index[1]["file"]).read_bytes()
+        (statements.statements_dir(2026, 3) / "parts" / f"{self.b1.user_id}.jsonl").unlink()
+        stats = statements.generate_statements(2026, 3, workers=1, partition_size=1)
+        self.assertEqual((stats["users"], stats["skipped"]), (1, stats["partitions"] - 1))
+        self.assertEqual((statements.statements_dir(2026, 3) / index[1]["file"]).read_bytes(), before)
+        self.assertEqual(len(open(stats["index"]).readlines()), 2)
+
+
+class ReceiptTests(TestCase):
+    """Receipts render once per transaction, status and side, then come from disk with long-lived cache headers."""
+
+    def setUp(self):
+        OutboxTests.setUp(self)  # alice 100.00, bob 0.00
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.enterContext(override_settings(RECEIPTS_DIR=self.dir.name))
+        self.txn = payments.transfer(self.a1.id, self.b1.id, Decimal("30"))
+
+    def get(self, user, fmt="png", **headers):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(reverse(f"transaction-receipt-{fmt}", args=(self.txn.id,)), **headers)
+
+    def test_render_cache_and_revalidate(self):
+        response = self.get(self.a1.user)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"\x89PNG"))
+
+        with mock.patch.object(receipts, "render", wraps=receipts.render) as render:
+            again = self.get(self.a1.user)  # from disk
+            self.assertEqual((again.status_code, again["ETag"]), (200, response["ETag"]))
+            render.assert_not_called()
+            self.assertEqual(self.get(self.a1.user, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+            received = self.get(self.b1.user)  # the receiver's receipt says "Received": its own file and ETag
+            self.assertEqual(received.status_code, 200)
+            self.assertEqual(render.call_args.args[0]["direction"], "Received")
+            self.assertNotEqual(received["ETag"], response["ETag"])
+            self.assertEqual(self.get(self.b1.user, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+        pdf = self.get(self.a1.user, "pdf")
+        self.assertTrue(b"".join(pdf.streaming_content).startswith(b"%PDF"))
+        self.assertNotEqual(pdf["ETag"], response["ETag"])
+
+    def test_strangers_and_saturation(self):
+        carol = User.objects.create_user("carol", "carol@x.com", "secret")
+        self.assertEqual(self.get(carol).status_code, 404)
+        with override_settings(RECEIPT_RENDER_QUEUE=0):
+            response = self.get(self.a1.user)
+        self.assertEqual((response.status_code, response["Retry-After"]), (503, "1"))
+
+
+@override_settings(QR_SHEET_WORKERS=1)
+class QRSheetTests(TestCase):
+    """Staff get a ZIP of A4 sheets with a manifest; sheets come back in order from the pool too."""
+
+    def setUp(self):
+        OutboxTests.setUp(self)
+        self.staff = User.objects.create_user("ops", "ops@x.com", "secret", is_staff=True)
+
+    def post(self, user, payload):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(reverse("qr-sheets"), payload, format="json")
+
+    def test_zip_of_sheets(self):
+        response = self.post(self.staff, {"account_ids": [self.b1.id, self.a1.id], "amount": "250"})
+        self.assertEqual(response["Content-Type"], "application/zip")
+        bundle = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(bundle.namelist(), ["sheet-0001.pdf", "manifest.csv"])
+        self.assertTrue(bundle.read("sheet-0001.pdf").startswith(b"%PDF"))
+        manifest = bundle.read("manifest.csv").decode().splitlines()
+        self.assertEqual(manifest[1].split(",")[:3], ["sheet-0001.pdf", "1", str(self.b1.id)])
+        self.assertTrue(manifest[2].endswith(f"bank_id={self.a1.id}&name=alice&amount=250.00"))
+
+        self.assertEqual(self.post(self.a1.user, {"account_ids": [self.a1.id]}).status_code, 403)
+        self.assertEqual(self.post(self.staff, {"account_ids": [self.a1.id, 10**9]}).data["missing"], [10**9])
+        self.assertEqual(self.post(self.staff, {"account_ids": [self.a1.id], "amount": "-1"}).status_code, 400)
+
+    def test_holder_name_cannot_set_the_amount(self):
+        payload = qrsheets.qr_payload(7, "x&amount=1 #", "250.00")
+        self.assertEqual(payload, "gapy://bank?bank_id=7&name=x%26amount%3D1+%23&amount=250.00")
+        self.assertEqual(parse_qs(urlsplit(payload).query), {"bank_id": ["7"], "name": ["x&amount=1 #"],
+                                                             "amount": ["250.00"]})
+
+    def test_pool_keeps_sheet_order(self):
+        cards = [{"account_id": i, "payload": qrsheets.qr_payload(i, f"h{i}"), "title": f"h{i}", "subtitle": ""}
+                 for i in range(30)]
+        sheets = list(qrsheets.iter_sheets(cards, workers=2))
+        self.assertEqual([(n, [c["account_id"] for c in batch][:1]) for n, batch, _ in sheets],
+                         [(1, [0]), (2, [12]), (3, [24])])
+        self.assertEqual(sheets[2][2], qrsheets.render_sheet(cards[24:]))
+
+
+class PlanSearchTests(TestCase):
+    """Plan search answers from the per-operator index and follows catalog changes."""
+
+    def setUp(self):
+        self.jio = Operator.objects.create(code="jio", name="Jio")
+        self.plans = {
+            (amount, validity): Plan.objects.create(operator=self.jio, category=category, amount=Decimal(amount),
+                                                    title=f"Rs {amount}", validity=validity)
+            for amount, category, validity in [
+                ("155", "unlimited", "28 days"), ("239", "unlimited", "28 days"), ("299", "unlimited", "1 month"),
+                ("349", "data", "28 days"), ("666", "unlimited", "84 days"), ("10", "topup", ""),
+            ]
+        }
+        self.client = APIClient()
+
+    def search(self, **params):
+        response = self.client.get(reverse("plans-search"), {"operator": "jio", **params})
+        self.assertEqual(response.status_code, 200, response.data)
+        return [p["amount"] for p in response.data["plans"]]
+
+    def test_ranges_filters_and_orderings(self):
+        self.assertEqual(self.search(min_amount="200", max_amount="350"), ["239.00", "299.00", "349.00"])
+        self.assertEqual(self.search(near="299", limit="3"), ["299.00", "349.00", "239.00"])
+        self.assertEqual(self.search(near="299", category="unlimited", limit="2"), ["299.00", "239.00"])
+        self.assertEqual(self.search(min_validity="30", sort="validity"), ["666.00", "299.00"])
+        self.assertEqual(self.search(max_validity="28"), ["155.00", "239.00", "349.00"])
+        self.assertEqual(plan_index.validity_days("84 Days"), 84)
+
+        user = User.objects.create_user("dan")
+        MobileRecharge.objects.bulk_create([
+            MobileRecharge(user=user, mobile="9", operator=self.jio, plan=self.plans["349", "28 days"],
+                           amount=Decimal("349"), status="SUCCESS"),
+        ] * 2 + [MobileRecharge(user=user, mobile="9", operator=self.jio, plan=self.plans["155", "28 days"],
+                                amount=Decimal("155"), status="SUCCESS")])
+        self.plans["10", ""].delete()  # stamps the catalog: the rebuild also recounts popularity
+        self.assertEqual(self.search(sort="popular", limit="2"), ["349.00", "155.00"])
+        self.assertEqual(self.search(max_amount="100"), [])
+
+    def test_index_served_without_queries_and_bad_input(self):
+        self.search()
+        with CaptureQueriesContext(connection) as queries:
+            self.search(near="300")
+        self.assertEqual(len(queries), 1)  # the operator row and its catalog stamp
+        self.assertEqual(self.client.get(reverse("plans-search"), {"operator": "jio", "near": "abc"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("plans-search"), {"operator": "jio", "sort": "x"}).status_code, 400)
+        self.assertEqual(self.client.get(reverse("plans-search"), {"operator": "nope"}).data, {"plans": []})
+
+    def test_circle_and_type_catalogs(self):
+        Plan.objects.create(operator=self.jio, circle="mumbai", category="unlimited", amount=Decimal("199"))
+        Plan.objects.create(operator=self.jio, circle="delhi", category="data", amount=Decimal("49"))
+        Plan.objects.create(operator=self.jio, recharge_type="postpaid", category="family", amount=Decimal("999"))
+
+        def catalog(**params):
+            response = self.client.get(reverse("plans"), {"operator": "jio", **params})
+            self.assertEqual(response.status_code, 200, response.data)
+            return {category: [p["amount"] for p in plans] for category, plans in response.data["plans"].items()}
+
+        everywhere = {"unlimited": ["155.00", "239.00", "299.00", "666.00"], "data": ["349.00"], "topup": ["10.00"]}
+        self.assertEqual(catalog(), everywhere)
+        self.assertEqual(catalog(circle="kerala"), everywhere)  # no plans of its own
+        self.assertEqual(catalog(circle="mumbai")["unlimited"], ["155.00", "239.00", "299.00", "666.00", "199.00"])
+        self.assertEqual(catalog(circle="delhi")["data"], ["349.00", "49.00"])
+        self.assertEqual(catalog(type="postpaid"), {"family": ["999.00"]})
+        self.assertEqual(self.client.get(reverse("plans"), {"operator": "jio", "type": "x"}).status_code, 400)
+
+        self.assertEqual(self.search(circle="mumbai", near="200", limit="2"), ["199.00", "239.00"])
+        self.assertEqual(self.search(near="200", limit="1"), ["239.00"])
+        self.assertEqual(self.search(type="postpaid"), ["999.00"])
+        with CaptureQueriesContext(connection) as queries:
+            catalog(circle="mumbai")
+        self.assertEqual(len(queries), 1)
+
+
+@override_settings(**FAST_SETTINGS)
+class BillFetchTests(TestCase):
+    """Fetched bills are cached per (biller, consumer), fetched once under concurrency and reused by pay."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        OutboxTests.setUp(self)
+        BankAccount.objects.filter(id=self.a1.id).update(amount=Decimal("1000.00"))  # mock bills run up to 149
+        self.a1.set_pin("1234")
+        self.tneb = Biller.objects.create(code="tneb", name="TNEB", category="electricity")
+        self.client = APIClient()
+        self.client.force_authenticate(self.a1.user)
+
+    def fetch(self, consumer="CN-0042"):
+        response = self.client.post(reverse("bill-fetch"), {"biller_code": "tneb", "consumer_number": consumer})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def test_fetch_is_cached_and_reused_by_pay(self):
+        with mock.patch.object(bills, "upstream_fetch", wraps=bills.upstream_fetch) as upstream:
+            first, second = self.fetch(), self.fetch()
+            self.fetch("CN-0043")
+            self.assertEqual(upstream.call_count, 2)
+        self.assertEqual((first["cached"], second["cached"]), (False, True))
+        self.assertEqual(second["bill"]["amount"], first["bill"]["amount"])
+
+        with mock.patch.object(bills, "upstream_fetch") as upstream:
+            response = self.client.post(reverse("bill-pay"), {
+                "bank_id": self.a1.id, "biller_code": "tneb", "consumer_number": "CN-0042", "pin": "1234",
+            })
+            upstream.assert_not_called()
+        self.assertEqual(response.status_code, 200, response.data)
+        payment = BillPayment.objects.get()
+        self.assertEqual(payment.amount, Decimal(first["bill"]["amount"]))
+        self.assertEqual(payment.due_date.isoformat(), first["bill"]["due_date"])
+        self.assertEqual(payment.period, first["bill"]["period"])
+        self.assertIsNone(bills.cached_bill(self.tneb, "CN-0042"))  # paid: forgotten
+        self.assertFalse(self.fetch()["cached"])
+
+    @override_settings(MOCK_PROVIDER_LATENCY={"bill_fetch": 0.2})
+    def test_concurrent_fetches_share_one_upstream_call(self):
+        results = []
+        with mock.patch.object(bills, "upstream_fetch", wraps=bills.upstream_fetch) as upstream:
+            threads = [threading.Thread(target=lambda: results.append(bills.fetch_bill(self.tneb, "CN-7")))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(upstream.call_count, 1)
+        self.assertEqual(sorted(cached for _, cached in results), [False, True, True, True])
+        self.assertEqual(len({bill["fetched_at"] for bill, _ in results}), 1)
+
+    @override_settings(BILL_FETCH_TIMEOUT=0.05)
+    def test_waiters_on_a_slow_fetch_time_out_as_a_provider_error(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow(biller, consumer_number):
+            release.wait(5)
+            return {"amount": "10.00", "due_date": None, "period": "", "fetched_at": ""}
+
+        with mock.patch.object(bills, "upstream_fetch", side_effect=slow):
+            leader = threading.Thread(target=bills.fetch_bill, args=(self.tneb, "CN-8"))
+            leader.start()
+            while not bills._inflight:
+                time.sleep(0.01)
+            with self.assertRaises(providers.ProviderTimeout):
+                bills.fetch_bill(self.tneb, "CN-8")
+            release.set()
+            leader.join()
+        self.assertTrue(self.fetch("CN-8")["cached"])
+
+    def test_waiters_on_a_leader_that_times_out_get_a_provider_error(self):
+        waiting, release = threading.Event(), threading.Event()
+        self.addCleanup(release.set)
+
+        def timing_out(biller, consumer_number):
+            release.wait(5)
+            raise TimeoutError("read timed out")
+
+        errors = []
+
+        def waiter():
+            waiting.set()
+            try:
+                bills.fetch_bill(self.tneb, "CN-6")
+            except Exception as exc:
+                errors.append(exc)
+
+        with mock.patch.object(bills, "upstream_fetch", side_effect=timing_out):
+            leader = threading.Thread(
+                target=lambda: self.assertRaises(TimeoutError, bills.fetch_bill, self.tneb, "CN-6"))
+            leader.start()
+            while not bills._inflight:
+                time.sleep(0.01)
+            follower = threading.Thread(target=waiter)
+            follower.start()
+            waiting.wait(5)
+            time.sleep(0.05)  # blocked on the leader's future
+            release.set()
+            leader.join()
+            follower.join()
+        self.assertEqual([type(e) for e in errors], [providers.ProviderTimeout])
+
+    def test_failed_fetch_is_not_cached(self):
+        with mock.patch.object(bills, "upstream_fetch", side_effect=TimeoutError):
+            with self.assertRaises(TimeoutError):
+                bills.fetch_bill(self.tneb, "CN-9")
+        self.assertFalse(bills.fetch_bill(self.tneb, "CN-9")[1])
+
+
+@override_settings(**FAST_SETTINGS)
+class MultiBillPayTests(TestCase):
+    """Several bills: one PIN check and debit, concurrent biller calls, bulk writes, per-item refunds."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        OutboxTests.setUp(self)
+        BankAccount.objects.filter(id=self.a1.id).update(amount=Decimal("1000.00"))
+        self.a1.set_pin("1234")
+        for code in ("tneb", "water", "fiber"):
+            Biller.objects.create(code=code, name=code.upper(), category="utility")
+        self.client = APIClient()
+        self.client.force_authenticate(self.a1.user)
+
+    def pay(self, items, pin="1234"):
+        return self.client.post(reverse("bill-pay-multiple"), {"bank_id": self.a1.id, "pin": pin, "items": items},
+                                format="json")
+
+    def test_pays_all_bills_with_one_debit(self):
+        bill, _ = bills.fetch_bill(Biller.objects.get(code="fiber"), "F-1")
+        response = self.pay([
+            {"biller_code": "tneb", "consumer_number": "E-1", "amount": "120.50"},
+            {"biller_code": "water", "consumer_number": "W-1", "amount": "80"},
+            {"biller_code": "fiber", "consumer_number": "F-1"},  # the fetched bill's amount
+        ])
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data["status"], "SUCCESS")
+        total = Decimal("200.50") + Decimal(bill["amount"])
+        self.assertEqual(Decimal(response.data["total_paid"]), total)
+        self.assertEqual(BankAccount.objects.get(id=self.a1.id).amount, Decimal("1000.00") - total)
+        self.assertEqual([bp["status"] for bp in response.data["billpayments"]], ["SUCCESS"] * 3)
+        self.assertEqual(response.data["billpayments"][2]["period"], bill["period"])
+
+        txns = Transaction.objects.filter(category="BILL").order_by("id")
+        self.assertEqual([t.receiver_name for t in txns], ["TNEB - E-1", "WATER - W-1", "FIBER - F-1"])
+        self.assertEqual({t.sender_user_id for t in txns}, {self.a1.user_id})
+        self.assertEqual(OutboxEvent.objects.filter(topic="bill_payment").count(), 3)
+        self.assertIsNone(bills.cached_bill(Biller.objects.get(code="fiber"), "F-1"))
+
+    def test_failed_biller_call_is_refunded(self):
+        outcomes = iter(["MOCK-BILL-1", providers.ProviderRejected("unknown consumer"),
+                         providers.ProviderTimeout("no answer")])
+
+        def provider(kind, name, reference):
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with mock.patch.object(payments, "call_provider", side_effect=provider), \
+                override_settings(BILL_PAY_CONCURRENCY=1):  # one thread: the outcomes go to the items in order
+            response = self.pay([
+                {"biller_code": "tneb", "consumer_number": "E-1", "amount": "100"},
+                {"biller_code": "water", "consumer_number": "W-1", "amount": "30"},
+                {"biller_code": "fiber", "consumer_number": "F-1", "amount": "50"},
+            ])
+        self.assertEqual(response.data["status"], "PARTIAL")
+        self.assertEqual((response.data["total_paid"], response.data["pending"], response.data["refunded"]),
+                         ("100.00", "50.00", "30.00"))
+        self.assertEqual(BankAccount.objects.get(id=self.a1.id).amount, Decimal("850.00"))  # the unanswered 50 stays debited
+        self.assertEqual(dict(BillPayment.objects.values_list("consumer_number", "status")),
+                         {"E-1": "SUCCESS", "W-1": "FAILED", "F-1": "PENDING"})
+        self.assertEqual(Transaction.objects.filter(category="BILL").count(), 1)
+
+    def test_unexpected_errors_fail_and_refund_the_item(self):
+        outcomes = iter(["MOCK-BILL-1", KeyError("provider_txn")])
+
+        def provider(kind, name, reference):
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with mock.patch.object(payments, "call_provider", side_effect=provider), \
+                override_settings(BILL_PAY_CONCURRENCY=1):
+            response = self.pay([
+                {"biller_code": "tneb", "consumer_number": "E-1", "amount": "100"},
+                {"biller_code": "water", "consumer_number": "W-1", "amount": "30"},
+            ])
+        self.assertEqual((response.data["status"], response.data["refunded"]), ("PARTIAL", "30.00"))
+        self.assertEqual(BillPayment.objects.get(consumer_number="W-1").status, "FAILED")
+        self.assertEqual(BankAccount.objects.get(id=self.a1.id).amount, Decimal("900.00"))
+
+        with mock.patch.object(payments, "call_provider", side_effect=KeyError("provider_txn")), \
+                self.assertRaises(providers.ProviderError):
+            payments.pay_bill(self.a1.user, self.a1.id, Biller.objects.get(code="tneb"), "E-2", Decimal("10"))
+        self.assertEqual(BillPayment.objects.get(consumer_number="E-2").status, "FAILED")
+        self.assertEqual(BankAccount.objects.get(id=self.a1.id).amount, Decimal("900.00"))
+
+    def test_rejected_requests_change_nothing(self):
+        item = {"biller_code": "tneb", "consumer_number": "E-1", "amount": "10"}
+        self.assertEqual(self.pay([item], pin="0000").status_code, 403)
+        self.assertEqual(self.pay([item, item]).status_code, 400)
+        self.assertEqual(self.pay([{**item, "biller_code": "gas"}]).status_code, 400)
+        self.assertEqual(self.pay([{**item, "amount": "-5"}]).status_code, 400)
+        self.assertEqual(self.pay([item] * 11).status_code, 400)
+        self.assertEqual(self.pay([{**item, "amount": "2000"}]).data["message"], "Insufficient balance")
+
+        self.addCleanup(providers.reset)
+        providers.get("bill", "water").opened_at = time.monotonic()  # the water board's circuit is open
+        with mock.patch.object(payments, "call_provider") as call:
+            response = self.pay([item, {**item, "biller_code": "water", "consumer_number": "W-1"}])
+            call.assert_not_called()
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(BillPayment.objects.exists())
+        self.assertEqual(BankAccount.objects.get(id=self.a1.id).amount, Decimal("1000.00"))
+
+
+@override_settings(**FAST_SETTINGS, PROVIDER_TIMEOUTS={"recharge": 0.5, "bill": 0.5, "bill_fetch": 0.5},
+                   PROVIDER_BREAKER_FAILURES=3, PROVIDER_BREAKER_RESET=0.3, PROVIDER_HEDGE_AFTER=0.05)
+class ProviderTests(TestCase):
+    """Provider calls against the mock provider server: timeouts, circuit breaker, hedging, refunds."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = MockProviderServer().start()
+        cls.addClassCleanup(cls.server.stop)
+
+    def setUp(self):
+        self.server.faults.clear()
+        self.server.calls.clear()
+        providers.reset()
+        self.addCleanup(providers.reset)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.enterContext(override_settings(PROVIDER_BASE_URL=self.server.url))
+        OutboxTests.setUp(self)
+
+    def test_timeout_then_breaker_opens_and_recovers(self):
+        provider = providers.get("recharge", "slowtel")
+        self.server.faults["recharge:slowtel"] = {"latency": 2}
+        started = time.monotonic()
+        with self.assertRaises(providers.ProviderTimeout):
+            provider.call("pay", {"reference": "r1"})
+        self.assertLess(time.monotonic() - started, 1.5)
+
+        self.server.faults["recharge:slowtel"] = {"error_rate": 1}
+        for _ in range(2):
+            with self.assertRaises(providers.ProviderError):
+                provider.call("pay", {"reference": "r1"})
+        self.assertEqual(provider.state(), "open")
+        sent = self.server.calls["recharge:slowtel"]
+        with self.assertRaises(providers.ProviderUnavailable):
+            provider.call("pay", {"reference": "r1"})
+        self.assertEqual(self.server.calls["recharge:slowtel"], sent)  # failed fast, not sent
+
+        time.sleep(0.35)
+        self.server.faults["recharge:slowtel"] = {}
+        self.assertTrue(provider.call("pay", {"reference": "r1"})["provider_txn"])  # the half-open trial
+        self.assertEqual(provider.state(), "closed")
+
+    def test_fetches_are_hedged_payments_are_not(self):
+        fetcher = providers.get("bill_fetch", "tneb")
+        self.server.faults["bill_fetch:tneb"] = {"latency": [1.0, 0.0]}  # the first call is slow
+        started = time.monotonic()
+        bill = fetcher.call("fetch", {"consumer_number": "C-1"}, idempotent=True)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertTrue(bill["amount"])
+        self.assertEqual(self.server.calls["bill_fetch:tneb"], 2)
+
+        self.server.calls.clear()
+        self.server.faults["bill_fetch:tneb"] = {"error_rate": [1, 0]}  # the first call fails
+        self.assertTrue(fetcher.call("fetch", {"consumer_number": "C-1"}, idempotent=True)["amount"])
+        self.assertEqual(fetcher.status()["hedged"], 2)
+
+        self.server.faults["bill:tneb"] = {"error_rate": [1, 0]}
+        with self.assertRaises(providers.ProviderError):
+            providers.get("bill", "tneb").call("pay", {"reference": "bill-1"})
+        self.assertEqual(self.server.calls["bill:tneb"], 1)
+
+    def test_unanswered_recharges_are_settled_and_open_circuit_debits_nothing(self):
+        Operator.objects.create(code="airtel", name="Airtel")
+        self.a1.set_pin("1234")
+        client = APIClient()
+        client.force_authenticate(self.a1.user)
+
+        def recharge():
+            return client.post(reverse("recharge"), {"bank_id": self.a1.id, "mobile": "9999999999",
+                                                     "operator": "airtel", "amount": "10", "pin": "1234"})
+
+        self.assertEqual(recharge().status_code, 200)
+        self.server.faults["recharge:airtel"] = {"error_rate": 1}
+        for _ in range(3):  # a 5xx answer does not say whether the recharge was made: debited, PENDING
+            response = recharge()
+            self.assertEqual((response.status_code, response.data["status"]), (202, "PENDING"))
+        self.assertEqual(MobileRecharge.objects.filter(status="PENDING").count(), 3)
+        response = recharge()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(MobileRecharge.objects.count(), 4)  # refused before a record or a debit
+        self.assertEqual(BankAccount.objects.get(id=self.a1.id).amount, Decimal("60.00"))
+
+        self.a1.user.is_staff = True
+        self.a1.user.save()
+        stats = {p["provider"]: p for p in client.get(reverse("providers-status")).data["providers"]}
+        self.assertEqual(stats["recharge:airtel"]["state"], "open")
+        self.assertEqual((stats["recharge:airtel"]["calls"], stats["recharge:airtel"]["errors"]), (4, 3))
+        self.assertEqual(sum(stats["recharge:airtel"]["histogram"].values()), 4)
+
+        self.assertEqual(payments.settle_pending(older_than=0), {"unanswered": 3})  # circuit still open
+        self.server.faults.clear()
+        providers.reset()
+        self.assertEqual(payments.settle_pending(older_than=3600), {})  # too recent: may still be in flight
+        self.assertEqual(payments.settle_pending(older_than=0), {"refunded": 3})  # the provider never made them
+        self.assertEqual(MobileRecharge.objects.filter(status="FAILED").count(), 3)
+        self.assertEqual(BankAccount.objects.get(id=self.a1.id).amount, Decimal("90.00"))
+        self.assertEqual(Transaction.objects.filter(category="RECHARGE").count(), 1)
+        self.assertEqual(payments.settle_pending(older_than=0), {})
+
+    @override_settings(PROVIDER_BASE_URL=None, PROVIDER_TIMEOUTS={"bill": 0.05},
+                       MOCK_PROVIDER_LATENCY={"bill": 0.2})
+    def test_timed_out_payment_the_biller_made_is_completed_not_refunded(self):
+        biller = Biller.objects.create(code="tneb", name="TNEB", category="electricity")
+        with self.assertRaises(payments.PaymentPending) as raised:
+            payments.pay_bill(self.a1.user, self.a1.id, biller, "CN-1", Decimal("40"))
+        bp = raised.exception.record
+        self.assertEqual((BillPayment.objects.get(id=bp.id).status, BankAccount.objects.get(id=self.a1.id).amount),
+                         ("PENDING", Decimal("60.00")))
+
+        with override_settings(MOCK_PROVIDER_LATENCY={}):
+            self.assertEqual(payments.settle_pending(older_than=0), {"completed": 1})
+        bp.refresh_from_db()
+        self.assertEqual(bp.status, "SUCCESS")
+        self.assertTrue(bp.provider_txn)
+        self.assertEqual(BankAccount.objects.get(id=self.a1.id).amount, Decimal("60.00"))
+        self.assertEqual(Transaction.objects.get(category="BILL").amount, Decimal("40"))
+        self.assertEqual(OutboxEvent.objects.filter(topic="bill_payment").count(), 1)
+
+    def test_definite_failures_are_refunded_at_once(self):
+        operator = Operator.objects.create(code="airtel", name="Airtel")
+        errors = (providers.ProviderRejected("invalid number"), providers.ProviderUnreachable("refused"),
+                  KeyError("provider_txn"))  # a malformed answer
+        for error in errors:
+            with mock.patch.object(payments, "call_provider", side_effect=error), \
+                    self.assertRaises(providers.ProviderError):
+                payments.recharge(self.a1.user, self.a1.id, operator, "9999999999", Decimal("10"))
+        self.assertEqual(list(MobileRecharge.objects.values_list("status", flat=True)), ["FAILED"] * 3)
+        self.assertEqual(BankAccount.objects.get(id=self.a1.id).amount, Decimal("100.00"))
+
+    def test_bill_fetch_failure_is_not_a_server_error(self):
+        Biller.objects.create(code="tneb", name="TNEB", category="electricity")
+        self.server.faults["bill_fetch:tneb"] = {"error_rate": 1}
+        client = APIClient()
+        client.force_authenticate(self.a1.user)
+        response = client.post(reverse("bill-fetch"), {"biller_code": "tneb", "consumer_number": "C-1"})
+        self.assertEqual(response.status_code, 502)
+        self.assertIsNone(bills.cached_bill(Biller.objects.get(code="tneb"), "C-1"))
+
+
+class CounterpartyTests(TestCase):
+    """Transfers keep per-payer payee stats; suggestions and saved payees come out frecency first."""
+
+    def setUp(self):
+        OutboxTests.setUp(self)
+        BankAccount.objects.filter(id=self.a1.id).update(amount=Decimal("1000.00"))
+        self.c1 = BankAccount.objects.create(user=User.objects.create_user("carol"), holder_name="carol",
+                                             bank_name="State Bank", account_number="333333", ifsc="SBIN0000001",
+                                             upi_id="carol.333333@gapy")
+        self.own = BankAccount.objects.create(user=self.a1.user, holder_name="alice", bank_name="Other Bank",
+                                              account_number="444444", ifsc="SBIN0000001", upi_id="alice.444444@gapy")
+        self.client = APIClient()
+        self.client.force_authenticate(self.a1.user)
+
+    def test_transfers_update_stats(self):
+        payments.transfer(self.a1.id, self.b1.id, Decimal("30"))
+        payments.transfer(self.a1.id, self.b1.id, Decimal("12.5"))
+        payments.transfer(self.a1.id, self.b1.id, Decimal("5000"))  # FAILED
+        payments.transfer(self.a1.id, self.own.id, Decimal("10"))   # to herself
+
+        stat = CounterpartyStat.objects.get()
+        self.assertEqual((stat.owner_id, stat.account_id, stat.count, stat.total),
+                         (self.a1.user_id, self.b1.id, 2, Decimal("42.5")))
+        paid = list(Transaction.objects.filter(receiver_account=self.b1, status="SUCCESS").order_by("id"))
+        self.assertEqual(stat.last_paid_at, paid[-1].timestamp)
+        self.assertAlmostEqual(stat.rank, counterparties.combine(*(counterparties.rank_of(t.timestamp) for t in paid)))
+
+    def test_recent_outranks_frequent_long_ago(self):
+        now = timezone.now()
+        for days in (120, 121, 122, 123):
+            counterparties.record_payment(self.a1.user_id, self.b1.id, Decimal("10"), now - datetime.timedelta(days=days))
+        counterparties.record_payment(self.a1.user_id, self.c1.id, Decimal("10"), now - datetime.timedelta(days=1))
+        bob, carol = (CounterpartyStat.objects.get(account=a) for a in (self.b1, self.c1))
+        self.assertGreater(counterparties.score(carol.rank, now), counterparties.score(bob.rank, now))
+        self.assertAlmostEqual(counterparties.score(bob.rank, now), sum(2 ** (-d / 14) for d in (120, 121, 122, 123)))
+
+        response = self.client.get(reverse("api_payee_suggestions"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p["account_id"] for p in response.data["payees"]], [self.c1.id, self.b1.id])
+        self.assertEqual(response.data["payees"][1]["count"], 4)
+        self.assertEqual(len(self.client.get(reverse("api_payee_suggestions"), {"limit": "1"}).data["payees"]), 1)
+        self.assertEqual(self.client.get(reverse("api_payee_suggestions"), {"limit": "0"}).status_code, 400)
+
+        for account in (self.b1, self.c1, self.own):
+            payee = Payee.objects.create(name=account.holder_name, upi_id=account.upi_id)
+            SavedPayee.objects.create(owner=self.a1.user, payee=payee)
+        names = [row["payee"]["name"] for row in self.client.get(reverse("api_list_saved_payees")).data]
+        self.assertEqual(names, ["carol", "bob", "alice"])  # never paid: last
+
+    def test_rebuild_matches_incremental_updates(self):
+        for receiver, amount in ((self.b1, "30"), (self.c1, "20"), (self.b1, "7"), (self.own, "5")):
+            payments.transfer(self.a1.id, receiver.id, Decimal(amount))
+        payments.transfer(self.b1.id, self.c1.id, Decimal("15"))
+        live = {(s.owner_id, s.account_id): (s.count, s.total, s.last_paid_at, s.rank)
+                for s in CounterpartyStat.objects.all()}
+        self.assertEqual(len(live), 3)
+
+        CounterpartyStat.objects.all().delete()
+        stats = counterparties.rebuild(chunk_users=1)
+        self.assertEqual((stats["rows"], stats["payments"]), (3, 5))  # the self transfer is read, not kept
+        rebuilt = {(s.owner_id, s.account_id): (s.count, s.total, s.last_paid_at, s.rank)
+                   for s in CounterpartyStat.objects.all()}
+        self.assertEqual(rebuilt.keys(), live.keys())
+        for key, (count, total, last, rank) in live.items():
+            self.assertEqual(rebuilt[key][:3], (count, total, last))
+            self.assertAlmostEqual(rebuilt[key][3], rank)
+
+
+class PayeeAutocompleteTests(TestCase):
+    """search_payees answers from the user's own payees, cached per user, and falls back to everyone."""
+
+    def setUp(self):
+        payee_index.clear()
+        self.addCleanup(payee_index.clear)
+        CounterpartyTests.setUp(self)
+        BankAccount.objects.filter(id=self.b1.id).update(mobile="+91 98400 12345")
+        self.rob = BankAccount.objects.create(user=User.objects.create_user("robin"), holder_name="Robin Hood",
+                                              bank_name="State Bank", account_number="555555", ifsc="SBIN0000001",
+                                              upi_id="robin.555555@gapy")
+
+    def search(self, q, **extra):
+        response = self.client.get(reverse("api_search_payees"), {"q": q, **extra})
+        self.assertEqual(response.status_code, 200)
+        return [row["holder_name"] for row in response.data]
+
+    def test_own_payees_first_then_global(self):
+        payments.transfer(self.a1.id, self.b1.id, Decimal("10"))
+        SavedPayee.objects.create(owner=self.a1.user, payee=Payee.objects.create(name="carol", upi_id=self.c1.upi_id))
+
+        self.assertEqual(self.search("bo"), ["bob"])
+        self.assertEqual(self.search("CAR"), ["carol"])
+        self.assertEqual(self.search("98400"), ["bob"])
+        self.assertEqual(self.search("+91 98400"), ["bob"])
+        self.assertEqual(self.search("carol.333"), ["carol"])
+        self.assertNotIn("amount", self.client.get(reverse("api_search_payees"), {"q": "bob"}).data[0])
+        self.assertEqual(self.search("hood"), ["Robin Hood"])  # miss: everyone
+        self.assertEqual(self.search("bo", scope="global"), ["bob"])
+
+        anonymous = APIClient().get(reverse("api_search_payees"), {"q": "gapy"})
+        self.assertEqual(len(anonymous.data), 5)
+
+    def test_cached_until_payees_or_transfers_change(self):
+        self.search("bob")
+        with self.assertNumQueries(1):  # the data version
+            self.assertEqual(payee_index.for_user(self.a1.user_id).search("x"), [])
+        index = payee_index.for_user(self.a1.user_id)
+
+        payments.transfer(self.a1.id, self.rob.id, Decimal("10"))
+        self.assertIsNot(payee_index.for_user(self.a1.user_id), index)
+        self.assertEqual(self.search("rob"), ["Robin Hood"])
+        self.assertEqual(self.search("r"), ["Robin Hood"])  # own hit: no global "r" search
+
+        SavedPayee.objects.create(owner=self.a1.user, payee=Payee.objects.create(name="carol", upi_id=self.c1.upi_id))
+        self.assertEqual(self.search("c"), ["carol"])
+        payments.transfer(self.a1.id, self.c1.id, Decimal("10"))
+        payments.transfer(self.a1.id, self.c1.id, Decimal("10"))
+        self.assertEqual(self.search("ro") + self.search("ca"), ["Robin Hood", "carol"])
+        self.assertEqual([row["holder_name"] for row in payee_index.for_user(self.a1.user_id).entries],
+                         ["carol", "Robin Hood"])  # paid twice since
+
+    @override_settings(PAYEE_INDEX_MAX_USERS=2)
+    def test_least_recently_used_user_is_evicted(self):
+        users = [self.a1.user_id, self.b1.user_id, self.c1.user_id]
+        first = payee_index.for_user(users[0])
+        payee_index.for_user(users[1])
+        self.assertIs(payee_index.for_user(users[0]), first)  # now most recent
+        payee_index.for_user(users[2])
+        self.assertEqual(list(payee_index._indexes), [users[0], users[2]])
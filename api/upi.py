@@ -0,0 +1,110 @@
+# backend/api/upi.py
+"""
+UPI id allocation: <username>.<bankabbr><suffix>@gapy
+
+Suffixes come from a per-prefix counter (UpiSequence) instead of random
+digits checked against BankAccount in a loop, so allocating an id costs the
+same couple of queries whether the prefix has 1 or 100k accounts. Counter
+values are scrambled inside each block of 10k so that ids stay 4 digits
+for the first 10k accounts of a prefix and neighbouring accounts don't get
+guessable neighbouring ids. The unique constraint on BankAccount.upi_id is
+the final arbiter: an insert that still collides (e.g. with an old random
+id) simply takes the next counter value.
+"""
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F
+
+from .models import BankAccount, UpiSequence
+
+UPI_DOMAIN = "gapy"
+BLOCK = 10_000
+# any multiplier coprime with BLOCK gives a bijection on 0..BLOCK-1
+SCRAMBLE_MUL = 7_919
+SCRAMBLE_ADD = 4_271
+MAX_INSERT_ATTEMPTS = 5
+
+
+def upi_prefix(username, bank_name):
+    uname = ''.join(ch for ch in username.lower() if ch.isalnum())[:12]
+    bankabbr = ''.join(ch for ch in bank_name.lower() if ch.isalpha())[:4]
+    return f"{uname}.{bankabbr}"
+
+
+def format_upi_id(prefix, value):
+    block, offset = divmod(value, BLOCK)
+    suffix = block * BLOCK + (offset * SCRAMBLE_MUL + SCRAMBLE_ADD) % BLOCK
+    return f"{prefix}{suffix:04d}@{UPI_DOMAIN}"
+
+
+def reserve(prefix, count=1):
+    """Reserve `count` consecutive counter values for prefix. Returns a range."""
+    with db_transaction.atomic():
+        updated = UpiSequence.objects.filter(prefix=prefix).update(last_value=F("last_value") + count)
+        if not updated:
+            try:
+                with db_transaction.atomic():
+                    UpiSequence.objects.create(prefix=prefix, last_value=count)
+                return range(0, count)
+            except IntegrityError:
+                # another request created the row first
+                UpiSequence.objects.filter(prefix=prefix).update(last_value=F("last_value") + count)
+        last = UpiSequence.objects.filter(prefix=prefix).values_list("last_value", flat=True).get()
+    return range(last - count, last)
+
+
+def allocate_upi_id(username, bank_name):
+    prefix = upi_prefix(username, bank_name)
+    return format_upi_id(prefix, reserve(prefix)[0])
+
+
+def allocate_upi_ids(username, bank_name, count):
+    """Allocate `count` ids for one prefix with a single counter update."""
+    prefix = upi_prefix(username, bank_name)
+    return [format_upi_id(prefix, value) for value in reserve(prefix, count)]
+
+
+def allocate_upi_ids_bulk(pairs):
+    """
+    Allocate one id per (username, bank_name) pair, in order, for any number
+    of prefixes with a fixed number of queries: counters are created if
+    missing, locked in prefix order, and advanced with a single bulk_update.
+    """
+    prefixes = [upi_prefix(username, bank_name) for username, bank_name in pairs]
+    counts = {}
+    for prefix in prefixes:
+        counts[prefix] = counts.get(prefix, 0) + 1
+    if not counts:
+        return []
+
+    with db_transaction.atomic():
+        UpiSequence.objects.bulk_create(
+            [UpiSequence(prefix=prefix) for prefix in counts], ignore_conflicts=True
+        )
+        sequences = list(UpiSequence.objects.select_for_update().filter(prefix__in=counts).order_by("prefix"))
+        next_value = {}
+        for seq in sequences:
+            next_value[seq.prefix] = seq.last_value
+            seq.last_value += counts[seq.prefix]
+        UpiSequence.objects.bulk_update(sequences, ["last_value"])
+
+    ids = []
+    for prefix in prefixes:
+        ids.append(format_upi_id(prefix, next_value[prefix]))
+        next_value[prefix] += 1
+    return ids
+
+
+def create_bank_account(user, **fields):
+    """
+    Insert a BankAccount with a freshly allocated upi_id, retrying with the
+    next counter value if the id is already taken.
+    """
+    for _ in range(MAX_INSERT_ATTEMPTS):
+        upi_id = allocate_upi_id(user.username, fields["bank_name"])
+        try:
+            with db_transaction.atomic():
+                return BankAccount.objects.create(user=user, upi_id=upi_id, **fields)
+        except IntegrityError:
+            if not BankAccount.objects.filter(upi_id=upi_id).exists():
+                raise  # some other constraint (e.g. duplicate account_number)
+    raise IntegrityError(f"Could not allocate a free UPI id for {user.username}")
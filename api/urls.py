@@ -10,23 +10,29 @@ urlpatterns = [
     path('banks/', views.banks_view, name='banks'),
     path('add-balance/', views.add_balance_view, name='add_balance'),
     path('balance/', views.balance, name='balance'), 
+    path('balances/', views.balances, name='balances'),
     path("payees/search/", views.search_payees, name="api_search_payees"),
     path("payees/add_saved/", views.add_saved_payee, name="api_add_saved_payee"),
     path("payees/list_saved/", views.list_saved_payees, name="api_list_saved_payees"),
+    path("payees/suggestions/", views.payee_suggestions, name="api_payee_suggestions"),
     path("transactions/make/", views.make_transaction, name="api_make_transaction"),
     path("transactions/list/", views.list_transactions, name="api_list_transactions"),
     path("bank/search/", views.search_bank_account, name="api_bank_search"),
     path("bank/add_saved/", views.add_bank_as_saved, name="api_bank_add_saved"),
 
 path("qr/myqr/", views.my_qr_image, name="api_my_qr"),
+path("qr/sheets/", views.qr_sheets, name="qr-sheets"),
 path("bank/<int:pk>/", views.bank_account_detail, name="api_bank_detail"),
 path("operators/", views.operators_list, name="operators"),
   path("plans/", views.plans_list, name="plans"),
+  path("plans/search/", views.plans_search, name="plans-search"),
   path("recharge/", views.create_recharge, name="recharge"),
 
 path("bill/billers/", views.billers_list, name="billers-list"),
     path("bill/fetch/", views.fetch_bill, name="bill-fetch"),
     path("bill/pay/", views.pay_bill, name="bill-pay"),
+    path("bill/pay-multiple/", views.pay_bills, name="bill-pay-multiple"),
+    path("providers/status/", views.providers_status, name="providers-status"),
     path("bill/history/", views.bill_history, name="bill-history"),
     path("transactions/stats/", views.transactions_stats, name="transactions-stats"),
 
@@ -38,9 +44,21 @@ path("bill/billers/", views.billers_list, name="billers-list"),
     # banks: list/create (existing) -> /api/banks/
     # add bank detail / delete:
     path('banks/<int:pk>/', views.bank_detail, name='api-bank-detail'),
+    path('banks/import/', views.import_bank_accounts, name='api-bank-import'),
     path('bank/pin-status/', views.pin_status, name='pin-status'),
     path('bank/set-pin/', views.set_pin, name='set-pin'),
     path('bank/verify-pin/', views.verify_pin, name='verify-pin'),
     path('transactions/', views.list_transactions, name='transactions-list-alias'),
+    path('transactions/<int:pk>/receipt.png', views.transaction_receipt, {'fmt': 'png'}, name='transaction-receipt-png'),
+    path('transactions/<int:pk>/receipt.pdf', views.transaction_receipt, {'fmt': 'pdf'}, name='transaction-receipt-pdf'),
+    path('dashboard/', views.dashboard, name='dashboard'),
+
+    # autopay
+    path('mandates/', views.mandates_view, name='mandates'),
+    path('mandates/<int:pk>/', views.mandate_detail, name='mandate-detail'),
+
+    # live payment events (ASGI)
+    path('events/stream/', views.event_stream, name='events-stream'),
+    path('events/poll/', views.event_poll, name='events-poll'),
 
 ]
@@ -107,17 +107,11 @@ from rest_framework import status
 
 from .serializers import BankAccountSerializer
 from .models import BankAccount
+from . import upi
 
-# Helper to generate a UPI id (simple format): <username>.<bankabbr><random4>@gapy
+# Helper to generate a UPI id: <username>.<bankabbr><suffix>@gapy (see api/upi.py)
 def generate_upi_id(username: str, bank_name: str):
-    uname = ''.join(ch for ch in username.lower() if ch.isalnum())[:12]
-    bankabbr = ''.join(ch for ch in bank_name.lower() if ch.isalpha())[:4]
-    rand = ''.join(random.choices(string.digits, k=4))
-    candidate = f"{uname}.{bankabbr}{rand}@gapy"
-    # ensure uniqueness; if collision add timestamp
-    if BankAccount.objects.filter(upi_id=candidate).exists():
-        candidate = f"{uname}.{bankabbr}{rand}{int(timezone.now().timestamp())}@gapy"
-    return candidate
+    return upi.allocate_upi_id(username, bank_name)
 
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.authentication import TokenAuthentication
@@ -144,7 +138,7 @@ def banks_view(request):
         bank_name = request.query_params.get('bank_name')
         if acc_num:
             # find that account for this user only
-            account = BankAccount.objects.filter(user=user, account_number=acc_num)
+            account = BankAccount.objects.filter(user=user, account_number=acc_num).first()
             if not account:
                 return Response(
                     {"detail": "Account not found."},
@@ -163,7 +157,7 @@ def banks_view(request):
     # POST - create
     acc_num = request.data.get('account_number')
     if acc_num:
-        existing = BankAccount.objects.filter(user=user, account_number=acc_num)
+        existing = BankAccount.objects.filter(user=user, account_number=acc_num).first()
         if existing:
             # Return existing record instead of creating duplicate
             existing_ser = BankAccountSerializer(existing)
@@ -174,17 +168,16 @@ def banks_view(request):
 
     ser = BankAccountSerializer(data=request.data, context={'request': request})
     if ser.is_valid():
-        upi = generate_upi_id(user.username, ser.validated_data['bank_name'])
         pin=request.data.get('pin')
-        account = BankAccount.objects.create(
-            user=user,
+        # upi_id is allocated from the per-prefix counter (retries on collision)
+        account = upi.create_bank_account(
+            user,
             holder_name=ser.validated_data['holder_name'],
             bank_name=ser.validated_data['bank_name'],
             branch=ser.validated_data.get('branch', ''),
             account_number=ser.validated_data['account_number'],
             ifsc=ser.validated_data['ifsc'],
             mobile=ser.validated_data.get('mobile', ''),
-            upi_id=upi
         )
         # Validate: must be exactly 4–6 digits
         if not re.fullmatch(r"\d{4,6}", pin):
@@ -207,36 +200,77 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
+from django.db.models import Sum, Window
 from .models import BankAccount
 
+def _balance_row(account):
+    return {
+        "bank_name": account.bank_name,
+        "account_number": account.account_number,
+        "amount": account.amount,
+        "upi_id": account.upi_id
+    }
+
+
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def balance(request):
     """
-    POST: Check balance for a given bank name and account number
-    Example payload: {"bank_name": "State Bank of India", "account_number": "1234567890"}
+    GET: Balance of one of the user's accounts, looked up by
+      ?id=<account id>  or  ?upi_id=<upi id>
+    (both indexed). The older bank_name + account_number form is still
+    accepted: it goes through the (user, account_number) unique index and
+    compares the bank name afterwards. Parameters may also come in the body.
     """
-    bank_name = request.data.get("bank_name")
-    account_number = request.data.get("account_number")
+    params = request.query_params if request.query_params else request.data
+    accounts = BankAccount.objects.filter(user=request.user)
 
-    if not bank_name or not account_number:
-        return Response({"error": "Missing bank_name or account_number"}, status=status.HTTP_400_BAD_REQUEST)
+    if params.get("id"):
+        try:
+            account = accounts.filter(pk=int(params["id"])).first()
+        except (TypeError, ValueError):
+            return Response({"error": "id must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+    elif params.get("upi_id"):
+        account = accounts.filter(upi_id=str(params["upi_id"]).strip()).first()
+    else:
+        bank_name = params.get("bank_name")
+        account_number = params.get("account_number")
+        if not bank_name or not account_number:
+            return Response({"error": "Pass id or upi_id (or bank_name and account_number)"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        account = accounts.filter(account_number=account_number.strip()).first()
+        if account and account.bank_name.casefold() != bank_name.strip().casefold():
+            account = None
 
-    try:
-        account = BankAccount.objects.get(
-            user=request.user,
-            bank_name__iexact=bank_name.strip(),
-            account_number=account_number.strip()
-        )
-        return Response({
-            "bank_name": account.bank_name,
-            "account_number": account.account_number,
-            "amount": account.amount,
-            "upi_id": account.upi_id
-        }, status=status.HTTP_200_OK)
-    except BankAccount.DoesNotExist:
+    if account is None:
         return Response({"error": "Account not found"}, status=status.HTTP_404_NOT_FOUND)
+    return Response(_balance_row(account), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def balances(request):
+    """
+    GET: Every linked account with its balance, and the total across them,
+    from one query (a window Sum over the user's accounts):
+      {"accounts": [{"id", "bank_name", "account_number", "amount", "upi_id"}, ...],
+       "total": "1234.50", "count": 3}
+    """
+    rows = list(
+        BankAccount.objects.filter(user=request.user)
+        .annotate(total=Window(Sum("amount")))
+        .order_by("bank_name", "id")
+        .values("id", "bank_name", "account_number", "amount", "upi_id", "total")
+    )
+    total = (rows[0]["total"] if rows else Decimal("0")).quantize(Decimal("0.01"))
+    accounts = [
+        {"id": r["id"], "bank_name": r["bank_name"], "account_number": r["account_number"],
+         "amount": str(r["amount"]), "upi_id": r["upi_id"]}
+        for r in rows
+    ]
+    return Response({"accounts": accounts, "total": str(total), "count": len(accounts)})
 
 
 @api_view(['POST'])
@@ -249,8 +283,8 @@ def add_balance_view(request):
     """
     profile = Profile.objects.get(user=request.user)
     try:
-        amount = float(request.data.get('amount', 0))
-    except ValueError:
+        amount = Decimal(str(request.data.get('amount', 0)))
+    except (InvalidOperation, ValueError):
         return Response({"error": "Invalid amount"}, status=status.HTTP_400_BAD_REQUEST)
 
     if amount <= 0:
@@ -272,20 +306,31 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Q
+from django.db.models import F, OuterRef, Q, Subquery
 from django.contrib.auth.models import User
 
-from .models import Payee, SavedPayee, Transaction, Profile
+from .models import CounterpartyStat, Payee, SavedPayee, Transaction, Profile
 from .serializers import PayeeSerializer, SavedPayeeSerializer, TransactionSerializer
+from . import payee_index
 
 # SEARCH payees by name/phone/upi
 @api_view(["GET"])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
 def search_payees(request):
-    
+    """
+    Signed in users are answered from their own payees and past
+    counterparties first (api.payee_index: prefix match, best first,
+    without balances); everyone else, a query matching none of those, or
+    ?scope=global, searches all accounts.
+    """
     q = request.GET.get("q", "").strip()
     print(q)
     if not q:
         return Response([], status=status.HTTP_200_OK)
+    if request.user.is_authenticated and request.GET.get("scope") != "global":
+        hits = payee_index.for_user(request.user.id).search(q)
+        if hits:
+            return Response(hits)
     matches = BankAccount.objects.filter(
         Q(holder_name__icontains=q) | Q(mobile__icontains=q) | Q(upi_id__icontains=q)
     )[:50]
@@ -314,8 +359,16 @@ def add_saved_payee(request):
 @authentication_classes([SessionAuthentication, TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def list_saved_payees(request):
+    """The user's saved payees, the ones they pay most often and most recently (api.counterparties) first."""
     user = request.user
-    qs = SavedPayee.objects.filter(owner=user).select_related("payee")
+    rank = (
+        CounterpartyStat.objects.filter(owner=OuterRef("owner"), account__upi_id=OuterRef("payee__upi_id"))
+        .exclude(account__upi_id="").order_by("-rank").values("rank")[:1]
+    )
+    qs = (
+        SavedPayee.objects.filter(owner=user).select_related("payee")
+        .annotate(rank=Subquery(rank)).order_by(F("rank").desc(nulls_last=True), "-added_at")
+    )
     serializer = SavedPayeeSerializer(qs, many=True)
     return Response(serializer.data)
 
@@ -337,6 +390,7 @@ from rest_framework import status
 
 from .models import BankAccount, Transaction
 from .serializers import TransactionSerializer
+from . import payments
 
 
 @api_view(["POST"])
@@ -377,7 +431,7 @@ def make_transaction(request):
     if amount_dec <= 0:
         return Response({"detail": "Amount must be positive"}, status=status.HTTP_400_BAD_REQUEST)
     try:
-        sender_account = BankAccount.objects.select_for_update().get(
+        sender_account = BankAccount.objects.get(
         id=id,
         user=request.user  # optional, for security
     )
@@ -392,50 +446,21 @@ def make_transaction(request):
 
     # Get receiver’s bank account (payee)
     try:
-        receiver_account = BankAccount.objects.select_for_update().get(id=payee_id)
+        receiver_account = BankAccount.objects.get(id=payee_id)
     except BankAccount.DoesNotExist:
         return Response({"detail": "Receiver account not found"}, status=status.HTTP_404_NOT_FOUND)
-    print(sender_account)
-    print(receiver_account)
 
     # Prevent sending to same account
     if sender_account.id == receiver_account.id:
         return Response({"detail": "Cannot send money to the same account"}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Perform debit + credit atomically
-    with db_transaction.atomic():
-        sender_balance = Decimal(str(sender_account.amount or 0))
-        receiver_balance = Decimal(str(receiver_account.amount or 0))
-
-        # Check balance
-        if sender_balance < amount_dec:
-            txn = Transaction.objects.create(
-                sender_account=sender_account,
-                receiver_account=receiver_account,
-                amount=amount_dec,
-                status="FAILED",
-                reference=reference
-            )
-            serializer = TransactionSerializer(txn)
-            return Response(
-                {"detail": "Insufficient balance", "transaction": serializer.data},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # Debit sender, credit receiver
-        sender_account.amount = sender_balance - amount_dec
-        receiver_account.amount = receiver_balance + amount_dec
-
-        sender_account.save()
-        receiver_account.save()
-
-        # Record transaction
-        txn = Transaction.objects.create(
-            sender_account=sender_account,
-            receiver_account=receiver_account,
-            amount=amount_dec,
-            status="SUCCESS",
-            reference=reference
+    # Debit + credit atomically (both accounts locked in id order)
+    txn = payments.transfer(sender_account.id, receiver_account.id, amount_dec, reference)
+    if txn.status == "FAILED":
+        serializer = TransactionSerializer(txn)
+        return Response(
+            {"detail": "Insufficient balance", "transaction": serializer.data},
+            status=status.HTTP_400_BAD_REQUEST
         )
 
     serializer = TransactionSerializer(txn)
@@ -443,6 +468,7 @@ def make_transaction(request):
                     status=status.HTTP_201_CREATED)
 
 
+from django.conf import settings
 from django.db.models import Q
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated
@@ -450,38 +476,53 @@ from rest_framework.authentication import SessionAuthentication, TokenAuthentica
 from rest_framework.response import Response
 from .models import BankAccount, Transaction
 from .serializers import TransactionSerializer
+from . import archive, categories
 
 @api_view(["GET"])
 @authentication_classes([SessionAuthentication, TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def list_transactions(request):
-    user = request.user
+    """
+    The user's transactions, newest first. Reads the hot table and only
+    reaches into the yearly archives when the page runs past it.
 
-    # optional filters
-    month = request.GET.get("month")
-    year = request.GET.get("year")
+    Optional: ?month= ?year= ?category= (P2P, RECHARGE, BILL) filters,
+    ?limit= page size (TRANSACTION_PAGE_SIZE if omitted) and ?before=
+    cursor taken from the X-Next-Before header of a full page.
+    """
+    user = request.user
 
-    # get all bank accounts that belong to this user
-    accounts = BankAccount.objects.filter(user=user)
+    try:
+        month = int(request.GET["month"]) if request.GET.get("month") else None
+        year = int(request.GET["year"]) if request.GET.get("year") else None
+        limit = int(request.GET["limit"]) if request.GET.get("limit") else None
+        before = archive.decode_cursor(request.GET["before"]) if request.GET.get("before") else None
+    except ValueError:
+        return Response({"detail": "month, year and limit must be numbers; before must be a cursor"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if limit is not None and not 1 <= limit <= 500:
+        return Response({"detail": "limit must be between 1 and 500"}, status=status.HTTP_400_BAD_REQUEST)
+    limit = limit or getattr(settings, "TRANSACTION_PAGE_SIZE", archive.DEFAULT_PAGE_SIZE)
+    category = request.GET.get("category", "").upper() or None
+    if category and category not in categories.CATEGORIES:
+        return Response({"detail": f"category must be one of {', '.join(categories.CATEGORIES)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    # ids of all bank accounts that belong to this user
+    account_ids = set(BankAccount.objects.filter(user=user).values_list("id", flat=True))
 
     # if user has no linked accounts, return empty list
-    if not accounts.exists():
+    if not account_ids:
         return Response([])
 
-    # fetch transactions where user is sender OR receiver
-    qs = Transaction.objects.filter(
-        Q(sender_account__in=accounts) | Q(receiver_account__in=accounts)
-    ).order_by("-timestamp")
-
-    # apply optional date filters
-    if year:
-        qs = qs.filter(timestamp__year=year)
-    if month:
-        qs = qs.filter(timestamp__month=month)
+    txns = archive.user_transactions(user.id, account_ids, before=before, limit=limit, year=year, month=month,
+                                     category=category)
 
-    serializer = TransactionSerializer(qs, many=True, context={"request": request})
-    print(serializer.data)
-    return Response(serializer.data)
+    serializer = TransactionSerializer(txns, many=True, context={"request": request, "account_ids": account_ids})
+    response = Response(serializer.data)
+    if len(txns) == limit:
+        response["X-Next-Before"] = archive.encode_cursor(txns[-1])
+    return response
 
 
 # bank transfer
@@ -539,7 +580,7 @@ def add_bank_as_saved(request):
         defaults={
             "name": bank.holder_name,
             "phone": bank.mobile or "",
-            "email": bank.email or "",
+            "email": "",
             "upi_id": bank.upi_id or "",
         }
     )
@@ -550,7 +591,6 @@ def add_bank_as_saved(request):
 
 # qr
 # api/views.py (append these)
-import qrcode
 from io import BytesIO
 from django.http import HttpResponse, JsonResponse
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
@@ -560,6 +600,7 @@ from rest_framework.response import Response
 from rest_framework import status
 from .models import BankAccount
 from .serializers import BankAccountSerializer
+from . import qrsheets
 
 @api_view(["GET"])
 @authentication_classes([SessionAuthentication, TokenAuthentication])
@@ -572,17 +613,12 @@ def my_qr_image(request):
     """
     user = request.user
     # find a bank account for the user (pick first)
-    print('hey')
     bank = BankAccount.objects.filter(holder_name__icontains=user.username).first()
-    print('hey')
-    print(bank.id)
-    print(bank.holder_name)
-
-    payload = f"gapy://bank?bank_id={bank.id}&name={bank.holder_name}"
-    qr = qrcode.QRCode(box_size=8, border=1)
-    qr.add_data(payload)
-    qr.make(fit=True)
-    img = qr.make_image(fill_color="black", back_color="white")
+    if bank is None:
+        return Response({"detail": "No bank account found"}, status=status.HTTP_404_NOT_FOUND)
+
+    payload = qrsheets.qr_payload(bank.id, bank.holder_name)
+    img = qrsheets.qr_image(payload, box_size=8, border=1)
     buffer = BytesIO()
     img.save(buffer, format="PNG")
     buffer.seek(0)
@@ -621,29 +657,89 @@ def operators_list(request):
     serializer = OperatorSerializer(qs, many=True)
     return Response(serializer.data)
 
+from . import plan_index
+
+RECHARGE_TYPES = dict(Plan.TYPE_CHOICES)
+
+
 @api_view(["GET"])
 def plans_list(request):
+    """
+    An operator's plans grouped by category, for ?circle= (its own plans
+    plus the all-circle ones) and ?type=prepaid|postpaid. Served from the
+    grouping precomputed in api.plan_index.
+    """
     operator = request.GET.get("operator")
     circle = request.GET.get("circle")
-    rech_type = request.GET.get("type", "prepaid")
+    rech_type = request.GET.get("type") or "prepaid"
+    if rech_type not in RECHARGE_TYPES:
+        return Response({"detail": "type must be prepaid or postpaid"}, status=status.HTTP_400_BAD_REQUEST)
     if not operator:
         return Response({"plans":{}}, status=status.HTTP_200_OK)
-    ops = Operator.objects.filter(code=operator).first()
+    ops = Operator.objects.filter(code=operator).only("id", "catalog_updated_at").first()
     if not ops:
         return Response({"plans":{}}, status=status.HTTP_200_OK)
-    qs = Plan.objects.filter(operator=ops)
-    # optionally filter by category/type via query param
-    grouped = {}
-    for p in qs:
-        grouped.setdefault(p.category, []).append(PlanSerializer(p).data)
-    return Response({"plans": grouped})
-
-import time, uuid
+    return Response({"plans": plan_index.for_operator(ops).view(circle, rech_type).grouped})
+
+
+@api_view(["GET"])
+def plans_search(request):
+    """
+    Search an operator's plans from the in-memory index (api.plan_index).
+    ?operator= (required), ?circle=, ?type=prepaid|postpaid, ?category=,
+    ?min_amount= ?max_amount= (rupees), ?near= (rupees; with sort=near,
+    closest first), ?min_validity= ?max_validity= (days),
+    ?sort=amount|popular|validity|near, ?limit= (1-100, default 20).
+    """
+    code = request.GET.get("operator")
+    if not code:
+        return Response({"detail": "operator is required"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        rupees = {name: plan_index.paise(Decimal(request.GET[name])) if request.GET.get(name) else None
+                  for name in ("min_amount", "max_amount", "near")}
+        days = {name: int(request.GET[name]) if request.GET.get(name) else None
+                for name in ("min_validity", "max_validity")}
+        limit = int(request.GET.get("limit") or 20)
+    except (ValueError, ArithmeticError):
+        return Response({"detail": "amounts, validity and limit must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+    sort = request.GET.get("sort") or ("near" if rupees["near"] is not None else "amount")
+    if sort not in plan_index.SORTS:
+        return Response({"detail": f"sort must be one of {', '.join(plan_index.SORTS)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= 100:
+        return Response({"detail": "limit must be between 1 and 100"}, status=status.HTTP_400_BAD_REQUEST)
+    rech_type = request.GET.get("type") or "prepaid"
+    if rech_type not in RECHARGE_TYPES:
+        return Response({"detail": "type must be prepaid or postpaid"}, status=status.HTTP_400_BAD_REQUEST)
+
+    operator = Operator.objects.filter(code=code).only("id", "catalog_updated_at").first()
+    if operator is None:
+        return Response({"plans": []})
+    plans = plan_index.for_operator(operator).search(
+        circle=request.GET.get("circle") or None, recharge_type=rech_type,
+        category=request.GET.get("category") or None, sort=sort, limit=limit, **rupees, **days,
+    )
+    return Response({"plans": plans})
+
+import math, time, uuid
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
 from .models import Operator, Plan, MobileRecharge, BankAccount, Transaction
+from . import providers
+
+
+def provider_error_response(exc, who):
+    """503 while `who`'s circuit is open, 502 for a failed call; the payment was refunded (or never debited)."""
+    if isinstance(exc, providers.ProviderUnavailable):
+        response = Response({"status": "ERROR", "message": f"{who} is not responding right now; you have not been charged"},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        response["Retry-After"] = str(math.ceil(getattr(settings, "PROVIDER_BREAKER_RESET", 30)))
+        return response
+    return Response({"status": "ERROR", "message": f"{who} could not complete the payment; any amount debited has been refunded"},
+                    status=status.HTTP_502_BAD_GATEWAY)
 
 
 @api_view(["POST"])
@@ -692,10 +788,9 @@ def create_recharge(request):
             plan = Plan.objects.get(id=plan_id)
         except Plan.DoesNotExist:
             plan = None
-    print(id)
-    # Get user's first linked bank account (sender)
+    # Get the chosen bank account (sender)
     try:
-        sender_account = BankAccount.objects.select_for_update().get(
+        sender_account = BankAccount.objects.get(
         id=id,
         user=request.user  # optional, for security
     )
@@ -704,55 +799,35 @@ def create_recharge(request):
         {"error": "Bank account not found."},
         status=status.HTTP_404_NOT_FOUND
     )
-    print(sender_account.bank_name)
     if not check_password(str(pin), sender_account.pin_hash):
         return Response({'valid': False, 'detail': 'Invalid PIN Provided'}, status=status.HTTP_403_FORBIDDEN)
 
-
-    # Check sufficient balance
-    if sender_account.amount < amount:
+    # Debit, call the operator and log the transaction
+    try:
+        rec, sender_account = payments.recharge(
+            user, sender_account.id, op, mobile, amount, plan=plan, circle=circle or ""
+        )
+    except payments.InsufficientFunds:
         return Response(
             {"status": "ERROR", "message": "Insufficient balance"},
             status=status.HTTP_400_BAD_REQUEST,
         )
-
-    # Create pending recharge record
-    rec = MobileRecharge.objects.create(
-        user=user,
-        mobile=mobile,
-        operator=op,
-        circle=circle or "",
-        plan=plan,
-        amount=amount,
-        status="PENDING",
-    )
-
-    # Deduct amount (simulate immediate debit)
-    sender_account.amount -= amount
-    sender_account.save()
-
-    # Simulate provider recharge delay
-    time.sleep(0.8)
-    provider_txn = f"MOCK-{uuid.uuid4().hex[:10]}"
-
-    # Mark recharge success
-    rec.provider_txn = provider_txn
-    rec.status = "SUCCESS"
-    rec.save()
-
-    # Log transaction (Debited)
-    Transaction.objects.create(
-        sender_account=sender_account,
-        receiver_name=f"{op.name} Recharge - {mobile}",
-        amount=amount,
-        status="SUCCESS",
-        reference=f"Mobile Recharge ({op.name})"
-    )
+    except payments.PaymentPending as exc:
+        return Response(
+            {
+                "status": "PENDING",
+                "message": f"{op.name} has not confirmed the recharge yet; if it does not go through you will be refunded",
+                "recharge_id": exc.record.id,
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+    except providers.ProviderError as exc:
+        return provider_error_response(exc, op.name)
 
     return Response(
         {
             "status": "SUCCESS",
-            "txn_id": provider_txn,
+            "txn_id": rec.provider_txn,
             "message": f"Recharge successful for {mobile}",
             "recharge_id": rec.id,
             "debited_from": sender_account.bank_name,
@@ -772,8 +847,11 @@ from rest_framework import status
 from decimal import Decimal
 import uuid, datetime, time
 
+from django.conf import settings
+
 from .models import Biller, BillPayment, Transaction, BankAccount
 from .serializers import BillerSerializer, BillPaymentSerializer
+from . import bills
 
 @api_view(["GET"])
 @authentication_classes([SessionAuthentication, TokenAuthentication])
@@ -794,8 +872,10 @@ def billers_list(request):
 @permission_classes([IsAuthenticated])
 def fetch_bill(request):
     """
-    Mock fetch bill details for the given consumer_number + biller_code.
-    Returns sample amount, due_date, name, period.
+    Fetch bill details for the given consumer_number + biller_code.
+    Returns amount, due_date, name, period. Bills are cached for
+    BILL_FETCH_TTL seconds (api.bills); "cached" says whether this
+    request was answered without its own upstream fetch.
     """
     biller_code = request.data.get("biller_code")
     consumer = request.data.get("consumer_number")
@@ -805,23 +885,21 @@ def fetch_bill(request):
     if not biller:
         return Response({"detail":"Biller not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    # MOCK: create plausible bill data
-    # Amount generation: deterministic-ish using consumer substring to show variety
-    seed = sum([ord(c) for c in consumer[-4:]]) if len(consumer) >= 4 else len(consumer)*7
-    amount = Decimal( (50 + (seed % 100)) ).quantize(Decimal("0.01"))  # 50..149.00
-    due_date = datetime.date.today() + datetime.timedelta(days=7)
-    name_on_bill = f"{request.user.get_full_name() or request.user.username}"
-    period = f"{(datetime.date.today() - datetime.timedelta(days=30)).strftime('%b %Y')}"
-
+    try:
+        bill, cached = bills.fetch_bill(biller, consumer)
+    except providers.ProviderError as exc:
+        code = status.HTTP_503_SERVICE_UNAVAILABLE if isinstance(exc, providers.ProviderUnavailable) else status.HTTP_502_BAD_GATEWAY
+        return Response({"detail": f"Could not fetch the bill from {biller.name}, please try again"}, status=code)
     resp = {
         "biller": {"code": biller.code, "name": biller.name, "id": biller.id},
         "consumer_number": consumer,
-        "name_on_bill": name_on_bill,
-        "period": period,
-        "amount": str(amount),
-        "due_date": due_date.isoformat()
+        "name_on_bill": f"{request.user.get_full_name() or request.user.username}",  # MOCK
+        "period": bill["period"],
+        "amount": bill["amount"],
+        "due_date": bill["due_date"],
+        "fetched_at": bill["fetched_at"],
     }
-    return Response({"status":"SUCCESS","bill":resp})
+    return Response({"status":"SUCCESS","bill":resp,"cached":cached})
 
 @api_view(["POST"])
 @authentication_classes([SessionAuthentication, TokenAuthentication])
@@ -829,6 +907,8 @@ def fetch_bill(request):
 def pay_bill(request):
     """
     Pay a bill (mock): expects biller_code, consumer_number, amount, pin, reminder(optional)
+    - amount may be left out to pay the fetched bill's amount; the due date
+      and period come from the fetched bill when there is one (api.bills)
     - Deducts from user's first linked BankAccount
     - Creates BillPayment and Transaction (receiver_account null, receiver_name = biller + consumer)
     """
@@ -841,7 +921,7 @@ def pay_bill(request):
     pin = data.get("pin")
     reminder_date = data.get("reminder_date")  # optional yyyy-mm-dd
 
-    if not biller_code or not consumer or not amount or not pin:
+    if not biller_code or not consumer or not pin:
         return Response({"status":"ERROR","message":"Missing fields"}, status=status.HTTP_400_BAD_REQUEST)
 
     biller = Biller.objects.filter(code=biller_code).first()
@@ -850,7 +930,7 @@ def pay_bill(request):
 
     # find user's bank account (first linked) - adapt if you support multiple
     try:
-        sender_account = BankAccount.objects.select_for_update().get(
+        sender_account = BankAccount.objects.get(
         id=id,
         user=request.user  # optional, for security
     )
@@ -862,65 +942,158 @@ def pay_bill(request):
     if not check_password(str(pin), sender_account.pin_hash):
         return Response({'valid': False, 'detail': 'Invalid PIN'}, status=status.HTTP_403_FORBIDDEN)
 
+    # reuse the bill the user just fetched; only go upstream when paying "the bill" unfetched
+    bill = bills.cached_bill(biller, consumer)
+    if bill is None and not amount:
+        try:
+            bill, _ = bills.fetch_bill(biller, consumer)
+        except providers.ProviderError as exc:
+            return provider_error_response(exc, biller.name)
     try:
-        amt = Decimal(str(amount))
+        amt = Decimal(str(amount or bill["amount"]))
     except Exception:
         return Response({"status":"ERROR","message":"Invalid amount"}, status=status.HTTP_400_BAD_REQUEST)
-    print("DEBUG USER:", request.user.username)
-    print("DEBUG ACCOUNT:", sender_account.id, sender_account.holder_name, sender_account.amount)
-    print("DEBUG AMOUNT:", amount)
-    if sender_account.amount < amt:
-        return Response({"status":"ERROR","message":"Insufficient balance"}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Create pending billpayment
-    bp = BillPayment.objects.create(
-        user=user, biller=biller, consumer_number=consumer,
-        amount=amt, status="PENDING", due_date=datetime.date.today()+datetime.timedelta(days=7)
-    )
-
-    # Deduct immediately from user's account (mock)
-    sender_account.amount -= amt
-    sender_account.save()
 
-    # Simulate provider call
-    time.sleep(0.6)  # small delay to mimic external call
-
-    provider_txn = f"MOCK-BILL-{uuid.uuid4().hex[:10]}"
-    bp.provider_txn = provider_txn
-    bp.status = "SUCCESS"
-    bp.paid_on = datetime.datetime.utcnow()
+    reminder = None
     if reminder_date:
         try:
-            bp.reminder_date = datetime.date.fromisoformat(reminder_date)
+            reminder = datetime.date.fromisoformat(reminder_date)
         except Exception:
-            bp.reminder_date = None
-    bp.save()
-
-    # Create Transaction record (receiver_account is NULL)
-    Transaction.objects.create(
-        sender_account=sender_account,
-        receiver_account=None,
-        receiver_name=f"{biller.name} - {consumer}",
-        amount=amt,
-        status="SUCCESS",
-        reference=f"Bill Payment ({biller.name})"
-    )
+            reminder = None
+
+    # Debit, call the biller and log the transaction (receiver_account is NULL)
+    try:
+        bp, sender_account = payments.pay_bill(
+            user, sender_account.id, biller, consumer, amt, reminder_date=reminder,
+            due_date=datetime.date.fromisoformat(bill["due_date"]) if bill else None,
+            period=bill["period"] if bill else None,
+        )
+    except payments.InsufficientFunds:
+        return Response({"status":"ERROR","message":"Insufficient balance"}, status=status.HTTP_400_BAD_REQUEST)
+    except payments.PaymentPending as exc:
+        bills.forget_bill(biller, consumer)  # it may have been paid
+        return Response({
+            "status": "PENDING",
+            "message": f"{biller.name} has not confirmed the payment yet; if it does not go through you will be refunded",
+            "billpayment": BillPaymentSerializer(exc.record).data,
+        }, status=status.HTTP_202_ACCEPTED)
+    except providers.ProviderError as exc:
+        return provider_error_response(exc, biller.name)
+    bills.forget_bill(biller, consumer)  # paid: the next fetch asks the biller again
 
     # return bill payment & updated balance for frontend
     return Response({
         "status":"SUCCESS",
         "message":"Bill paid",
-        "provider_txn": provider_txn,
+        "provider_txn": bp.provider_txn,
         "billpayment": BillPaymentSerializer(bp).data,
         "remaining_balance": str(sender_account.amount)
     }, status=status.HTTP_200_OK)
 
 
+@api_view(["POST"])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def pay_bills(request):
+    """
+    Pay several bills at once: expects bank_id, pin, items (a list of
+    {biller_code, consumer_number, amount(optional)}), reminder_date(optional).
+    - the PIN is checked and the account debited once, for the total
+    - the biller calls run concurrently; a failed one is refunded and its
+      item comes back FAILED
+    - items without an amount pay the fetched bill (api.bills)
+    """
+    data = request.data
+    items = data.get("items")
+    pin = data.get("pin")
+    max_items = getattr(settings, "BILL_PAY_MAX_ITEMS", 10)
+    if not isinstance(items, list) or not items or not pin:
+        return Response({"status":"ERROR","message":"Missing fields"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > max_items:
+        return Response({"status":"ERROR","message":f"At most {max_items} bills per payment"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if not all(isinstance(item, dict) and item.get("biller_code") and item.get("consumer_number") for item in items):
+        return Response({"status":"ERROR","message":"Every item needs biller_code and consumer_number"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    keys = [(item["biller_code"], str(item["consumer_number"])) for item in items]
+    if len(set(keys)) < len(keys):
+        return Response({"status":"ERROR","message":"The same bill is listed twice"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    billers = {b.code: b for b in Biller.objects.filter(code__in={code for code, _ in keys})}
+    unknown = sorted({code for code, _ in keys if code not in billers})
+    if unknown:
+        return Response({"status":"ERROR","message":f"Unknown biller: {', '.join(unknown)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    sender_account = BankAccount.objects.filter(id=data.get("bank_id"), user=request.user).first()
+    if sender_account is None:
+        return Response({"error": "Bank account not found."}, status=status.HTTP_404_NOT_FOUND)
+    if not check_password(str(pin), sender_account.pin_hash):
+        return Response({'valid': False, 'detail': 'Invalid PIN'}, status=status.HTTP_403_FORBIDDEN)
+
+    # reuse fetched bills; fetch the unfetched ones that need "the bill's amount" together
+    pairs = [(billers[code], consumer) for code, consumer in keys]
+    fetched = [bills.cached_bill(*pair) for pair in pairs]
+    missing = [i for i, item in enumerate(items) if fetched[i] is None and not item.get("amount")]
+    try:
+        for i, bill in zip(missing, bills.fetch_bills([pairs[i] for i in missing])):
+            fetched[i] = bill
+    except providers.ProviderError as exc:
+        return provider_error_response(exc, "The biller")
+
+    to_pay = []
+    for item, (biller, consumer), bill in zip(items, pairs, fetched):
+        try:
+            amt = Decimal(str(item.get("amount") or bill["amount"])).quantize(Decimal("0.01"))
+        except Exception:
+            amt = None
+        if amt is None or not amt.is_finite() or amt <= 0:
+            return Response({"status":"ERROR","message":f"Invalid amount for {biller.code} {consumer}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        to_pay.append({
+            "biller": biller, "consumer_number": consumer, "amount": amt,
+            "due_date": datetime.date.fromisoformat(bill["due_date"]) if bill else None,
+            "period": bill["period"] if bill else None,
+        })
+
+    reminder = None
+    if data.get("reminder_date"):
+        try:
+            reminder = datetime.date.fromisoformat(data["reminder_date"])
+        except Exception:
+            reminder = None
+
+    try:
+        bps, sender_account = payments.pay_bills(request.user, sender_account.id, to_pay, reminder_date=reminder)
+    except payments.InsufficientFunds:
+        return Response({"status":"ERROR","message":"Insufficient balance"}, status=status.HTTP_400_BAD_REQUEST)
+    except providers.ProviderUnavailable as exc:
+        return provider_error_response(exc, "The biller")
+    for bp in bps:
+        if bp.status != "FAILED":  # paid, or maybe paid
+            bills.forget_bill(bp.biller, bp.consumer_number)
+
+    def total(state):
+        return str(sum((bp.amount for bp in bps if bp.status == state), Decimal("0")))
+
+    states = {bp.status for bp in bps}
+    return Response({
+        # PENDING bills await the biller's confirmation (settle_pending_payments), still debited
+        "status": states.pop() if len(states) == 1 else "PARTIAL",
+        "total_paid": total("SUCCESS"),
+        "pending": total("PENDING"),
+        "refunded": total("FAILED"),
+        "billpayments": BillPaymentSerializer(bps, many=True).data,
+        "remaining_balance": str(sender_account.amount),
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(["GET"])
 @authentication_classes([SessionAuthentication, TokenAuthentication])
 @permission_classes([IsAuthenticated])
 def bill_history(request):
-    qs = BillPayment.objects.filter(user=request.user).order_by("-created_at")
+    qs = BillPayment.objects.filter(user=request.user).select_related("biller").order_by("-created_at")
     data = BillPaymentSerializer(qs, many=True).data
     return Response(data)
 
@@ -952,6 +1125,7 @@ def transactions_stats(request):
     }
     Optional query params:
       - months=6   (how many months in trend; default 6)
+      - category=P2P|RECHARGE|BILL   (only that kind of transaction)
     """
     user = request.user
     months = 6
@@ -961,10 +1135,14 @@ def transactions_stats(request):
             months = 6
     except Exception:
         months = 6
+    category = request.GET.get("category", "").upper() or None
+    if category and category not in categories.CATEGORIES:
+        return Response({"detail": f"category must be one of {', '.join(categories.CATEGORIES)}"},
+                        status=status.HTTP_400_BAD_REQUEST)
 
     # get all accounts for user
-    accounts = BankAccount.objects.filter(user=user)
-    if not accounts.exists():
+    accounts = list(BankAccount.objects.filter(user=user).values_list("id", flat=True))
+    if not accounts:
         # no accounts -> zeroed response
         zero = Decimal("0.00")
         return Response({
@@ -975,16 +1153,16 @@ def transactions_stats(request):
             "monthly": []
         })
 
-    # totals (only consider SUCCESS transactions for totals)
-    total_debited = Transaction.objects.filter(
-        sender_account__in=accounts,
-        status="SUCCESS"
-    ).aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
-
-    total_credited = Transaction.objects.filter(
-        receiver_account__in=accounts,
-        status="SUCCESS"
-    ).aggregate(total=Sum("amount"))["total"] or Decimal("0.00")
+    # totals (only consider SUCCESS transactions for totals); the hot table
+    # through the owner indexes, archived years by account
+    success = Q(status="SUCCESS", category=category) if category else Q(status="SUCCESS")
+    totals = Transaction.objects.filter(archive.involving(user.id, success)).aggregate(
+        debited=Sum("amount", filter=Q(sender_user=user)),
+        credited=Sum("amount", filter=Q(receiver_user=user))
+    )
+    archived = archive.archived_monthly_totals(accounts, category)
+    total_debited = (totals["debited"] or Decimal("0.00")) + sum(m["debited"] for m in archived.values())
+    total_credited = (totals["credited"] or Decimal("0.00")) + sum(m["credited"] for m in archived.values())
 
     net_change = (total_credited - total_debited)
 
@@ -1007,30 +1185,28 @@ def transactions_stats(request):
 
     # get aggregated values per month using TruncMonth for the date range
     first_year, first_month = months_list[0]
-    start_date = datetime.date(first_year, first_month, 1)
-    # end_date = end of last month in months_list
+    # plain timestamp bounds (not __date) so the owner indexes give a range scan
+    start = timezone.make_aware(datetime.datetime(first_year, first_month, 1))
     last_year, last_month = months_list[-1]
-    last_day = calendar.monthrange(last_year, last_month)[1]
-    end_date = datetime.date(last_year, last_month, last_day)
+    end = timezone.make_aware(datetime.datetime(last_year + last_month // 12, last_month % 12 + 1, 1))
 
     qs = Transaction.objects.filter(
-        Q(sender_account__in=accounts) | Q(receiver_account__in=accounts),
-        timestamp__date__gte=start_date,
-        timestamp__date__lte=end_date,
-        status="SUCCESS"
+        archive.involving(user.id, success, Q(timestamp__gte=start, timestamp__lt=end))
     ).annotate(month=TruncMonth("timestamp")).values("month").annotate(
-        debited=Sum("amount", filter=Q(sender_account__in=accounts, status="SUCCESS")),
-        credited=Sum("amount", filter=Q(receiver_account__in=accounts, status="SUCCESS"))
+        debited=Sum("amount", filter=Q(sender_user=user)),
+        credited=Sum("amount", filter=Q(receiver_user=user))
     ).order_by("month")
 
-    # convert qs to dict keyed by YYYY-MM
+    # convert qs to dict keyed by YYYY-MM, adding archived months in range
     month_map = {}
-    for row in qs:
+    for row in list(qs) + [{"month": m, **v} for m, v in archived.items() if start <= m < end]:
         key = row["month"].strftime("%Y-%m")
+        prev = month_map.get(key, {"debited": Decimal("0.00"), "credited": Decimal("0.00")})
         month_map[key] = {
-            "debited": str( (row.get("debited") or Decimal("0.00")) ),
-            "credited": str( (row.get("credited") or Decimal("0.00")) )
+            "debited": prev["debited"] + (row.get("debited") or Decimal("0.00")),
+            "credited": prev["credited"] + (row.get("credited") or Decimal("0.00")),
         }
+    month_map = {k: {side: str(v) for side, v in vals.items()} for k, vals in month_map.items()}
 
     monthly = []
     for (yy, mm) in months_list:
@@ -1077,7 +1253,7 @@ def profile_info(request):
     user = request.user
     try:
         profile = Profile.objects.get(user=user)
-        banks_count = BankAccount.objects.filter(user=user).count() if BankAccount.objects.filter(user=user).exists() else 0
+        banks_count = BankAccount.objects.filter(user=user).count()
 
         data = {
             "username": user.username,
@@ -1170,7 +1346,7 @@ def profile_detail(request):
     """
     user = request.user
     try:
-        profile = Profile.objects.get(user=user)
+        profile = Profile.objects.select_related("user").get(user=user)
     except Profile.DoesNotExist:
         return Response({"detail": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
 
@@ -1247,7 +1423,7 @@ def bank_detail(request, pk):
         return Response({"detail": "Bank account removed"}, status=status.HTTP_204_NO_CONTENT)
 def get_user_bank_account(user):
     # This example chooses the first account. Change as needed.
-    return BankAccount.objects.filter(user=user)
+    return BankAccount.objects.filter(user=user).order_by("id").first()
 @api_view(['GET'])
 @authentication_classes([TokenAuthentication])
 @permission_classes([IsAuthenticated])
@@ -1304,3 +1480,416 @@ def verify_pin(request):
 
 
 
+# autopay (standing instructions)
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework import status
+from django.utils import timezone
+
+from .models import Mandate
+from .serializers import MandateSerializer
+
+
+@api_view(["GET", "POST"])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def mandates_view(request):
+    """
+    GET:  list the user's autopay mandates
+    POST: create one. Body: payer_account, kind (TRANSFER/RECHARGE/BILL), the
+          target (payee_account | operator + consumer_number | biller +
+          consumer_number), amount, frequency, optional next_run_at, and the
+          payer account's pin to authorise it.
+    """
+    if request.method == "GET":
+        qs = Mandate.objects.filter(user=request.user).exclude(status="CANCELLED").order_by("next_run_at")
+        return Response(MandateSerializer(qs, many=True).data)
+
+    ser = MandateSerializer(data=request.data, context={"request": request})
+    if not ser.is_valid():
+        return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
+    payer = ser.validated_data["payer_account"]
+    if not payer.check_pin(str(request.data.get("pin", ""))):
+        return Response({"valid": False, "detail": "Invalid PIN"}, status=status.HTTP_403_FORBIDDEN)
+
+    mandate = ser.save(user=request.user, next_run_at=ser.validated_data.get("next_run_at") or timezone.now())
+    return Response(MandateSerializer(mandate).data, status=status.HTTP_201_CREATED)
+
+
+# fields whose change redirects or resizes the debit
+MANDATE_PIN_FIELDS = ("payer_account", "kind", "payee_account", "biller", "operator", "consumer_number", "amount")
+
+
+@api_view(["GET", "PATCH", "DELETE"])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def mandate_detail(request, pk):
+    """
+    GET    -> mandate detail
+    PATCH  -> change amount/frequency/next_run_at, or pause/resume with {"status": "PAUSED"|"ACTIVE"}.
+              Changing what is paid, to whom or from where (MANDATE_PIN_FIELDS)
+              needs the paying account's pin, as creating the mandate does.
+    DELETE -> cancel the mandate
+    """
+    try:
+        mandate = Mandate.objects.get(pk=pk, user=request.user)
+    except Mandate.DoesNotExist:
+        return Response({"detail": "Mandate not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    if request.method == "GET":
+        return Response(MandateSerializer(mandate).data)
+
+    if request.method == "DELETE":
+        mandate.status = "CANCELLED"
+        mandate.save(update_fields=["status"])
+        return Response({"detail": "Mandate cancelled"}, status=status.HTTP_204_NO_CONTENT)
+
+    ser = MandateSerializer(mandate, data=request.data, partial=True, context={"request": request})
+    if not ser.is_valid():
+        return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
+    if any(field in request.data for field in MANDATE_PIN_FIELDS):
+        payer = ser.validated_data.get("payer_account", mandate.payer_account)
+        if not payer.check_pin(str(request.data.get("pin", ""))):
+            return Response({"valid": False, "detail": "Invalid PIN"}, status=status.HTTP_403_FORBIDDEN)
+    new_status = request.data.get("status")
+    extra = {}
+    if new_status in ("ACTIVE", "PAUSED") and mandate.status != "CANCELLED":
+        extra = {"status": new_status, "retry_count": 0}
+    if "next_run_at" in ser.validated_data:
+        extra["cycle_due_at"] = None  # a new date starts a new cycle
+    mandate = ser.save(**extra)
+    return Response(MandateSerializer(mandate).data)
+
+
+# dashboard (single round trip on app launch)
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from django.utils.timezone import localtime
+from decimal import Decimal
+
+from .models import BankAccount, Profile, Transaction
+from .serializers import BankAccountSerializer, TransactionSerializer
+
+DASHBOARD_SECTIONS = ("profile", "accounts", "transactions", "summary")
+
+
+@api_view(["GET"])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def dashboard(request):
+    """
+    Profile, accounts with balances, the last N transactions and the
+    current-month summary in one response, in at most five queries
+    (token, profile, accounts, transactions, summary).
+    Query params:
+      - limit=10                                      recent transactions to return
+      - skip=profile,accounts,transactions,summary    sections to leave out
+    """
+    user = request.user
+    skip = {s.strip() for s in request.GET.get("skip", "").split(",") if s.strip()}
+    sections = [s for s in DASHBOARD_SECTIONS if s not in skip]
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 10)), 100))
+    except ValueError:
+        limit = 10
+
+    data = {}
+    accounts = []
+    if sections:  # every section needs the user's accounts (banks_count, ids, balances)
+        accounts = list(BankAccount.objects.filter(user=user).order_by("-created_at"))
+    account_ids = {a.id for a in accounts}
+
+    if "profile" in sections:
+        try:
+            profile = Profile.objects.get(user=user)
+        except Profile.DoesNotExist:
+            profile = None
+        data["profile"] = {
+            "username": user.username,
+            "email": user.email,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "joined": localtime(user.date_joined).strftime("%d %b %Y"),
+            "banks_count": len(accounts),
+            "balance": float(profile.balance) if profile else 0.0,
+            "pin_enabled": profile.pin_enabled if profile else False,
+        }
+
+    if "accounts" in sections:
+        data["accounts"] = BankAccountSerializer(accounts, many=True).data
+        data["total_balance"] = str(sum((a.amount for a in accounts), Decimal("0.00")))
+
+    if "transactions" in sections:
+        recent = []
+        if account_ids:
+            recent = archive.hot_transactions(user.id, limit=limit)
+        data["transactions"] = TransactionSerializer(
+            recent, many=True, context={"request": request, "account_ids": account_ids}
+        ).data
+
+    if "summary" in sections:
+        now = localtime(timezone.now())
+        month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        totals = {"debited": None, "credited": None, "count": 0}
+        if account_ids:
+            totals = Transaction.objects.filter(
+                archive.involving(user.id, Q(status="SUCCESS", timestamp__gte=month_start))
+            ).aggregate(
+                debited=Sum("amount", filter=Q(sender_user=user)),
+                credited=Sum("amount", filter=Q(receiver_user=user)),
+                count=Count("id"),
+            )
+        debited = totals["debited"] or Decimal("0.00")
+        credited = totals["credited"] or Decimal("0.00")
+        data["summary"] = {
+            "month": now.strftime("%Y-%m"),
+            "debited": str(debited),
+            "credited": str(credited),
+            "net_change": str(credited - debited),
+            "count": totals["count"],
+        }
+
+    return Response(data)
+
+
+# bulk onboarding (corporate imports)
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, parser_classes
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework import status
+
+from .onboarding import import_accounts
+
+
+@api_view(["POST"])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAdminUser])
+@parser_classes([MultiPartParser])
+def import_bank_accounts(request):
+    """
+    Staff only. Multipart upload: file=<accounts.csv | accounts.jsonl>,
+    optional format=csv|jsonl (defaults from the file extension).
+    Returns {"total", "created", "failed", "errors": [{"row", "errors"}], ...}
+    """
+    upload = request.FILES.get("file")
+    if not upload:
+        return Response({"detail": "file required"}, status=status.HTTP_400_BAD_REQUEST)
+    fmt = request.data.get("format") or ("jsonl" if upload.name.endswith((".jsonl", ".json")) else "csv")
+    if fmt not in ("csv", "jsonl"):
+        return Response({"detail": "format must be csv or jsonl"}, status=status.HTTP_400_BAD_REQUEST)
+
+    report = import_accounts(upload, fmt=fmt)
+    code = status.HTTP_201_CREATED if report["created"] else status.HTTP_400_BAD_REQUEST
+    return Response(report, status=code)
+
+
+# live payment events (SSE / long-poll). Under ASGI, backend/asgi.py serves
+# these paths from api.live_asgi; these views answer them under WSGI
+# (runserver, tests). DRF views are sync-only, so they are plain Django views
+# with the same token auth.
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+
+from . import events
+
+
+async def _live_request(request):
+    """(user | None, params | None, error response | None)"""
+    try:
+        key, params = events.parse_params(request.GET.get, {k.lower(): v for k, v in request.headers.items()})
+    except ValueError:
+        return None, None, JsonResponse({"detail": "after, timeout and Last-Event-ID must be numbers"}, status=400)
+    if key:
+        user = await sync_to_async(events.user_for_token)(key)
+    else:
+        user = await request.auser()
+        user = user if user.is_authenticated else None
+    if user is None:
+        return None, None, JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    return user, params, None
+
+
+async def event_stream(request):
+    """
+    Server-Sent Events: `debit` / `credit` messages for the user's accounts
+    as payments commit. Token in the Authorization header or ?token=
+    (EventSource can't set headers). Resumes after Last-Event-ID (header or
+    ?last_event_id=); the stream ends after ?timeout= seconds (capped by
+    LIVE_EVENTS_MAX_STREAM) or if the client falls behind, and EventSource
+    reconnects by itself.
+    """
+    user, params, error = await _live_request(request)
+    if error:
+        return error
+    response = StreamingHttpResponse(
+        events.sse_stream(user.id, params["last_id"], params["lifetime"]), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # no proxy buffering
+    return response
+
+
+async def event_poll(request):
+    """
+    Long-poll fallback. ?after=<event id> returns the messages after it as
+    soon as there are any, or an empty list after ?timeout= seconds
+    (default 25, max 60). Without `after` it returns the current position
+    immediately. Response: {"events": [...], "last_id": n}
+    """
+    user, params, error = await _live_request(request)
+    if error:
+        return error
+    return JsonResponse(await events.poll(user.id, params["after"], params["timeout"]))
+
+
+# transaction receipts (PNG / PDF), rendered once and served from disk
+from concurrent.futures import TimeoutError as RenderTimeout
+
+from django.http import FileResponse, HttpResponseNotModified
+
+from . import receipts
+
+
+@api_view(["GET"])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def transaction_receipt(request, pk, fmt):
+    """
+    GET /api/transactions/<id>/receipt.png (or .pdf): a shareable receipt
+    for one of the user's transactions, hot or archived. Receipts never
+    change, so they are sent with a year-long private cache lifetime and a
+    strong ETag. 503 + Retry-After when the renderer is saturated.
+    """
+    account_ids = set(BankAccount.objects.filter(user=request.user).values_list("id", flat=True))
+    txn = archive.find_transaction(account_ids, pk) if account_ids else None
+    if txn is None:
+        return Response({"detail": "Transaction not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # the sender's and the receiver's receipts differ ("Paid"/"Received"): each has its own file and ETag
+    path = receipts.receipt_path(txn.id, txn.status, receipts.direction(txn, account_ids), fmt)
+    etag = f'"{path.stem[:32]}"'
+    if etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponseNotModified()
+    else:
+        try:
+            path = receipts.receipt_file(receipts.receipt_fields(txn, account_ids), fmt)
+        except (receipts.Busy, RenderTimeout):
+            response = Response({"detail": "Receipt is being rendered, retry shortly"},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response["Retry-After"] = "1"
+            return response
+        response = FileResponse(open(path, "rb"), content_type=receipts.FORMATS[fmt],
+                                filename=f"receipt-{txn.id}.{fmt}")
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, max-age=31536000, immutable"
+    return response
+
+
+# printable QR sheets for merchant onboarding
+from django.conf import settings
+
+
+@api_view(["POST"])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAdminUser])
+def qr_sheets(request):
+    """
+    Staff only. {"account_ids": [...], "amount": "250" (optional, fixed
+    amount in every code)} -> streamed ZIP of A4 PDF sheets of QR codes
+    plus manifest.csv. Sheets are rendered in a process pool
+    (QR_SHEET_WORKERS) while the ZIP is being sent.
+    """
+    account_ids = request.data.get("account_ids")
+    limit = getattr(settings, "QR_SHEET_MAX_ACCOUNTS", 20000)
+    if not isinstance(account_ids, list) or not account_ids or not all(isinstance(i, int) for i in account_ids):
+        return Response({"detail": "account_ids must be a non-empty list of ids"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(account_ids) > limit:
+        return Response({"detail": f"at most {limit} accounts per request"}, status=status.HTTP_400_BAD_REQUEST)
+    amount = request.data.get("amount")
+    if amount not in (None, ""):
+        try:
+            amount = qrsheets.clean_amount(amount)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        amount = None
+
+    cards, missing = qrsheets.sheet_cards(account_ids, amount)
+    if missing:
+        return Response({"detail": "unknown account ids", "missing": missing[:100]}, status=status.HTTP_400_BAD_REQUEST)
+    sheets = qrsheets.iter_sheets(cards, workers=getattr(settings, "QR_SHEET_WORKERS", None))
+    response = StreamingHttpResponse(qrsheets.zip_stream(sheets), content_type="application/zip")
+    response["Content-Disposition"] = 'attachment; filename="qr-sheets.zip"'
+    return response
+
+
+# provider health (api.providers)
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from . import providers
+
+
+@api_view(["GET"])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAdminUser])
+def providers_status(request):
+    """
+    Staff only. Circuit breaker state, call and error counts, hedges and
+    latency histogram (with p50/p95/p99) of every operator and biller API
+    this worker process has called.
+    """
+    return Response({"providers": providers.status()})
+
+
+# payee suggestions (api.counterparties)
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework import status
+
+from . import counterparties
+
+SUGGESTIONS_MAX = 50
+
+
+@api_view(["GET"])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def payee_suggestions(request):
+    """
+    The accounts the user pays most often and most recently, best first
+    (?limit=, 1-50, default 8), for the quick-pay row. No score is sent: it
+    decays with time while the order does not, so the response only
+    changes when the user pays someone.
+    """
+    try:
+        limit = int(request.GET.get("limit") or 8)
+    except ValueError:
+        return Response({"detail": "limit must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+    if not 1 <= limit <= SUGGESTIONS_MAX:
+        return Response({"detail": f"limit must be between 1 and {SUGGESTIONS_MAX}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    return Response({"payees": [
+        {
+            "account_id": stat.account_id,
+            "holder_name": stat.account.holder_name,
+            "upi_id": stat.account.upi_id,
+            "bank_name": stat.account.bank_name,
+            "count": stat.count,
+            "total": str(stat.total),
+            "last_paid_at": stat.last_paid_at,
+        }
+        for stat in counterparties.suggestions(request.user, limit)
+    ]})
@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# live payment events (/api/events/...) are served in front of Django so
+# that idle streams don't each hold a thread; see api/live_asgi.py
+from api.live_asgi import LiveEventsApp  # noqa: E402  (needs the app registry)
+
+application = LiveEventsApp(django_application)
@@ -47,10 +47,12 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.DataVersionETagMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -140,5 +142,109 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',  # orjson when installed, same output as DRF's JSONRenderer
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
+
+# Email (dev) - reminders and other notifications are printed to the console
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'no-reply@gapy.local'
+
+# Bill reminder scanner (python manage.py send_bill_reminders)
+BILL_REMINDER_BATCH_SIZE = 500   # users per batch (each with all of their due reminders)
+
+# Mock recharge / bill provider latency in seconds (api.payments.call_provider, api.bills.upstream_fetch)
+MOCK_PROVIDER_LATENCY = {'recharge': 0.8, 'bill': 0.6, 'bill_fetch': 0.5}
+
+# Autopay scheduler (python manage.py run_mandates)
+MANDATE_BATCH_SIZE = 500
+MANDATE_MAX_RETRIES = 3          # insufficient-balance retries before skipping a cycle
+MANDATE_RETRY_BACKOFF = 900      # seconds; doubled on every retry
+
+# Transaction archival (python manage.py archive_transactions)
+TRANSACTION_HOT_DAYS = 365           # older transactions move to per-year archive tables
+TRANSACTION_ARCHIVE_BATCH_SIZE = 5000
+TRANSACTION_PAGE_SIZE = 100          # history rows per page when the client gives no ?limit=
+
+# Payment event outbox (python manage.py dispatch_outbox)
+# every sink gets every event at least once, mostly in id order; consumers dedupe on the event id
+OUTBOX_SINKS = {
+    'file': {'BACKEND': 'api.outbox.JsonLinesSink', 'path': str(BASE_DIR / 'outbox-events.jsonl')},
+    # local stand-in for a downstream service: python manage.py serve_outbox_stub
+    # 'http': {'BACKEND': 'api.outbox.HttpSink', 'url': 'http://127.0.0.1:8099/events', 'timeout': 5},
+}
+OUTBOX_BATCH_SIZE = 500
+OUTBOX_SETTLE_SECONDS = 2        # only deliver events this old (lets late commits with lower ids land)
+OUTBOX_GAP_SECONDS = 600         # how long an id passed over is still looked for (longest open transaction)
+
+# Live payment events (/api/events/stream/ and /api/events/poll/, ASGI only)
+LIVE_EVENTS_POLL_INTERVAL = 0.5  # seconds between outbox reads for events from other processes
+LIVE_EVENTS_HEARTBEAT = 15       # SSE keep-alive comment interval
+LIVE_EVENTS_MAX_STREAM = 3600    # seconds before a stream is closed and the client reconnects
+
+# ETag / 304 from the per-user data version (api.middleware) for these url names
+DATA_VERSION_ETAG_VIEWS = [
+    "api_list_transactions",
+    "transactions-list-alias",
+    "api_list_saved_payees",
+    "api_payee_suggestions",
+    "banks",
+    "balances",
+    "bill-history",
+]
+
+# Response compression (api.middleware.CompressionMiddleware): brotli if installed, else gzip
+COMPRESS_MIN_SIZE = 1024         # bytes; smaller bodies are sent as they are
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5      # 0-11; higher levels cost far more CPU for little gain on JSON
+
+# Balance reconciliation (python manage.py reconcile_balances [--incremental])
+RECONCILE_CHUNK_SIZE = 50000     # accounts per grouped query; bounds the job's memory
+
+# Monthly statements (python manage.py generate_statements [--month YYYY-MM])
+STATEMENTS_DIR = BASE_DIR / 'statements'
+STATEMENT_PARTITION_SIZE = 1000  # user ids per worker task; a crash redoes at most one per worker
+
+# Transaction receipts (/api/transactions/<id>/receipt.png|.pdf), rendered once into RECEIPTS_DIR
+RECEIPTS_DIR = BASE_DIR / 'receipts'
+RECEIPT_RENDER_WORKERS = 2       # render threads per process
+RECEIPT_RENDER_QUEUE = 32        # renders waiting or running before new ones get 503
+RECEIPT_RENDER_TIMEOUT = 10      # seconds a request waits for its render
+
+# Printable QR sheets (POST /api/qr/sheets/, python manage.py generate_qr_sheets)
+QR_SHEET_WORKERS = None          # render processes per request (None: CPU count)
+QR_SHEET_MAX_ACCOUNTS = 20000
+
+# In-memory plan search (/api/plans/search/, api.plan_index)
+PLAN_INDEX_MAX_AGE = 600         # seconds; rebuilds also refresh popularity
+PLAN_POPULARITY_DAYS = 30        # SUCCESS recharges counted towards "popular"
+
+# Fetched bills (api.bills), kept in the default cache
+BILL_FETCH_TTL = 300             # seconds a fetched bill is reused by fetch and pay
+BILL_FETCH_TIMEOUT = 30          # seconds a request waits for a fetch another request started
+
+# Multi-bill payments (/api/bill/pay-multiple/, api.payments.pay_bills)
+BILL_PAY_MAX_ITEMS = 10
+BILL_PAY_CONCURRENCY = 8         # biller calls in flight per payment
+
+# Operator / biller APIs (api.providers); mock in process when PROVIDER_BASE_URL is None
+PROVIDER_BASE_URL = None         # e.g. 'http://127.0.0.1:8098' (python manage.py serve_mock_provider)
+PROVIDER_TIMEOUTS = {'recharge': 10, 'bill': 10, 'bill_fetch': 5}  # seconds, by kind or "kind:code"
+PROVIDER_BREAKER_FAILURES = 5    # consecutive failures that open a provider's circuit
+PROVIDER_BREAKER_RESET = 30      # seconds an open circuit refuses calls before one trial
+PROVIDER_HEDGE_AFTER = 0.3       # seconds before a bill fetch is hedged, until its latency is known
+PROVIDER_HEDGE_QUANTILE = 0.9    # then: hedge fetches slower than this quantile of the provider's latency
+PROVIDER_HEDGE_MIN = 0.01
+PROVIDER_HEDGE_THREADS = 16
+PROVIDER_SETTLE_AFTER = 120      # seconds before an unanswered payment is settled by a status call (settle_pending_payments)
+
+# Payee suggestions and saved payee order (api.counterparties)
+PAYEE_FRECENCY_HALF_LIFE_DAYS = 14   # a payment's weight halves every this many days; rebuild_counterparty_stats after changing it
+
+# "Pay to" autocomplete from the user's own payees (api.payee_index), per process
+PAYEE_INDEX_MAX_USERS = 10000        # indexes kept, least recently used evicted
+PAYEE_INDEX_MAX_ENTRIES = 2000       # accounts per user index
+PAYEE_INDEX_MAX_AGE = 600            # seconds; also picks up counterparties' renamed accounts